@@ -0,0 +1,253 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .exception import ConnectionPoolTimeoutException
+from collections import deque
+
+import asyncio
+import time
+
+__all__ = [
+    'AsyncConnectionPool'
+]
+
+# ----- Public Classes --------------------------------------------------------
+
+class AsyncConnectionPool(object):
+    '''
+    The asyncio counterpart of ConnectionPool.  connect, ping, reset and
+    disconnect are coroutine functions and the pool may only be used from
+    the event loop it was created on.
+    '''
+
+    def __init__(self,
+                 connect,
+                 ping=None,
+                 reset=None,
+                 disconnect=None,
+                 min_size=0,
+                 max_size=10,
+                 timeout=5.0,
+                 max_idle_time=300):
+        if max_size < 1:
+            raise ValueError('max size must be at least 1')
+
+        if min_size > max_size:
+            raise ValueError('min size cannot be greater than max size')
+
+        self.__connect = connect
+        self.__ping = ping
+        self.__reset = reset
+        self.__disconnect = disconnect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle_time = max_idle_time
+
+        self.__condition = asyncio.Condition()
+        self.__idle = deque()
+        self.__in_use = set()
+        self.__size = 0
+
+        self.__stats = {
+            'checkouts': 0,
+            'connects': 0,
+            'discards': 0,
+            'failed health checks': 0,
+            'peak in use': 0,
+            'timeouts': 0,
+            'total wait time': 0.0,
+            'max wait time': 0.0,
+            'waits': 0
+        }
+
+    async def checkin(self, connection, discard=False):
+        '''
+        Return a connection to the pool.  If discard is True, or the
+        connection cannot be reset, it is closed instead of being reused.
+        '''
+
+        if discard is False and self.__reset is not None:
+            try:
+                await self.__reset(connection)
+            except Exception:
+                discard = True
+
+        expired = []
+        async with self.__condition:
+            if connection not in self.__in_use:
+                return
+
+            self.__in_use.remove(connection)
+
+            if discard is True:
+                self.__size -= 1
+                self.__stats['discards'] += 1
+                expired.append(connection)
+            else:
+                self.__idle.append((connection, time.time()))
+                expired.extend(self.__prune_idle())
+
+            self.__condition.notify()
+
+        for connection in expired:
+            await self.__close(connection)
+
+    async def checkout(self, timeout=None):
+        '''
+        Retrieve a healthy connection from the pool, creating one if the pool
+        has not yet reached its maximum size.  If no connection becomes
+        available within timeout seconds, ConnectionPoolTimeoutException is
+        raised.
+        '''
+
+        if timeout is None:
+            timeout = self.timeout
+
+        started = time.time()
+        waited = False
+
+        while True:
+            connection = None
+            create = False
+
+            async with self.__condition:
+                while len(self.__idle) == 0 and self.__size >= self.max_size:
+                    remaining = timeout - (time.time() - started)
+                    if remaining <= 0:
+                        self.__stats['timeouts'] += 1
+                        raise ConnectionPoolTimeoutException(
+                            'timed out after {} seconds waiting for a '
+                                .format(timeout)
+                            + 'connection ({} of {} in use)'
+                                .format(len(self.__in_use), self.max_size)
+                        )
+
+                    if waited is False:
+                        self.__stats['waits'] += 1
+                        waited = True
+
+                    try:
+                        await asyncio.wait_for(
+                            self.__condition.wait(), remaining
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+
+                if len(self.__idle) > 0:
+                    connection, last_used = self.__idle.pop()
+                else:
+                    self.__size += 1
+                    create = True
+
+            if create is True:
+                try:
+                    connection = await self.__connect()
+                except BaseException:
+                    async with self.__condition:
+                        self.__size -= 1
+                        self.__condition.notify()
+                    raise
+
+                self.__stats['connects'] += 1
+            elif not await self.__is_healthy(connection):
+                async with self.__condition:
+                    self.__size -= 1
+                    self.__stats['failed health checks'] += 1
+                    self.__condition.notify()
+
+                await self.__close(connection)
+                continue
+
+            break
+
+        wait_time = time.time() - started
+
+        self.__in_use.add(connection)
+
+        self.__stats['checkouts'] += 1
+        self.__stats['total wait time'] += wait_time
+        if wait_time > self.__stats['max wait time']:
+            self.__stats['max wait time'] = wait_time
+        if len(self.__in_use) > self.__stats['peak in use']:
+            self.__stats['peak in use'] = len(self.__in_use)
+
+        return connection
+
+    async def __close(self, connection):
+        if self.__disconnect is None:
+            return
+
+        try:
+            await self.__disconnect(connection)
+        except Exception:
+            pass
+
+    async def close_idle(self):
+        '''
+        Close all of the connections that are not currently checked out.
+        '''
+
+        async with self.__condition:
+            idle = [connection for connection, last_used in self.__idle]
+            self.__idle.clear()
+            self.__size -= len(idle)
+            self.__condition.notify_all()
+
+        for connection in idle:
+            await self.__close(connection)
+
+    async def __is_healthy(self, connection):
+        if self.__ping is None:
+            return True
+
+        try:
+            return await self.__ping(connection) is not False
+        except Exception:
+            return False
+
+    def __prune_idle(self):
+        '''
+        Remove connections that have been idle for too long while keeping at
+        least min size connections open.  Must be called with the lock held;
+        the caller is responsible for closing what is returned.
+        '''
+
+        expired = []
+        if self.max_idle_time is None:
+            return expired
+
+        now = time.time()
+        while len(self.__idle) > 0 and self.__size > self.min_size:
+            connection, last_used = self.__idle[0]
+            if now - last_used < self.max_idle_time:
+                break
+
+            self.__idle.popleft()
+            self.__size -= 1
+            self.__stats['discards'] += 1
+            expired.append(connection)
+
+        return expired
+
+    def stats(self):
+        '''
+        Return a snapshot of the pool's size, utilization and wait times.
+        '''
+
+        stats = dict(self.__stats)
+        stats['size'] = self.__size
+        stats['idle'] = len(self.__idle)
+        stats['in use'] = len(self.__in_use)
+        stats['min size'] = self.min_size
+        stats['max size'] = self.max_size
+        stats['utilization'] = len(self.__in_use) / self.max_size
+        stats['average wait time'] = \
+            (stats['total wait time'] / stats['checkouts']
+                if stats['checkouts'] > 0 else
+             0.0)
+
+        return stats
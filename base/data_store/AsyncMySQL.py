@@ -0,0 +1,303 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .AsyncRDBMSBase import AsyncRDBMSBase
+from . import cache_tags
+from .exception import DataStoreException
+from .exception import DataStoreDuplicateKeyException
+from .exception import DataStoreForeignKeyException
+from .exception import IllegalMixOfCollationsException
+from . import host_health
+from .durability import get_durability
+from .prepared_statement import get_statement
+from .prepared_statement import PreparedStatement
+from . import replication
+from .statement_cache import get_literal_markers
+
+import pymysql
+import time
+import tinyAPI.base.context as Context
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+# ----- Public Classes --------------------------------------------------------
+
+class AsyncMySQL(AsyncRDBMSBase):
+    '''
+    Manages interactions with configured MySQL servers using aiomysql.
+    '''
+
+    def __init__(self):
+        super(AsyncMySQL, self).__init__()
+
+        self.__mysql = None
+        self.__row_count = None
+        self.__last_row_id = None
+
+    async def close(self):
+        if self.__mysql is None:
+            return
+
+        if self._pool is not None:
+            await self._pool.checkin(self.__mysql)
+            self._pool = None
+        else:
+            await self._close_connection(self.__mysql)
+
+        self.__mysql = None
+
+    async def _close_connection(self, connection):
+        host_health.connection_closed(connection.host)
+        await connection.ensure_closed()
+
+    async def commit(self, ignore_exceptions=False):
+        if self.__mysql is None:
+            if not ignore_exceptions:
+                raise DataStoreException(
+                    'transaction cannot be committed because a database '
+                    + 'connection has not been established yet'
+                )
+        else:
+            if Context.env_unit_test():
+                return
+            else:
+                await self.__mysql.commit()
+
+                await self._finish_memcache_invalidation(True)
+
+    async def connect(self):
+        if self.__mysql:
+            return
+
+        if self._settings is None or self._db is None or self._group is None:
+            raise DataStoreException(
+                'cannot connect to MySQL because data store '
+                + 'has not been configured'
+            )
+
+        self._pool = self._get_pool()
+        if self._pool is not None:
+            self.__mysql = await self._pool.checkout()
+        else:
+            self.__mysql = \
+                await self._open_connection(
+                    self._settings, self._db, self._group, self._charset
+                )
+
+    async def connection_id(self):
+        await self.connect()
+        return self.__mysql.thread_id()
+
+    async def create(self, target, data=tuple(), return_insert_id=True):
+        if len(data) == 0:
+            return None
+
+        values = list(data.values())
+        statement = \
+            self._statement_cache.insert(
+                target, tuple(data.keys()), get_literal_markers(values)
+            )
+
+        vals = statement.get_values(values)
+
+        await self.connect()
+
+        started = time.time()
+        cursor = await self.__mysql.cursor()
+        try:
+            await self.__execute(cursor, statement.sql, vals)
+
+            self.__row_count = cursor.rowcount
+            id = cursor.lastrowid if return_insert_id else None
+        finally:
+            await cursor.close()
+
+        self._record_statement(
+            statement.sql, time.time() - started, self.__row_count, vals
+        )
+
+        await self._register_write([cache_tags.get_tag(target)])
+
+        return id
+
+    async def delete(self, target, data=tuple()):
+        values = list(data.values())
+        sql = \
+            self._statement_cache.delete(
+                target, tuple(data.keys()), get_literal_markers(values)
+            ) \
+                .sql
+
+        binds = None
+        if len(data) > 0:
+            binds = values
+
+        await self.connect()
+
+        started = time.time()
+        cursor = await self.__mysql.cursor()
+        try:
+            await self.__execute(cursor, sql, binds)
+
+            self.__row_count = cursor.rowcount
+        finally:
+            await cursor.close()
+
+        self._record_statement(
+            sql, time.time() - started, self.__row_count, binds
+        )
+
+        await self._register_write([cache_tags.get_tag(target)])
+
+        return True
+
+    async def __execute(self, cursor, sql, binds=tuple()):
+        try:
+            await cursor.execute(sql, binds)
+        except (pymysql.err.IntegrityError, pymysql.err.InternalError) as e:
+            errno, message = e.args
+
+            if errno == 1062:
+                raise DataStoreDuplicateKeyException(message)
+            elif errno == 1271:
+                raise IllegalMixOfCollationsException(sql, binds)
+            elif errno == 1452:
+                raise DataStoreForeignKeyException(message)
+            else:
+                raise
+        except pymysql.err.ProgrammingError as e:
+            errno, message = e.args
+
+            raise \
+                DataStoreException(
+                    self.__format_query_execution_error(
+                        sql, message, binds
+                    )
+                )
+
+    def __format_query_execution_error(self, sql, message, binds=tuple()):
+        return ('execution of this query:\n\n'
+                + sql
+                + "\n\n"
+                + (repr(binds) if binds is not None else '')
+                + '\n\nproduced this error:\n\n'
+                + message)
+
+    def get_last_row_id(self):
+        return self.__last_row_id
+
+    def get_row_count(self):
+        return self.__row_count
+
+    async def nth(self, index, sql, binds=tuple()):
+        records = await self.query(sql, binds)
+
+        if index < len(records):
+            return records[index]
+        else:
+            return None
+
+    async def _open_connection(self, settings, db, group, charset):
+        if aiomysql is None:
+            raise DataStoreException(
+                'the aiomysql package is required for "async mysql" servers'
+            )
+
+        durability = \
+            get_durability(
+                settings[group],
+                replication.filter_hosts(settings[group]['hosts'])
+            )
+
+        conversions = dict(pymysql.converters.conversions)
+        conversions[pymysql.FIELD_TYPE.TIME] = \
+            pymysql.converters.convert_time
+
+        while True:
+            host, user, password = durability.next()
+
+            started = time.time()
+            try:
+                connection = \
+                    await aiomysql.connect(
+                        host=host,
+                        user=user,
+                        password=password,
+                        db=db,
+                        charset=charset,
+                        local_infile=True,
+                        autocommit=False,
+                        conv=conversions
+                    )
+            except pymysql.err.OperationalError as e:
+                errno, message = e.args
+
+                if errno in (2003, 2013):
+                    host_health.record_failure(
+                        host, settings[group].get('circuit breaker')
+                    )
+                    continue
+                else:
+                    raise
+
+            host_health.record_success(host, time.time() - started)
+            host_health.connection_opened(host)
+
+            return connection
+
+    async def _ping_connection(self, connection):
+        await connection.ping(False)
+
+    async def query(self, sql, binds=tuple()):
+        statement = \
+            sql if sql.__class__ is PreparedStatement else get_statement(sql)
+
+        await self.connect()
+
+        started = time.time()
+        cursor = await self.__mysql.cursor(aiomysql.DictCursor)
+        try:
+            await self.__execute(cursor, statement.sql, binds)
+
+            self.__row_count = cursor.rowcount
+            self.__last_row_id = cursor.lastrowid
+
+            if statement.is_select:
+                results = list(await cursor.fetchall())
+            else:
+                results = True
+        finally:
+            await cursor.close()
+
+        self._record_statement(
+            statement.sql,
+            time.time() - started,
+            len(results) if statement.is_select else self.__row_count,
+            binds
+        )
+
+        if not statement.is_select:
+            await self._register_write(statement.written_tags)
+
+        return results
+
+    async def rollback(self, ignore_exceptions=False):
+        if self.__mysql is None:
+            if not ignore_exceptions:
+                raise DataStoreException(
+                    'transaction cannot be rolled back because a database '
+                    + 'connection has not been established yet'
+                )
+        else:
+            await self.__mysql.rollback()
+
+            await self._finish_memcache_invalidation(False)
+
+    async def _reset_connection(self, connection):
+        await connection.rollback()
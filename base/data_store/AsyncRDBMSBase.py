@@ -0,0 +1,292 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .AsyncConnectionPool import AsyncConnectionPool
+from . import cache_tags
+from .exception import DataStoreException
+from .RDBMSBase import RDBMSBase
+from tinyAPI.base.data_store.memcache import Memcache
+
+import asyncio
+import functools
+import os
+import tinyAPI.base.context as Context
+import weakref
+
+# ----- Public Classes --------------------------------------------------------
+
+class AsyncRDBMSBase(object):
+    '''
+    Defines a data store that handles interactions with a RDBMS using
+    asyncio.  It mirrors RDBMSBase except that every method that talks to
+    the data store is a coroutine, so independent queries can run
+    concurrently on a single thread by using one handle per task.
+
+    Connections are drawn from a pool shared by every handle configured for
+    the same server, group and database on the same event loop and are
+    returned to it by close().  Results are not cached in Memcache but cache
+    tags are invalidated, and statements are recorded, just as they are by
+    RDBMSBase.
+    '''
+
+    _pools = weakref.WeakKeyDictionary()
+    _statement_cache = RDBMSBase._statement_cache
+
+    def __init__(self):
+        self._settings = None
+        self._server = None
+        self._db = None
+        self._group = None
+        self._pool = None
+        self._charset = 'utf8'
+        self._memcache = None
+        self._invalidated_tags = set()
+
+    async def close(self):
+        '''
+        Return the connection to the pool (or close it if there is no pool).
+        '''
+
+        raise NotImplementedError
+
+    async def commit(self):
+        '''
+        Manually commit the active transaction.
+        '''
+
+        raise NotImplementedError
+
+    async def _close_connection(self, connection):
+        '''
+        Close a raw connection created by _open_connection.
+        '''
+
+        raise NotImplementedError
+
+    def configure(self, settings, db, group, server=None):
+        '''
+        Configure the connection settings.  Must be called before the handle
+        connects.  If a server name is provided, connections are drawn from
+        a pool shared by all handles configured for the same server, group
+        and database.
+        '''
+
+        if group not in settings:
+            raise DataStoreException(
+                'group "{}" not found in settings'
+                    .format(group)
+            )
+
+        self._settings = settings
+        self._server = server
+        self._db = db
+        self._group = group
+        return self
+
+    async def count(self, sql, binds=tuple()):
+        '''
+        Given a count(*) query, only return the resultant count.
+        '''
+
+        record = await self.nth(0, sql, binds)
+        if record is None:
+            return None
+
+        return list(record.values())[0]
+
+    async def create(self, target, data=tuple(), return_insert_id=False):
+        '''
+        Create a new record in the RDBMS.
+        '''
+
+        raise NotImplementedError
+
+    async def delete(self, target, data=tuple()):
+        '''
+        Delete a record from the RDBMS.
+        '''
+
+        raise NotImplementedError
+
+    async def _finish_memcache_invalidation(self, committed):
+        '''
+        Tables modified inside of a transaction are invalidated again once
+        it commits; see RDBMSBase.
+        '''
+
+        tags = self._invalidated_tags
+        self._invalidated_tags = set()
+
+        if committed and len(tags) > 0:
+            await self.memcache_invalidate(tags)
+
+    def _get_pool(self):
+        '''
+        Retrieve (creating if necessary) the connection pool for this
+        handle's configuration on the running event loop.
+        '''
+
+        if self._server is None:
+            return None
+
+        loop = asyncio.get_event_loop()
+        if loop not in self._pools:
+            self._pools[loop] = {}
+        pools = self._pools[loop]
+
+        key = (os.getpid(), self._server, self._group, self._db, self._charset)
+        if key not in pools:
+            options = self._settings[self._group].get('pool', {})
+
+            pools[key] = \
+                AsyncConnectionPool(
+                    functools.partial(
+                        self._open_connection,
+                        self._settings,
+                        self._db,
+                        self._group,
+                        self._charset
+                    ),
+                    self._ping_connection,
+                    self._reset_connection,
+                    self._close_connection,
+                    options.get('min size', 0),
+                    options.get('max size', 10),
+                    options.get('timeout', 5.0),
+                    options.get('max idle time', 300)
+                )
+
+        return pools[key]
+
+    async def memcache_invalidate(self, tags):
+        '''
+        Invalidate every cached query tagged with any of the provided tags.
+        Memcache is blocking so this is done in the loop's default executor.
+        '''
+
+        if Context.env_unit_test() or not cache_tags.is_enabled():
+            return
+
+        if self._memcache is None:
+            self._memcache = Memcache()
+
+        await asyncio.get_event_loop().run_in_executor(
+            None,
+            functools.partial(cache_tags.invalidate, self._memcache, tags)
+        )
+
+    async def nth(self, index, sql, binds=tuple()):
+        '''
+        Return the value at the Nth position of the result set.
+        '''
+
+        raise NotImplementedError
+
+    async def _open_connection(self, settings, db, group, charset):
+        '''
+        Open a new raw connection using the configured durability algorithm.
+        '''
+
+        raise NotImplementedError
+
+    async def one(self, sql, binds=tuple(), obj=None):
+        '''
+        Return the first (and only the first) of the result set.
+        '''
+
+        record = await self.nth(0, sql, binds)
+        if obj is None:
+            return record
+
+        if record is None:
+            raise RuntimeError('no data is present to assign to object')
+
+        for key, value in record.items():
+            setattr(obj, key, value)
+
+        return record
+
+    async def _ping_connection(self, connection):
+        '''
+        Verify that a raw connection is still usable.  Return False or raise
+        an exception if it is not.
+        '''
+
+        return True
+
+    @classmethod
+    def pool_stats(cls):
+        '''
+        Return the stats for every connection pool owned by this process,
+        keyed by (server, group, db, charset).
+        '''
+
+        pid = os.getpid()
+
+        stats = {}
+        for pools in list(cls._pools.values()):
+            for key, pool in pools.items():
+                if key[0] == pid:
+                    stats[key[1:]] = pool.stats()
+
+        return stats
+
+    async def query(self, sql, binds=tuple()):
+        '''
+        Execute an arbitrary query and return all of the results.
+        '''
+
+        raise NotImplementedError
+
+    def _record_statement(self, sql, duration, rows=None, binds=None):
+        '''
+        Called by the data store every time it executes a statement; see
+        RDBMSBase._record_statement.  Everything it feeds is in memory and
+        keyed by context (so by asyncio task) which is why it is not a
+        coroutine.
+        '''
+
+        RDBMSBase._record_statement(self, sql, duration, rows, binds)
+
+    async def _register_write(self, tags):
+        '''
+        Invalidate the tables modified by a statement now and remember them
+        so they can be invalidated again when the transaction commits.
+        '''
+
+        if len(tags) == 0 or \
+           Context.env_unit_test() or \
+           not cache_tags.is_enabled():
+            return
+
+        tags = set(tags) - self._invalidated_tags
+        if len(tags) == 0:
+            return
+
+        await self.memcache_invalidate(tags)
+        self._invalidated_tags.update(tags)
+
+    async def _reset_connection(self, connection):
+        '''
+        Reset a raw connection before it is returned to the pool.
+        '''
+
+        pass
+
+    async def rollback(self):
+        '''
+        Manually rollback the active transaction.
+        '''
+
+        raise NotImplementedError
+
+    def set_charset(self, charset):
+        '''
+        Set the character for the RDBMS.
+        '''
+
+        self._charset = charset
+        return self
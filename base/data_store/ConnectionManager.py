@@ -5,11 +5,17 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 # ----- Imports ---------------------------------------------------------------
 
 from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.data_store.AsyncMySQL import AsyncMySQL
+from tinyAPI.base.data_store.AsyncRDBMSBase import AsyncRDBMSBase
+from tinyAPI.base.data_store.cached_query import CachedQuery
+from tinyAPI.base.data_store import host_health
 from tinyAPI.base.data_store.MySQL import MySQL
 from tinyAPI.base.data_store.PostgreSQL import PostgreSQL
+from tinyAPI.base.data_store.RDBMSBase import RDBMSBase
+from tinyAPI.base.data_store.retry import RetryPolicy
+from tinyAPI.base.stats_logger import StatsLogger
 
 import builtins
-import os
 import threading
 
 # ----- Thread Local Data -----------------------------------------------------
@@ -21,37 +27,43 @@ _thread_local_data = threading.local()
 class ConnectionManager(object):
     '''
     Manages connectivity and persistence for data store connections.
-    '''
 
-    __persistent = {}
+    Each thread gets its own data store handle per server.  A handle holds
+    its own connection unless its group configures a "pool", in which case
+    handles draw their connections from a pool shared by the process (one
+    pool per server, group and database) so that the number of open
+    connections is bounded regardless of how many threads are running.  A
+    pooled connection is held from a handle's first statement until it
+    commits, rolls back or is closed; a thread that only reads and never
+    commits holds it for as long as the thread lives.
+
+    Servers of an asyncio type ("async mysql") are the exception: acquire()
+    returns a new handle every time so that concurrent tasks never share
+    one.  Its coroutines must be awaited and the handle closed with
+    "await dsh.close()" to return its connection to the pool.
+    '''
 
     def __init__(self):
-        self.pid = os.getpid()
         self.config = ConfigManager.value('data store config')
 
     def acquire(self, server, db, group, persistent=False):
-        if server not in self.__persistent:
-            self.__persistent[server] = {}
+        if server in self.config and \
+           self.config[server].get('type') in _ASYNC_TYPES:
+            return self.__get_data_store_handle(server) \
+                    .configure(self.config[server], db, group, server)
 
         if not hasattr(_thread_local_data, server):
-            if persistent is True:
-                if self.pid not in self.__persistent[server]:
-                    self.__persistent[server][self.pid] = \
-                        self.__get_data_store_handle(server)
-
-                dsh = self.__persistent[server][self.pid]
-                setattr(_thread_local_data, server, dsh)
-            else:
-                dsh = \
-                    self.__get_data_store_handle(server) \
-                        .set_persistent(False)
-                setattr(_thread_local_data, server, dsh)
+            dsh = self.__get_data_store_handle(server)
+            if persistent is False:
+                dsh.set_persistent(False)
+
+            setattr(_thread_local_data, server, dsh)
         else:
             dsh = getattr(_thread_local_data, server)
 
         _configure_dsh_builtins(dsh)
 
-        return dsh.configure(self.config[server], db, group)
+        return dsh.configure(self.config[server], db, group, server)
 
     def __get_data_store_handle(self, server):
         if server not in self.config:
@@ -70,14 +82,74 @@ class ConnectionManager(object):
             return MySQL()
         elif self.config[server]['type'] == 'postgresql':
             return PostgreSQL()
+        elif self.config[server]['type'] == 'async mysql':
+            return AsyncMySQL()
         else:
             raise RuntimeError(
                 'unrecognized data store type "{}"'
                     .format(self.config[server]['type'])
             )
 
+    def host_stats(self):
+        '''
+        Return the health, connect latency and open connection count of
+        every host this process has connected to.
+        '''
+
+        return host_health.stats()
+
+    def pool_stats(self):
+        '''
+        Return utilization and wait time stats for every connection pool
+        owned by this process.
+        '''
+
+        stats = RDBMSBase.pool_stats()
+        stats.update(AsyncRDBMSBase.pool_stats())
+
+        return stats
+
 # ----- Protected Functions ---------------------------------------------------
 
+def _collect_metrics():
+    '''
+    Export the data store stats of this process as gauges before each flush
+    of the metrics registry.
+    '''
+
+    metrics = StatsLogger()
+
+    pool_stats = RDBMSBase.pool_stats()
+    pool_stats.update(AsyncRDBMSBase.pool_stats())
+
+    for (server, group, db, charset), stats in pool_stats.items():
+        tags = {'server': server, 'group': group, 'db': db}
+
+        for name in ('idle', 'in use', 'size', 'timeouts', 'waits'):
+            metrics.gauge(
+                'data_store.pool.' + name.replace(' ', '_'),
+                stats[name],
+                tags
+            )
+
+    for host, stats in host_health.stats().items():
+        metrics.gauge(
+            'data_store.host.connections', stats['connections'], {'host': host}
+        )
+        metrics.gauge(
+            'data_store.host.available',
+            int(stats['available']),
+            {'host': host}
+        )
+
+    for name, value in CachedQuery.stats().items():
+        metrics.gauge('data_store.cached_query.' + name.replace(' ', '_'),
+                      value)
+
+    for name, value in RetryPolicy.stats().items():
+        metrics.gauge('data_store.retry.' + name, value)
+
+
 def _configure_dsh_builtins(dsh):
     builtins._c = dsh.count
     builtins._cr = dsh.create
@@ -88,7 +160,13 @@ def _configure_dsh_builtins(dsh):
     builtins._q = dsh.query
     builtins._rollback = dsh.rollback
 
+# ----- Constants -------------------------------------------------------------
+
+_ASYNC_TYPES = ('async mysql',)
+
 # ----- Intstructions ---------------------------------------------------------
 
+StatsLogger().register_collector(_collect_metrics)
+
 builtins._dscm = ConnectionManager()
 builtins._ds = builtins._dscm.acquire
@@ -5,16 +5,19 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 # ----- Imports ---------------------------------------------------------------
 
 from .exception import DataStoreException
+from . import host_health
 
 # ----- Public Classes --------------------------------------------------------
 
 class FallBack(object):
     '''
-    Implements the fall back durability algorithm.
+    Implements the fall back durability algorithm.  If the circuit of the
+    first host is open (see host_health) the second is tried first.
     '''
 
     def __init__(self, settings):
         self.__selected_host = None
+        self.__order = [0, 1]
 
         if len(settings) != 2:
             raise DataStoreException('exactly 2 hosts must be configured')
@@ -23,10 +26,14 @@ class FallBack(object):
 
     def next(self):
         if self.__selected_host is None:
+            if not host_health.is_available(self.settings[0][0]) and \
+               host_health.is_available(self.settings[1][0]):
+                self.__order = [1, 0]
+
             self.__selected_host = 0
         elif self.__selected_host == 0:
             self.__selected_host = 1
         else:
             raise DataStoreException('no more hosts remain')
 
-        return self.settings[self.__selected_host]
+        return self.settings[self.__order[self.__selected_host]]
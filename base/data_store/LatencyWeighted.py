@@ -0,0 +1,45 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .exception import DataStoreException
+from . import host_health
+
+import random
+
+# ----- Public Classes --------------------------------------------------------
+
+class LatencyWeighted(object):
+    '''
+    Implements the latency weighted durability algorithm.
+
+    Available hosts are selected at random with a probability inversely
+    proportional to their smoothed connect latency.  Hosts that have not
+    been connected to yet are weighted like the fastest known host so that
+    they are tried.
+    '''
+
+    def __init__(self, settings):
+        self.settings = list(settings)
+
+    def next(self):
+        if len(self.settings) == 0:
+            raise DataStoreException('no more hosts remain')
+
+        candidates = host_health.available(self.settings)
+
+        latencies = [host_health.get_latency(entry[0]) for entry in candidates]
+        known = [latency for latency in latencies if latency is not None]
+        fastest = min(known) if len(known) > 0 else 1.0
+
+        weights = [
+            1.0 / max(latency if latency is not None else fastest, 0.0001)
+            for latency in latencies
+        ]
+
+        selected = random.choices(candidates, weights)[0]
+        self.settings.remove(selected)
+
+        return selected
@@ -0,0 +1,43 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .exception import DataStoreException
+from . import host_health
+
+import random
+
+# ----- Public Classes --------------------------------------------------------
+
+class LeastConnections(object):
+    '''
+    Implements the least connections durability algorithm.
+
+    The available host to which this process has the fewest open
+    connections is selected; ties are broken at random.
+    '''
+
+    def __init__(self, settings):
+        self.settings = list(settings)
+
+    def next(self):
+        if len(self.settings) == 0:
+            raise DataStoreException('no more hosts remain')
+
+        candidates = host_health.available(self.settings)
+
+        connections = \
+            [host_health.get_connections(entry[0]) for entry in candidates]
+        fewest = min(connections)
+
+        selected = \
+            random.choice([
+                entry
+                for entry, count in zip(candidates, connections)
+                if count == fewest
+            ])
+        self.settings.remove(selected)
+
+        return selected
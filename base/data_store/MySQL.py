@@ -5,18 +5,21 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 # ----- Imports ---------------------------------------------------------------
 
 from collections import OrderedDict
+from . import cache_tags
 from .exception import DataStoreException
 from .exception import DataStoreDuplicateKeyException
 from .exception import DataStoreForeignKeyException
 from .exception import IllegalMixOfCollationsException
-from .FallBack import FallBack
-from pymysql.cursors import DictCursorMixin, Cursor
-from .Randomizer import Randomizer
+from . import host_health
+from .durability import get_durability
+from pymysql.cursors import DictCursorMixin, Cursor, SSCursor
+from . import replication
 from .RDBMSBase import RDBMSBase
-from tinyAPI.base.data_store.memcache import Memcache
+from .prepared_statement import get_statement
+from .prepared_statement import PreparedStatement
+from .statement_cache import get_literal_markers
 
 import pymysql
-import re
 import time
 import tinyAPI.base.context as Context
 
@@ -27,6 +30,8 @@ class MySQL(RDBMSBase):
     Manages interactions with configured MySQL servers.
     '''
 
+    _RETRYABLE_ERRORS = (1205, 1213, 2003, 2006, 2013)
+
     def __init__(self):
         super(MySQL, self).__init__()
 
@@ -36,12 +41,18 @@ class MySQL(RDBMSBase):
         self.__last_row_id = None
 
     def close(self):
+        if self._replica is not None:
+            self._replica.close()
+
         self.__close_cursor()
-        Memcache().clear_local_cache()
 
         if self.__mysql:
-            if self.persistent is False:
-                self.__mysql.close()
+            if self._pool is not None:
+                self._pool.checkin(self.__mysql, self.persistent is False)
+                self._pool = None
+                self.__mysql = None
+            elif self.persistent is False:
+                self._close_connection(self.__mysql)
                 self.__mysql = None
 
         if self._memcache is not None:
@@ -49,6 +60,10 @@ class MySQL(RDBMSBase):
                 self._memcache.close()
                 self._memcache = None
 
+    def _close_connection(self, connection):
+        host_health.connection_closed(connection.host)
+        connection.close()
+
     def __close_cursor(self):
         if self.__cursor is not None:
             self.__cursor.close()
@@ -56,7 +71,11 @@ class MySQL(RDBMSBase):
 
     def commit(self, ignore_exceptions=False):
         if self.__mysql is None:
-            if not ignore_exceptions:
+            # A pooled connection is returned to the pool as soon as the
+            # transaction ends so once a statement has been executed there
+            # is nothing left to commit and this is a no-op.  A handle that
+            # has never connected still raises.
+            if self._pool is None and not ignore_exceptions:
                 raise DataStoreException(
                     'transaction cannot be committed because a database '
                     + 'connection has not been established yet'
@@ -68,9 +87,12 @@ class MySQL(RDBMSBase):
                 self.connect()
                 self.__mysql.commit()
 
+                self._end_transaction(True)
+                self.__release_connection()
+
     def connect(self):
         if self.__mysql:
-            if self.should_ping() is True:
+            if self._pool is None and self.should_ping() is True:
                 self.__mysql.ping(True)
             return
 
@@ -80,61 +102,29 @@ class MySQL(RDBMSBase):
                 + 'has not been configured'
             )
 
-        if self._settings[self._group]['durability'] == 'randomizer':
-            durability = Randomizer(self._settings[self._group]['hosts'])
-        elif self._settings[self._group]['durability'] == 'fall back':
-            durability = FallBack(self._settings[self._group]['hosts'])
+        self._pool = self._get_pool()
+        if self._pool is not None:
+            self.__mysql = self._pool.checkout()
         else:
-            raise DataStoreException(
-                'unrecognized durability algorithm "{}"'
-                    .format(self._settings[self._group]['durability'])
-            )
-
-        while True:
-            host, user, password = durability.next()
+            self.__mysql = \
+                self._open_connection(
+                    self._settings, self._db, self._group, self._charset
+                )
 
-            config = {
-                'user': user,
-                'passwd': password,
-                'host': host,
-                'database': self._db,
-                'charset': self._charset,
-                'local_infile': True,
-                'autocommit': False
-            }
+        self._inactive_since = time.time()
 
-            try:
-                self.__mysql = \
-                    pymysql.connect(**config)
-                self.__mysql.decoders[pymysql.FIELD_TYPE.TIME] = \
-                    pymysql.converters.convert_time
-                break
-            except pymysql.err.OperationalError as e:
-                errno, message = e.args
+    def __connect_and_execute(self, execute, *args):
+        self.connect()
 
-                if errno == 2003:
-                    durability.next()
-                else:
-                    raise
+        cursor = self.__get_cursor()
+        execute(cursor, *args)
 
-        self._inactive_since = time.time()
+        return cursor
 
     def connection_id(self):
         self.connect()
         return self.__mysql.thread_id()
 
-    def __convert_to_prepared(self, separator, data=tuple()):
-        binds = self.__get_binds(data)
-
-        clause = []
-        for index, key in enumerate(data.keys()):
-            assignment = ''
-            assignment += key + ' = '
-            assignment += binds[index]
-            clause.append(assignment)
-
-        return separator.join(clause)
-
     def count(self, sql, binds=tuple()):
         record = self.nth(0, sql, binds)
         if record is None:
@@ -146,28 +136,161 @@ class MySQL(RDBMSBase):
         if len(data) == 0:
             return None
 
-        keys = list(data.keys())
-        binds = self.__get_binds(data)
-        vals = self.__get_values(data.values())
+        values = list(data.values())
+        statement = \
+            self._statement_cache.insert(
+                target, tuple(data.keys()), get_literal_markers(values)
+            )
 
-        sql  = 'insert into ' + target + '('
-        sql += ', '.join(keys)
-        sql += ')'
-        sql += ' values ('
-        sql += ', '.join(binds)
-        sql += ')'
+        sql = statement.sql
+        binds = statement.binds
+        vals = statement.get_values(values)
+
+        started = time.time()
+        cursor = \
+            self._retry(
+                self.__connect_and_execute,
+                self.__execute_insert,
+                sql,
+                vals,
+                binds
+            )
 
-        self.connect()
+        self.__row_count = cursor.rowcount
 
-        cursor = self.__get_cursor()
+        self._record_statement(
+            sql, time.time() - started, self.__row_count, vals
+        )
+
+        self._register_write([cache_tags.get_tag(target)])
+
+        id = None
+        if return_insert_id:
+            id = cursor.lastrowid
+
+        self.__close_cursor()
+
+        return id
+
+    def __create_chunk(self, target, keys, markers, batch, offset):
+        statement = self._statement_cache.insert(target, keys, markers)
+
+        binds = statement.binds
+        row_sql = statement.sql
+
+        sql = \
+            row_sql \
+            + (', (' + ', '.join(binds) + ')') * (len(batch) - 1)
+
+        vals = []
+        for data in batch:
+            vals.extend(statement.get_values(list(data.values())))
+
+        started = time.time()
+        row_count = \
+            self._retry(
+                self.__execute_chunk, statement, sql, vals, batch, offset
+            )
+
+        self._record_statement(sql, time.time() - started, row_count, vals)
+
+        return row_count
+
+    def create_many(self, target, rows=tuple(), chunk_size=1000):
+        '''
+        Create many records using multi-row inserts of up to chunk_size rows
+        each.  Consecutive rows with the same columns (and the same literal
+        values like current_timestamp) share a single statement template.
+
+        Returns a list containing the number of rows created by each chunk.
+        If a duplicate key or foreign key error occurs, the row_index of the
+        exception identifies the offending row in rows.  Each chunk is a
+        statement of its own so only the first chunk of a transaction can be
+        retried; see _retry().
+        '''
+
+        if chunk_size < 1:
+            raise DataStoreException('chunk size must be at least 1')
+
+        row_counts = []
+        batch = []
+        offset = 0
+        signature = None
+
+        for index, data in enumerate(rows):
+            row_signature = \
+                (tuple(data.keys()), get_literal_markers(data.values()))
+
+            if len(batch) > 0 and \
+               (row_signature != signature or len(batch) >= chunk_size):
+                row_counts.append(
+                    self.__create_chunk(
+                        target, signature[0], signature[1], batch, offset
+                    )
+                )
+
+                batch = []
+                offset = index
+
+            signature = row_signature
+            batch.append(data)
+
+        if len(batch) > 0:
+            row_counts.append(
+                self.__create_chunk(
+                    target, signature[0], signature[1], batch, offset
+                )
+            )
+
+        self.__row_count = sum(row_counts)
+
+        if len(row_counts) > 0:
+            self._register_write([cache_tags.get_tag(target)])
+
+        return row_counts
+
+    def delete(self, target, data=tuple()):
+        values = list(data.values())
+        sql = \
+            self._statement_cache.delete(
+                target, tuple(data.keys()), get_literal_markers(values)
+            ) \
+                .sql
+
+        binds = None
+        if len(data) > 0:
+            binds = values
+
+        started = time.time()
+        cursor = \
+            self._retry(
+                self.__connect_and_execute, self.__execute, sql, binds
+            )
+
+        self.__row_count = cursor.rowcount
+
+        self._record_statement(
+            sql, time.time() - started, self.__row_count, binds
+        )
+
+        self._register_write([cache_tags.get_tag(target)])
+        self.memcache_purge()
 
+        self.__close_cursor()
+        self._reset_memcache()
+
+        return True
+
+    def __execute(self, cursor, sql, binds=tuple()):
         try:
-            cursor.execute(sql, vals)
-        except pymysql.err.IntegrityError as e:
+            cursor.execute(sql, binds)
+        except (pymysql.err.IntegrityError, pymysql.err.InternalError) as e:
             errno, message = e.args
 
             if errno == 1062:
                 raise DataStoreDuplicateKeyException(message)
+            elif errno == 1271:
+                raise IllegalMixOfCollationsException(sql, binds)
             elif errno == 1452:
                 raise DataStoreForeignKeyException(message)
             else:
@@ -182,38 +305,108 @@ class MySQL(RDBMSBase):
                     )
                 )
 
-        self.__row_count = cursor.rowcount
+    def __execute_chunk(self, statement, sql, vals, batch, offset):
+        self.connect()
 
-        id = None
-        if return_insert_id:
-            id = cursor.lastrowid
+        cursor = self.__get_cursor()
+
+        try:
+            cursor.execute(sql, vals)
+        except pymysql.err.IntegrityError as e:
+            errno, message = e.args
+
+            if errno == 1062 or errno == 1452:
+                row_index = \
+                    self.__find_offending_row(
+                        cursor, statement, batch, pymysql.err.IntegrityError
+                    )
+                if row_index is not None:
+                    row_index += offset
+
+                if errno == 1062:
+                    raise DataStoreDuplicateKeyException(message, row_index)
+                else:
+                    raise DataStoreForeignKeyException(message, row_index)
+            else:
+                raise
+        except pymysql.err.ProgrammingError as e:
+            errno, message = e.args
+
+            raise \
+                DataStoreException(
+                    self.__format_query_execution_error(
+                        sql, message, statement.binds
+                    )
+                )
+
+        row_count = cursor.rowcount
 
         self.__close_cursor()
 
-        return id
+        return row_count
 
-    def delete(self, target, data=tuple()):
-        sql = 'delete from ' + target
+    def __execute_insert(self, cursor, sql, vals, binds):
+        try:
+            cursor.execute(sql, vals)
+        except pymysql.err.IntegrityError as e:
+            errno, message = e.args
 
-        binds = None
-        if len(data) > 0:
-            sql += ' where ' + self.__convert_to_prepared(', ', data)
-            binds = list(data.values())
+            if errno == 1062:
+                raise DataStoreDuplicateKeyException(message)
+            elif errno == 1452:
+                raise DataStoreForeignKeyException(message)
+            else:
+                raise
+        except pymysql.err.ProgrammingError as e:
+            errno, message = e.args
 
+            raise \
+                DataStoreException(
+                    self.__format_query_execution_error(
+                        sql, message, binds
+                    )
+                )
+
+    def __execute_unbuffered(self, sql, binds):
         self.connect()
 
-        cursor = self.__get_cursor()
+        cursor = \
+            self.__mysql.cursor(
+                pymysql.cursors.SSDictCursor
+                    if self._ordered_dict_cursor is False else
+                OrderedSSDictCursor
+            )
 
-        cursor.execute(sql, binds)
+        try:
+            self.__execute(cursor, sql, binds)
+        except Exception:
+            cursor.close()
+            raise
 
-        self.__row_count = cursor.rowcount
+        return cursor
 
-        self.memcache_purge()
+    def __find_offending_row(self, cursor, statement, batch, error):
+        '''
+        Re-run the rows of a failed multi-row insert one at a time inside of
+        a savepoint to determine which one caused the failure.
+        '''
 
-        self.__close_cursor()
-        self._reset_memcache()
+        cursor.execute('savepoint create_many_row')
 
-        return True
+        try:
+            for index, data in enumerate(batch):
+                try:
+                    cursor.execute(
+                        statement.sql,
+                        statement.get_values(list(data.values()))
+                    )
+                except error:
+                    return index
+
+            return None
+        finally:
+            cursor.execute('rollback to savepoint create_many_row')
+            cursor.execute('release savepoint create_many_row')
 
     def __format_query_execution_error(self, sql, message, binds=tuple()):
         return ('execution of this query:\n\n'
@@ -223,22 +416,6 @@ class MySQL(RDBMSBase):
                 + '\n\nproduced this error:\n\n'
                 + message)
 
-    def __get_binds(self, data=tuple()):
-        if len(data) == 0:
-            return tuple()
-
-        binds = []
-        for value in list(data.values()):
-            str_value = str(value)
-
-            if re.match('current_timestamp', str_value) is not None or \
-               str_value == 'current_date':
-                binds.append(value)
-            else:
-                binds.append('%s')
-
-        return binds
-
     def __get_cursor(self):
         if self.__cursor is not None:
             return self.__cursor
@@ -252,25 +429,84 @@ class MySQL(RDBMSBase):
 
         return self.__cursor
 
+    def _get_connection_host(self, connection):
+        return connection.host
+
+    def _get_error_code(self, error):
+        # pymysql raises InterfaceError when the connection has already been
+        # closed, which is no different from the server having gone away.
+        if isinstance(error, pymysql.err.InterfaceError):
+            return 2006
+
+        if isinstance(error, pymysql.err.MySQLError) and \
+           len(error.args) > 0 and \
+           isinstance(error.args[0], int):
+            return error.args[0]
+
+        return None
+
     def get_last_row_id(self):
         return self.__last_row_id
 
+    def _get_replica_lag(self, connection):
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            cursor.execute('show slave status')
+            status = cursor.fetchone()
+        finally:
+            cursor.close()
+
+        if status is None:
+            return 0
+
+        return status['Seconds_Behind_Master']
+
     def get_row_count(self):
         return self.__row_count
 
-    def __get_values(self, data=tuple()):
-        if len(data) == 0:
-            return tuple()
+    def iterate(self, sql, binds=tuple(), batch_size=1000):
+        '''
+        Execute a query and yield its records one at a time using a server
+        side cursor, fetching batch_size records per round trip.  Only one
+        batch is held in memory at a time.
 
-        values = []
-        for value in data:
-            str_value = str(value)
+        The connection cannot be used for other queries until the generator
+        has been exhausted or closed.  Results are never cached.  Executing
+        the query is retried like any other statement but errors raised
+        while the records are being fetched are not.  The statement is
+        recorded, with the number of records fetched, once the generator
+        has been exhausted or closed.
+        '''
+
+        statement = \
+            sql if sql.__class__ is PreparedStatement else get_statement(sql)
+
+        self._reset_memcache()
+
+        handle = self._route_read(statement)
+        if handle is not self:
+            yield from handle.iterate(statement, binds, batch_size)
+            return
+
+        started = time.time()
+        cursor = \
+            self._retry(self.__execute_unbuffered, statement.sql, binds)
+        duration = time.time() - started
+
+        rows = 0
+        try:
+            while True:
+                records = cursor.fetchmany(batch_size)
+                if not records:
+                    break
 
-            if re.match('current_timestamp', str_value) is None and \
-               str_value != 'current_date':
-                values.append(value)
+                rows += len(records)
+                for record in records:
+                    yield record
+        finally:
+            cursor.close()
 
-        return values
+            self._record_statement(statement.sql, duration, rows, binds)
 
     def nth(self, index, sql, binds=tuple()):
         records = self.query(sql, binds)
@@ -280,53 +516,98 @@ class MySQL(RDBMSBase):
         else:
             return None
 
-    def query(self, sql, binds=tuple()):
-        results_from_cache = self.memcache_retrieve()
-        if results_from_cache is not None:
-            self._reset_memcache()
-            return results_from_cache
+    def _open_connection(self, settings, db, group, charset):
+        durability = \
+            get_durability(
+                settings[group],
+                replication.filter_hosts(settings[group]['hosts'])
+            )
 
-        self.connect()
+        while True:
+            host, user, password = durability.next()
 
-        is_select = False
-        if re.match('^\(?select ', sql) or re.match('^show ', sql):
-            is_select = True
+            config = {
+                'user': user,
+                'passwd': password,
+                'host': host,
+                'database': db,
+                'charset': charset,
+                'local_infile': True,
+                'autocommit': False
+            }
 
-        cursor = self.__get_cursor()
+            started = time.time()
+            try:
+                connection = \
+                    pymysql.connect(**config)
+            except pymysql.err.OperationalError as e:
+                errno, message = e.args
 
-        try:
-            cursor.execute(sql, binds)
-        except (pymysql.err.IntegrityError, pymysql.err.InternalError) as e:
-            errno, message = e.args
+                if errno in (2003, 2013):
+                    host_health.record_failure(
+                        host, settings[group].get('circuit breaker')
+                    )
+                    continue
+                else:
+                    raise
 
-            if errno == 1062:
-                raise DataStoreDuplicateKeyException(message)
-            elif errno == 1271:
-                raise IllegalMixOfCollationsException(sql, binds)
-            elif errno == 1452:
-                raise DataStoreForeignKeyException(message)
-            else:
-                raise
-        except pymysql.err.ProgrammingError as e:
-            errno, message = e.args
+            host_health.record_success(host, time.time() - started)
+            host_health.connection_opened(host)
 
-            raise \
-                DataStoreException(
-                    self.__format_query_execution_error(
-                        sql, message, binds
-                    )
-                )
+            connection.decoders[pymysql.FIELD_TYPE.TIME] = \
+                pymysql.converters.convert_time
+            return connection
+
+    def _ping_connection(self, connection):
+        connection.ping(False)
+
+    def query(self, sql, binds=tuple()):
+        statement = \
+            sql if sql.__class__ is PreparedStatement else get_statement(sql)
+
+        handle = self._route_read(statement)
+        if handle is not self:
+            return handle.query(statement, binds)
+
+        self._apply_memcache_tags(statement.read_tags)
+
+        results_from_cache = self.memcache_retrieve()
+        if results_from_cache is not None:
+            self._reset_memcache()
+            return results_from_cache
+
+        started = time.time()
+        cursor = \
+            self._retry(
+                self.__connect_and_execute,
+                self.__execute,
+                statement.sql,
+                binds
+            )
 
         self.__row_count = cursor.rowcount
         self.__last_row_id = cursor.lastrowid
 
-        if is_select:
+        if statement.is_select:
             results = cursor.fetchall()
             if results == ():
                 results = []
 
+            self._record_statement(
+                statement.sql, time.time() - started, len(results), binds
+            )
+
             self.memcache_store(results)
         else:
+            self._record_statement(
+                statement.sql,
+                time.time() - started,
+                self.__row_count,
+                binds
+            )
+
+            self._register_write(statement.written_tags)
+
             results = True
 
         self.__close_cursor()
@@ -334,9 +615,53 @@ class MySQL(RDBMSBase):
 
         return results
 
+    def _recover_from_error(self, error):
+        self.__cursor = None
+
+        if self.__mysql is None:
+            return
+
+        try:
+            self.__mysql.rollback()
+        except Exception:
+            if self._pool is not None:
+                self._pool.checkin(self.__mysql, True)
+                self._pool = None
+            else:
+                try:
+                    self._close_connection(self.__mysql)
+                except Exception:
+                    pass
+
+            self.__mysql = None
+
+        self._end_transaction(False)
+        self.__release_connection()
+
+    def __release_connection(self):
+        '''
+        Return a pooled connection to the pool once its transaction has
+        ended so that it is not held by a handle that is no longer using it.
+        The transaction has just been committed or rolled back so it does
+        not need to be reset.  The next statement checks out a connection
+        again.
+        '''
+
+        if self._pool is None or self.__mysql is None:
+            return
+
+        self.__close_cursor()
+
+        self._pool.checkin(self.__mysql, reset=False)
+        self.__mysql = None
+
     def rollback(self, ignore_exceptions=False):
         if self.__mysql is None:
-            if not ignore_exceptions:
+            # A pooled connection is returned to the pool as soon as the
+            # transaction ends so once a statement has been executed there
+            # is nothing left to roll back and this is a no-op.  A handle that
+            # has never connected still raises.
+            if self._pool is None and not ignore_exceptions:
                 raise DataStoreException(
                     'transaction cannot be rolled back because a database '
                     + 'connection has not been established yet'
@@ -345,7 +670,17 @@ class MySQL(RDBMSBase):
             self.connect()
             self.__mysql.rollback()
 
+            self._end_transaction(False)
+            self.__release_connection()
+
+    def _reset_connection(self, connection):
+        connection.rollback()
+
 # ----- Private Classes -------------------------------------------------------
 
 class OrderedDictCursor(DictCursorMixin, Cursor):
     dict_type = OrderedDict
+
+
+class OrderedSSDictCursor(DictCursorMixin, SSCursor):
+    dict_type = OrderedDict
@@ -4,18 +4,43 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 
 # ----- Imports ---------------------------------------------------------------
 
+from . import cache_tags
 from .exception import DataStoreException
 from .exception import DataStoreDuplicateKeyException
 from .exception import DataStoreForeignKeyException
-from .Randomizer import Randomizer
+from .durability import get_durability
+from . import host_health
+from . import replication
 from .RDBMSBase import RDBMSBase
-from tinyAPI.base.data_store.memcache import Memcache
+from .prepared_statement import get_statement
+from .prepared_statement import PreparedStatement
+from .statement_cache import get_literal_markers
 
 import psycopg2
 import psycopg2.extras
 import re
 import time
+import threading
 import tinyAPI.base.context as Context
+import weakref
+
+# ----- Constants -------------------------------------------------------------
+
+# libpq reports that a host could not be reached without a SQLSTATE; these
+# are the messages that, like MySQL errors 2003 and 2013, mean the host is
+# down or unreachable rather than that the credentials or database are
+# wrong.
+_HOST_FAILURE_MESSAGES = \
+    re.compile(
+        'connection refused|could not connect to server|timeout expired|'
+        + 'timed out|server closed the connection unexpectedly',
+        re.IGNORECASE
+    )
+
+# ----- Process Local Data ----------------------------------------------------
+
+_prepared_statements = weakref.WeakKeyDictionary()
+_prepared_statements_lock = threading.Lock()
 
 # ----- Public Classes --------------------------------------------------------
 
@@ -24,6 +49,10 @@ class PostgreSQL(RDBMSBase):
     Manages interactions with configured PostgreSQL servers.
     '''
 
+    # serialization failure, deadlock, lock not available and connection
+    # exceptions
+    _RETRYABLE_ERRORS = ('40001', '40P01', '55P03', '08000', '08003', '08006')
+
     def __init__(self):
         super(PostgreSQL, self).__init__()
 
@@ -31,14 +60,23 @@ class PostgreSQL(RDBMSBase):
         self.__cursor = None
         self.__row_count = None
         self.__last_row_id = None
+        self.__num_named_cursors = 0
 
     def close(self):
+        if self._replica is not None:
+            self._replica.close()
+
         self.__close_cursor()
-        Memcache().clear_local_cache()
 
         if self.__postgresql:
-            if self.persistent is False:
-                self.__postgresql.close()
+            if self._pool is not None:
+                self._pool.checkin(
+                    self.__postgresql, self.persistent is False
+                )
+                self._pool = None
+                self.__postgresql = None
+            elif self.persistent is False:
+                self._close_connection(self.__postgresql)
                 self.__postgresql = None
 
         if self._memcache is not None:
@@ -46,6 +84,10 @@ class PostgreSQL(RDBMSBase):
                 self._memcache.close()
                 self._memcache = None
 
+    def _close_connection(self, connection):
+        host_health.connection_closed(self._get_connection_host(connection))
+        connection.close()
+
     def __close_cursor(self):
         if self.__cursor is not None:
             self.__cursor.close()
@@ -53,7 +95,11 @@ class PostgreSQL(RDBMSBase):
 
     def commit(self, ignore_exceptions=False):
         if self.__postgresql is None:
-            if not ignore_exceptions:
+            # A pooled connection is returned to the pool as soon as the
+            # transaction ends so once a statement has been executed there
+            # is nothing left to commit and this is a no-op.  A handle that
+            # has never connected still raises.
+            if self._pool is None and not ignore_exceptions:
                 raise DataStoreException(
                     'transaction cannot be committed because a database '
                     + 'connection has not been established yet'
@@ -65,9 +111,12 @@ class PostgreSQL(RDBMSBase):
                 self.connect()
                 self.__postgresql.commit()
 
+                self._end_transaction(True)
+                self.__release_connection()
+
     def connect(self):
         if self.__postgresql:
-            if self.should_ping() is True:
+            if self._pool is None and self.should_ping() is True:
                 self.query('select 1')
                 self.commit()
             return
@@ -78,48 +127,29 @@ class PostgreSQL(RDBMSBase):
                 + 'has not been configured'
             )
 
-        if self._settings[self._group]['durability'] == 'randomizer':
-            durability = Randomizer(self._settings[self._group]['hosts'])
+        self._pool = self._get_pool()
+        if self._pool is not None:
+            self.__postgresql = self._pool.checkout()
         else:
-            raise DataStoreException(
-                'unrecognized durability algorithm "{}"'
-                    .format(self._settings[self._group]['durability'])
-            )
+            self.__postgresql = \
+                self._open_connection(
+                    self._settings, self._db, self._group, self._charset
+                )
 
-        while True:
-            host, user, password = durability.next()
+        self._inactive_since = time.time()
 
-            config = {
-                'user': user,
-                'password': password,
-                'host': host,
-                'database': self._db
-            }
+    def __connect_and_execute(self, execute, *args):
+        self.connect()
 
-            try:
-                self.__postgresql = psycopg2.connect(**config)
-                break
-            except psycopg2.OperationalError as e:
-                durability.next()
+        cursor = self.__get_cursor()
+        execute(cursor, *args)
 
-        self._inactive_since = time.time()
+        return cursor
 
     def connection_id(self):
         self.connect()
         return self.__postgresql.thread_id()
 
-    def __convert_to_prepared(self, separator, data=tuple()):
-        binds = self.__get_binds(data)
-
-        clause = []
-        for index, key in enumerate(data.keys()):
-            assignment = ''
-            assignment += key + ' = '
-            assignment += binds[index]
-            clause.append(assignment)
-
-        return separator.join(clause)
-
     def count(self, sql, binds=tuple()):
         record = self.nth(0, sql, binds)
         if record is None:
@@ -131,23 +161,154 @@ class PostgreSQL(RDBMSBase):
         if len(data) == 0:
             return None
 
-        keys = list(data.keys())
-        binds = self.__get_binds(data)
-        vals = self.__get_values(data.values())
+        values = list(data.values())
+        statement = \
+            self._statement_cache.insert(
+                target, tuple(data.keys()), get_literal_markers(values)
+            )
 
-        sql  = 'insert into ' + target + '('
-        sql += ', '.join(keys)
-        sql += ')'
-        sql += ' values ('
-        sql += ', '.join(binds)
-        sql += ')'
+        sql = statement.sql
+        binds = statement.binds
+        vals = statement.get_values(values)
+
+        started = time.time()
+        cursor = \
+            self._retry(
+                self.__connect_and_execute,
+                self.__execute_insert,
+                sql,
+                vals,
+                binds
+            )
 
-        self.connect()
+        self.__row_count = cursor.rowcount
 
-        cursor = self.__get_cursor()
+        self._record_statement(
+            sql, time.time() - started, self.__row_count, vals
+        )
+
+        self._register_write([cache_tags.get_tag(target)])
+
+        id = None
+        if return_insert_id:
+            id = cursor.lastrowid
+
+        self.__close_cursor()
+
+        return id
+
+    def __create_chunk(self, target, keys, markers, batch, offset):
+        statement = self._statement_cache.insert(target, keys, markers)
+
+        binds = statement.binds
+        row_sql = statement.sql
+
+        sql = \
+            row_sql \
+            + (', (' + ', '.join(binds) + ')') * (len(batch) - 1)
+
+        vals = []
+        for data in batch:
+            vals.extend(statement.get_values(list(data.values())))
+
+        started = time.time()
+        row_count = \
+            self._retry(
+                self.__execute_chunk, statement, sql, vals, batch, offset
+            )
+
+        self._record_statement(sql, time.time() - started, row_count, vals)
+
+        return row_count
+
+    def create_many(self, target, rows=tuple(), chunk_size=1000):
+        '''
+        Create many records using multi-row inserts of up to chunk_size rows
+        each.  Consecutive rows with the same columns (and the same literal
+        values like current_timestamp) share a single statement template.
+
+        Returns a list containing the number of rows created by each chunk.
+        If a duplicate key or foreign key error occurs, the row_index of the
+        exception identifies the offending row in rows.  Each chunk is a
+        statement of its own so only the first chunk of a transaction can be
+        retried; see _retry().
+        '''
+
+        if chunk_size < 1:
+            raise DataStoreException('chunk size must be at least 1')
+
+        row_counts = []
+        batch = []
+        offset = 0
+        signature = None
+
+        for index, data in enumerate(rows):
+            row_signature = \
+                (tuple(data.keys()), get_literal_markers(data.values()))
+
+            if len(batch) > 0 and \
+               (row_signature != signature or len(batch) >= chunk_size):
+                row_counts.append(
+                    self.__create_chunk(
+                        target, signature[0], signature[1], batch, offset
+                    )
+                )
+
+                batch = []
+                offset = index
 
+            signature = row_signature
+            batch.append(data)
+
+        if len(batch) > 0:
+            row_counts.append(
+                self.__create_chunk(
+                    target, signature[0], signature[1], batch, offset
+                )
+            )
+
+        self.__row_count = sum(row_counts)
+
+        if len(row_counts) > 0:
+            self._register_write([cache_tags.get_tag(target)])
+
+        return row_counts
+
+    def delete(self, target, data=tuple()):
+        values = list(data.values())
+        sql = \
+            self._statement_cache.delete(
+                target, tuple(data.keys()), get_literal_markers(values)
+            ) \
+                .sql
+
+        binds = None
+        if len(data) > 0:
+            binds = values
+
+        started = time.time()
+        cursor = \
+            self._retry(
+                self.__connect_and_execute, self.__execute, sql, binds
+            )
+
+        self.__row_count = cursor.rowcount
+
+        self._record_statement(
+            sql, time.time() - started, self.__row_count, binds
+        )
+
+        self._register_write([cache_tags.get_tag(target)])
+        self.memcache_purge()
+
+        self.__close_cursor()
+        self._reset_memcache()
+
+        return True
+
+    def __execute(self, cursor, sql, binds=tuple()):
         try:
-            cursor.execute(sql, vals)
+            cursor.execute(sql, binds)
         except psycopg2.IntegrityError as e:
             if e.pgcode == '23505':
                 raise DataStoreDuplicateKeyException(e.pgerror)
@@ -163,38 +324,155 @@ class PostgreSQL(RDBMSBase):
                     )
                 )
 
-        self.__row_count = cursor.rowcount
+    def __execute_chunk(self, statement, sql, vals, batch, offset):
+        self.connect()
 
-        id = None
-        if return_insert_id:
-            id = cursor.lastrowid
+        cursor = self.__get_cursor()
+
+        cursor.execute('savepoint create_many')
+
+        try:
+            cursor.execute(sql, vals)
+        except psycopg2.IntegrityError as e:
+            cursor.execute('rollback to savepoint create_many')
+
+            if e.pgcode == '23505' or e.pgcode == '23503':
+                row_index = \
+                    self.__find_offending_row(
+                        cursor, statement, batch, psycopg2.IntegrityError
+                    )
+                if row_index is not None:
+                    row_index += offset
+
+                if e.pgcode == '23505':
+                    raise DataStoreDuplicateKeyException(e.pgerror, row_index)
+                else:
+                    raise DataStoreForeignKeyException(e.pgerror, row_index)
+            else:
+                raise
+        except psycopg2.ProgrammingError as e:
+            cursor.execute('rollback to savepoint create_many')
+
+            raise \
+                DataStoreException(
+                    self.__format_query_execution_error(
+                        sql, e.pgerror, statement.binds
+                    )
+                )
+
+        row_count = cursor.rowcount
+
+        cursor.execute('release savepoint create_many')
 
         self.__close_cursor()
 
-        return id
+        return row_count
 
-    def delete(self, target, data=tuple()):
-        sql = 'delete from ' + target
+    def __execute_insert(self, cursor, sql, vals, binds):
+        try:
+            cursor.execute(sql, vals)
+        except psycopg2.IntegrityError as e:
+            if e.pgcode == '23505':
+                raise DataStoreDuplicateKeyException(e.pgerror)
+            elif e.pgcode == '23503':
+                raise DataStoreForeignKeyException(e.pgerror)
+            else:
+                raise
+        except psycopg2.ProgrammingError as e:
+            raise \
+                DataStoreException(
+                    self.__format_query_execution_error(
+                        sql, e.pgerror, binds
+                    )
+                )
 
-        binds = None
-        if len(data) > 0:
-            sql += ' where ' + self.__convert_to_prepared(', ', data)
-            binds = list(data.values())
+    def __execute_prepared(self, cursor, statement, binds=tuple()):
+        '''
+        Execute a statement that has been prepared on the server, preparing
+        it first if that has not been done on this connection yet.
+        Prepared statements last as long as the connection does.
+        '''
+
+        with _prepared_statements_lock:
+            prepared = _prepared_statements.get(self.__postgresql)
+            if prepared is None:
+                prepared = set()
+                _prepared_statements[self.__postgresql] = prepared
 
+        if statement.name not in prepared:
+            self.__execute(cursor, statement.get_prepare_sql(), None)
+            prepared.add(statement.name)
+
+        self.__execute(cursor, statement.get_execute_sql(), binds)
+
+    def __execute_unbuffered(self, sql, binds, batch_size):
         self.connect()
 
-        cursor = self.__get_cursor()
+        if sql.__class__ is PreparedStatement and sql.server_sql is not None:
+            cursor = \
+                self.__postgresql.cursor(
+                    cursor_factory=psycopg2.extras.RealDictCursor
+                )
+            execute = self.__execute_prepared
+        else:
+            statement = \
+                sql if sql.__class__ is PreparedStatement else \
+                get_statement(sql)
+            sql = statement.sql
+
+            if statement.is_select:
+                self.__num_named_cursors += 1
+
+                cursor = \
+                    self.__postgresql.cursor(
+                        'tinyapi_iterate_{}'.format(self.__num_named_cursors),
+                        cursor_factory=psycopg2.extras.RealDictCursor
+                    )
+                cursor.itersize = batch_size
+            else:
+                # Named cursors can only be declared for queries so anything
+                # else (e.g. an update ... returning) uses a regular cursor.
+                cursor = \
+                    self.__postgresql.cursor(
+                        cursor_factory=psycopg2.extras.RealDictCursor
+                    )
+            execute = self.__execute
 
-        cursor.execute(sql, binds)
+        try:
+            execute(cursor, sql, binds)
+        except Exception:
+            # Closing a named cursor can fail once the transaction has been
+            # aborted; the error that caused it is the one worth raising.
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            raise
 
-        self.__row_count = cursor.rowcount
+        return cursor
 
-        self.memcache_purge()
+    def __find_offending_row(self, cursor, statement, batch, error):
+        '''
+        Re-run the rows of a failed multi-row insert one at a time inside of
+        a savepoint to determine which one caused the failure.
+        '''
 
-        self.__close_cursor()
-        self._reset_memcache()
+        cursor.execute('savepoint create_many_row')
 
-        return True
+        try:
+            for index, data in enumerate(batch):
+                try:
+                    cursor.execute(
+                        statement.sql,
+                        statement.get_values(list(data.values()))
+                    )
+                except error:
+                    return index
+
+            return None
+        finally:
+            cursor.execute('rollback to savepoint create_many_row')
+            cursor.execute('release savepoint create_many_row')
 
     def __format_query_execution_error(self, sql, message, binds=tuple()):
         return ('execution of this query:\n\n'
@@ -204,22 +482,6 @@ class PostgreSQL(RDBMSBase):
                 + '\n\nproduced this error:\n\n'
                 + message)
 
-    def __get_binds(self, data=tuple()):
-        if len(data) == 0:
-            return tuple()
-
-        binds = []
-        for value in list(data.values()):
-            str_value = str(value)
-
-            if re.match('current_timestamp', str_value) is not None or \
-               str_value == 'current_date':
-                binds.append(value)
-            else:
-                binds.append('%s')
-
-        return binds
-
     def __get_cursor(self):
         if self.__cursor is not None:
             return self.__cursor
@@ -231,25 +493,100 @@ class PostgreSQL(RDBMSBase):
 
         return self.__cursor
 
+    def _get_connection_host(self, connection):
+        return connection.get_dsn_parameters().get('host')
+
+    def _get_error_code(self, error):
+        if not isinstance(error, psycopg2.Error):
+            return None
+
+        if error.pgcode is not None:
+            return error.pgcode
+
+        # Errors raised by the client (rather than the server) when the
+        # connection is lost have no SQLSTATE.
+        if isinstance(error, (psycopg2.InterfaceError,
+                              psycopg2.OperationalError)):
+            return '08006'
+
+        return None
+
     def get_last_row_id(self):
         return self.__last_row_id
 
+    def _get_replica_lag(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                '''select case when pg_is_in_recovery()
+                               then coalesce(
+                                   extract(epoch from now()
+                                       - pg_last_xact_replay_timestamp()),
+                                   0)
+                               else 0
+                           end'''
+            )
+            lag = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+            connection.rollback()
+
+        return float(lag)
+
     def get_row_count(self):
         return self.__row_count
 
-    def __get_values(self, data=tuple()):
-        if len(data) == 0:
-            return tuple()
+    def iterate(self, sql, binds=tuple(), batch_size=1000):
+        '''
+        Execute a query and yield its records one at a time using a named
+        (server side) cursor, fetching batch_size records per round trip.
+        Only one batch is held in memory at a time.
+
+        Named cursors only live for the duration of the active transaction.
+        Statements returned by prepare() are executed on the server as
+        prepared statements with a regular cursor instead, as are statements
+        that are not queries (e.g. an update ... returning).  Results are
+        never cached.  Executing the query is retried like any other
+        statement but errors raised while the records are being fetched are
+        not.  The statement is recorded, with the number of records fetched,
+        once the generator has been exhausted or closed.
+        '''
+
+        self._reset_memcache()
 
-        values = []
-        for value in data:
-            str_value = str(value)
+        handle = \
+            self._route_read(
+                sql if sql.__class__ is PreparedStatement else
+                get_statement(sql)
+            )
+        if handle is not self:
+            yield from handle.iterate(sql, binds, batch_size)
+            return
 
-            if re.match('current_timestamp', str_value) is None and \
-               str_value != 'current_date':
-                values.append(value)
+        started = time.time()
+        cursor = \
+            self._retry(self.__execute_unbuffered, sql, binds, batch_size)
+        duration = time.time() - started
 
-        return values
+        rows = 0
+        try:
+            while True:
+                records = cursor.fetchmany(batch_size)
+                if not records:
+                    break
+
+                rows += len(records)
+                for record in records:
+                    yield record
+        finally:
+            cursor.close()
+
+            self._record_statement(
+                sql.sql if sql.__class__ is PreparedStatement else sql,
+                duration,
+                rows,
+                binds
+            )
 
     def nth(self, index, sql, binds=tuple()):
         records = self.query(sql, binds)
@@ -259,47 +596,115 @@ class PostgreSQL(RDBMSBase):
         else:
             return None
 
+    def _open_connection(self, settings, db, group, charset):
+        durability = \
+            get_durability(
+                settings[group],
+                replication.filter_hosts(settings[group]['hosts'])
+            )
+
+        while True:
+            host, user, password = durability.next()
+
+            config = {
+                'user': user,
+                'password': password,
+                'host': host,
+                'database': db
+            }
+
+            started = time.time()
+            try:
+                connection = psycopg2.connect(**config)
+            except psycopg2.OperationalError as e:
+                if e.pgcode is not None:
+                    is_host_failure = e.pgcode.startswith('08')
+                else:
+                    is_host_failure = \
+                        _HOST_FAILURE_MESSAGES.search(str(e)) is not None
+
+                if is_host_failure:
+                    host_health.record_failure(
+                        host, settings[group].get('circuit breaker')
+                    )
+                    continue
+                else:
+                    raise
+
+            host_health.record_success(host, time.time() - started)
+            host_health.connection_opened(host)
+
+            return connection
+
+    def _ping_connection(self, connection):
+        if connection.closed != 0:
+            return False
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute('select 1')
+        finally:
+            cursor.close()
+
+        connection.rollback()
+
     def query(self, sql, binds=tuple()):
+        statement = \
+            sql if sql.__class__ is PreparedStatement else get_statement(sql)
+
+        handle = self._route_read(statement)
+        if handle is not self:
+            return handle.query(statement, binds)
+
+        self._apply_memcache_tags(statement.read_tags)
+
         results_from_cache = self.memcache_retrieve()
         if results_from_cache is not None:
             self._reset_memcache()
             return results_from_cache
 
-        self.connect()
-
-        is_select = False
-        if re.match('^\(?select ', sql) or re.match('^show ', sql):
-            is_select = True
-
-        cursor = self.__get_cursor()
-
-        try:
-            cursor.execute(sql, binds)
-        except psycopg2.IntegrityError as e:
-            if e.pgcode == '23505':
-                raise DataStoreDuplicateKeyException(e.pgerror)
-            elif e.pgcode == '23503':
-                raise DataStoreForeignKeyException(e.pgerror)
-            else:
-                raise
-        except psycopg2.ProgrammingError as e:
-            raise \
-                DataStoreException(
-                    self.__format_query_execution_error(
-                        sql, e.pgerror, binds
-                    )
+        started = time.time()
+        if sql.__class__ is PreparedStatement and \
+           statement.server_sql is not None:
+            cursor = \
+                self._retry(
+                    self.__connect_and_execute,
+                    self.__execute_prepared,
+                    statement,
+                    binds
+                )
+        else:
+            cursor = \
+                self._retry(
+                    self.__connect_and_execute,
+                    self.__execute,
+                    statement.sql,
+                    binds
                 )
 
         self.__row_count = cursor.rowcount
         self.__last_row_id = cursor.lastrowid
 
-        if is_select:
+        if statement.is_select:
             results = cursor.fetchall()
             if results == ():
                 results = []
 
+            self._record_statement(
+                statement.sql, time.time() - started, len(results), binds
+            )
+
             self.memcache_store(results)
         else:
+            self._record_statement(
+                statement.sql,
+                time.time() - started,
+                self.__row_count,
+                binds
+            )
+
+            self._register_write(statement.written_tags)
+
             results = True
 
         self.__close_cursor()
@@ -307,9 +712,53 @@ class PostgreSQL(RDBMSBase):
 
         return results
 
+    def _recover_from_error(self, error):
+        self.__cursor = None
+
+        if self.__postgresql is None:
+            return
+
+        try:
+            self.__postgresql.rollback()
+        except Exception:
+            if self._pool is not None:
+                self._pool.checkin(self.__postgresql, True)
+                self._pool = None
+            else:
+                try:
+                    self._close_connection(self.__postgresql)
+                except Exception:
+                    pass
+
+            self.__postgresql = None
+
+        self._end_transaction(False)
+        self.__release_connection()
+
+    def __release_connection(self):
+        '''
+        Return a pooled connection to the pool once its transaction has
+        ended so that it is not held by a handle that is no longer using it.
+        The transaction has just been committed or rolled back so it does
+        not need to be reset.  The next statement checks out a connection
+        again.
+        '''
+
+        if self._pool is None or self.__postgresql is None:
+            return
+
+        self.__close_cursor()
+
+        self._pool.checkin(self.__postgresql, reset=False)
+        self.__postgresql = None
+
     def rollback(self, ignore_exceptions=False):
         if self.__postgresql is None:
-            if not ignore_exceptions:
+            # A pooled connection is returned to the pool as soon as the
+            # transaction ends so once a statement has been executed there
+            # is nothing left to roll back and this is a no-op.  A handle that
+            # has never connected still raises.
+            if self._pool is None and not ignore_exceptions:
                 raise DataStoreException(
                     'transaction cannot be rolled back because a database '
                     + 'connection has not been established yet'
@@ -317,3 +766,9 @@ class PostgreSQL(RDBMSBase):
         else:
             self.connect()
             self.__postgresql.rollback()
+
+            self._end_transaction(False)
+            self.__release_connection()
+
+    def _reset_connection(self, connection):
+        connection.rollback()
@@ -4,9 +4,24 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 
 # ----- Imports ---------------------------------------------------------------
 
+from .cached_query import CachedQuery
+from . import cache_tags
+from .ConnectionPool import ConnectionPool
 from .exception import DataStoreException
+from . import n_plus_one
+from .prepared_statement import get_statement
+from .prepared_statement import PreparedQuery
+from . import query_hooks
+from . import query_stats
+from . import replication
+from .retry import get_retry_policy
+from .statement_cache import StatementCache
 from tinyAPI.base.data_store.memcache import Memcache
+from tinyAPI.base import tracing
 
+import functools
+import os
+import threading
 import time
 import tinyAPI.base.context as Context
 
@@ -20,15 +35,26 @@ class __DataStoreBase(object):
 
     def __init__(self):
         self._settings = None
+        self._server = None
         self._db = None
         self._group = None
+        self._pool = None
         self._charset = 'utf8'
         self._memcache = None
         self._memcache_key = None
         self._memcache_ttl = None
+        self._memcache_tags = None
+        self._cached_query = None
+        self._invalidated_tags = set()
         self._ping_interval = 300
         self._inactive_since = time.time()
         self._ordered_dict_cursor = False
+        self._replica = None
+        self._in_transaction = False
+        self._transaction_started = False
+        self._last_write = None
+        self._retry_policy = None
+        self._retry_statements = True
 
         self.persistent = True
         if Context.env_cli() is True:
@@ -42,6 +68,34 @@ class RDBMSBase(__DataStoreBase):
     PostgreSQL, etc.).
     '''
 
+    _RETRYABLE_ERRORS = tuple()
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+    _statement_cache = StatementCache()
+
+    def _apply_memcache_tags(self, read_tags):
+        '''
+        When cache tags are enabled, replace the memcache key of the handle
+        with one that embeds the current generation of each table the query
+        depends on (those given to memcache() or, if none were, read_tags).
+        '''
+
+        if self._memcache_key is None or \
+           Context.env_unit_test() or \
+           not cache_tags.is_enabled():
+            return
+
+        tags = self._memcache_tags
+        if tags is None:
+            tags = read_tags
+
+        if self._memcache is None:
+            self._memcache = Memcache()
+
+        self._memcache_key = \
+            cache_tags.tag_key(self._memcache, self._memcache_key, tags)
+
     def close(self):
         '''
         Manually close the database connection.
@@ -51,14 +105,26 @@ class RDBMSBase(__DataStoreBase):
 
     def commit(self):
         '''
-        Manually commit the active transaction.
+        Manually commit the active transaction.  For pooled handles the
+        connection is returned to the pool afterwards; calling this again
+        before the next statement does nothing.
         '''
 
         raise NotImplementedError
 
-    def configure(self, settings, db, group):
+    def _close_connection(self, connection):
         '''
-        Configure the connection settings.
+        Close a raw connection created by _open_connection.
+        '''
+
+        raise NotImplementedError
+
+    def configure(self, settings, db, group, server=None):
+        '''
+        Configure the connection settings.  If a server name is provided
+        and the group configures a "pool", connections are drawn from a pool
+        shared by all handles configured for the same server, group and
+        database.  Otherwise the handle opens its own connection.
         '''
 
         if group not in settings:
@@ -67,11 +133,19 @@ class RDBMSBase(__DataStoreBase):
                     .format(group)
             )
 
+        if settings is self._settings and \
+           server == self._server and \
+           db == self._db and \
+           group == self._group:
+            return self
+
         self.close()
 
         self._settings = settings
+        self._server = server
         self._db = db
         self._group = group
+        self._retry_policy = None
         return self
 
     def count(self, sql, binds=tuple()):
@@ -88,6 +162,14 @@ class RDBMSBase(__DataStoreBase):
 
         return '' if return_insert_id else None
 
+    def create_many(self, target, rows=tuple(), chunk_size=1000):
+        '''
+        Create many records in the RDBMS using multi-row inserts and return
+        the number of rows created by each chunk.
+        '''
+
+        return []
+
     def delete(target, where=tuple(), binds=tuple()):
         '''
         Delete a record from the RDBMS.
@@ -95,15 +177,163 @@ class RDBMSBase(__DataStoreBase):
 
         return False
 
-    def memcache(self, key, ttl=0):
+    def _end_transaction(self, committed):
+        '''
+        Called once the active transaction has been committed or rolled
+        back.  Also ends the transaction on the read replica, if one has
+        been used, so that its next read is not served from a stale
+        snapshot.
+        '''
+
+        if committed and self._in_transaction:
+            self._last_write = time.time()
+        self._in_transaction = False
+        self._transaction_started = False
+
+        if self._replica is not None:
+            self._replica.rollback(True)
+
+        self._finish_memcache_invalidation(committed)
+
+    def _finish_memcache_invalidation(self, committed):
+        '''
+        Tables modified inside of a transaction are invalidated again once
+        it commits so that results cached by other handles before the commit
+        became visible are discarded.
+        '''
+
+        tags = self._invalidated_tags
+        self._invalidated_tags = set()
+
+        if committed and len(tags) > 0:
+            self.memcache_invalidate(tags)
+
+    def _get_connection_host(self, connection):
+        '''
+        Return the host a raw connection is connected to.
+        '''
+
+        raise NotImplementedError
+
+    def _get_error_code(self, error):
+        '''
+        Return the data store's error code for an exception raised by its
+        driver, or None if it has none.
+        '''
+
+        return None
+
+    def _get_pool(self):
+        '''
+        Retrieve (creating if necessary) the connection pool for this
+        handle's configuration, opening connections until it holds at least
+        "min size" of them.  Pools are per process so that connections are
+        never shared across a fork.  Pooling is opt-in: None is returned if
+        the group does not configure a "pool".
+        '''
+
+        if self._server is None or \
+           'pool' not in self._settings[self._group]:
+            return None
+
+        key = (os.getpid(), self._server, self._group, self._db, self._charset)
+
+        with self._pools_lock:
+            if key not in self._pools:
+                group_settings = self._settings[self._group]
+                options = group_settings['pool']
+
+                check = None
+                if 'max replica lag' in group_settings:
+                    check = \
+                        functools.partial(
+                            self._check_replica_lag, group_settings
+                        )
+
+                self._pools[key] = \
+                    ConnectionPool(
+                        functools.partial(
+                            self._open_connection,
+                            self._settings,
+                            self._db,
+                            self._group,
+                            self._charset
+                        ),
+                        self._ping_connection,
+                        self._reset_connection,
+                        self._close_connection,
+                        options.get('min size', 0),
+                        options.get('max size', 10),
+                        options.get('timeout', 5.0),
+                        options.get('max idle time', 300),
+                        options.get('ping interval', 30),
+                        check
+                    )
+
+            pool = self._pools[key]
+
+        pool.fill()
+
+        return pool
+
+    def _get_replica_lag(self, connection):
+        '''
+        Return the number of seconds the replica a raw connection is
+        connected to lags behind its primary, or None if replication is not
+        running.
+        '''
+
+        raise NotImplementedError
+
+    def _get_retry_policy(self):
+        '''
+        Return the retry policy configured for this handle's group.
         '''
-        Specify that the result set should be cached in Memcache.
+
+        if self._retry_policy is None:
+            self._retry_policy = \
+                get_retry_policy(
+                    self._settings[self._group], self._RETRYABLE_ERRORS
+                )
+
+        return self._retry_policy
+
+    def iterate(self, sql, binds=tuple(), batch_size=1000):
         '''
+        Execute a query and yield its records without holding the entire
+        result set in memory.
+        '''
+
+        return iter(())
+
+    def memcache(self, key, ttl=0, tags=None):
+        '''
+        Specify that the result set should be cached in Memcache.  When cache
+        tags are enabled the result set is invalidated whenever any of the
+        tables in tags (by default the tables the query selects from) is
+        modified.
+        '''
+
+        self._reset_memcache()
 
         self._memcache_key = key
         self._memcache_ttl = ttl
+        self._memcache_tags = tags
         return self
 
+    def memcache_invalidate(self, tags):
+        '''
+        Invalidate every cached query tagged with any of the provided tags.
+        '''
+
+        if Context.env_unit_test() or not cache_tags.is_enabled():
+            return
+
+        if self._memcache is None:
+            self._memcache = Memcache()
+
+        cache_tags.invalidate(self._memcache, tags)
+
     def memcache_purge(self):
         '''
         If the data has been cached, purge it.
@@ -118,7 +348,9 @@ class RDBMSBase(__DataStoreBase):
 
     def memcache_retrieve(self):
         '''
-        If the data needs to be cached, cache it.
+        If the data has been cached, retrieve it.  When the cached data has
+        expired only one caller is told (by returning None) to refresh it;
+        see CachedQuery.
         '''
 
         if self._memcache_key is None or Context.env_unit_test():
@@ -127,7 +359,10 @@ class RDBMSBase(__DataStoreBase):
         if self._memcache is None:
             self._memcache = Memcache()
 
-        return self._memcache.retrieve(self._memcache_key)
+        self._cached_query = \
+            CachedQuery(self._memcache, self._memcache_key, self._memcache_ttl)
+
+        return self._cached_query.retrieve()
 
     def memcache_store(self, data):
         '''
@@ -140,12 +375,13 @@ class RDBMSBase(__DataStoreBase):
         if self._memcache is None:
             self._memcache = Memcache()
 
-        self._memcache.store(
-            self._memcache_key,
-            data,
-            self._memcache_ttl,
-            self._memcache_ttl
-        )
+        if self._cached_query is None:
+            self._cached_query = \
+                CachedQuery(
+                    self._memcache, self._memcache_key, self._memcache_ttl
+                )
+
+        self._cached_query.store(data)
 
     def nth(self, index, sql, binds=tuple()):
         '''
@@ -154,6 +390,13 @@ class RDBMSBase(__DataStoreBase):
 
         return None
 
+    def _open_connection(self, settings, db, group, charset):
+        '''
+        Open a new raw connection to one of the hosts in the group.
+        '''
+
+        raise NotImplementedError
+
     def one(self, sql, binds=tuple(), obj=None):
         '''
         Return the first (and only the first) of the result set.
@@ -175,6 +418,57 @@ class RDBMSBase(__DataStoreBase):
         self._ordered_dict_cursor = True
         return self
 
+    def _ping_connection(self, connection):
+        '''
+        Verify that a raw connection is still usable.  Return False or raise
+        an exception if it is not.
+        '''
+
+        return True
+
+    def _check_replica_lag(self, group_settings, connection):
+        '''
+        Verify that a connection's read replica is not lagging more than
+        "max replica lag" seconds behind the primary.  Lagging replicas are
+        ejected; see replication.  The lag is queried at most once every
+        "replica lag check interval" seconds per host so this is run on
+        every checkout.
+        '''
+
+        return replication.check_replica_lag(
+            self._get_connection_host(connection),
+            functools.partial(self._get_replica_lag, connection),
+            group_settings['max replica lag'],
+            group_settings.get('replica lag check interval', 5),
+            group_settings.get('replica eject time', 30)
+        )
+
+    @classmethod
+    def pool_stats(cls):
+        '''
+        Return the stats for every connection pool owned by this process,
+        keyed by (server, group, db, charset).
+        '''
+
+        pid = os.getpid()
+
+        with cls._pools_lock:
+            return {
+                key[1:]: pool.stats()
+                for key, pool in cls._pools.items()
+                if key[0] == pid
+            }
+
+    def prepare(self, sql):
+        '''
+        Return a PreparedQuery for a statement that will be executed many
+        times.  The statement is parsed only once per process and, where
+        the data store supports it, prepared on the server once per
+        connection.
+        '''
+
+        return PreparedQuery(self, get_statement(sql))
+
     def query(self, query, binds = []):
         '''
         Execute an arbitrary query and return all of the results.
@@ -182,17 +476,180 @@ class RDBMSBase(__DataStoreBase):
 
         return None
 
+    def _record_statement(self, sql, duration, rows=None, binds=None):
+        '''
+        Called by the data store every time it executes a statement; records
+        its timing in the query stats and in the trace of the active
+        request, counts it against the active unit of work and passes it to
+        the registered query hooks.
+        '''
+
+        query_stats.record(sql, duration, rows, binds)
+        tracing.record('data store', sql, duration, rows=rows)
+        n_plus_one.observe(sql)
+        query_hooks.run(sql, duration, rows, binds)
+
+    def _recover_from_error(self, error):
+        '''
+        Roll back the active transaction after an error so that the failed
+        work can be retried, discarding the connection if it is broken.
+        '''
+
+        pass
+
+    def _register_write(self, tags):
+        '''
+        Record that the active transaction has written to the data store
+        (so reads are routed to the primary) and invalidate the tables
+        modified by the statement now, remembering them so they can be
+        invalidated again when the transaction commits.  A table is only
+        invalidated once per transaction before that.
+        '''
+
+        self._in_transaction = True
+        self._last_write = time.time()
+
+        if len(tags) == 0 or \
+           Context.env_unit_test() or \
+           not cache_tags.is_enabled():
+            return
+
+        tags = set(tags) - self._invalidated_tags
+        if len(tags) == 0:
+            return
+
+        self.memcache_invalidate(tags)
+        self._invalidated_tags.update(tags)
+
+    def _reset_connection(self, connection):
+        '''
+        Return a raw connection to a clean state before it is reused.
+        '''
+
+        pass
+
     def _reset_memcache(self):
+        if self._cached_query is not None:
+            self._cached_query.release()
+            self._cached_query = None
+
         self._memcache_key = None
         self._memcache_ttl = None
+        self._memcache_tags = None
 
     def rollback(self):
         '''
-        Manually rollback the active transaction.
+        Manually rollback the active transaction.  For pooled handles the
+        connection is returned to the pool afterwards; calling this again
+        before the next statement does nothing.
         '''
 
         raise NotImplementedError
 
+    def _retry(self, fn, *args):
+        '''
+        Call fn(*args) to execute a statement, retrying it as allowed by the
+        group's retry policy.  A statement can only be retried on its own if
+        it is the first one since the last commit or rollback: rolling back
+        anything after that would silently discard the locks and snapshot
+        of the statements before it, so the error is raised and the whole
+        transaction has to be retried instead (see run_in_transaction).
+        '''
+
+        if self._settings is None or \
+           self._in_transaction or \
+           self._transaction_started or \
+           not self._retry_statements:
+            result = fn(*args)
+        else:
+            result = \
+                self._get_retry_policy().run(
+                    functools.partial(fn, *args),
+                    self._get_error_code,
+                    self._recover_from_error
+                )
+
+        self._transaction_started = True
+
+        return result
+
+    def _route_read(self, statement):
+        '''
+        Return the handle that should execute a statement.  If the group
+        configures a "read group", selects outside of a transaction that
+        has written and more than "sticky primary" seconds after the last
+        write are executed by a handle for that group.  Everything else is
+        executed by this handle.
+        '''
+
+        if self._settings is None or not statement.is_select:
+            return self
+
+        group_settings = self._settings[self._group]
+        read_group = group_settings.get('read group')
+        if read_group is None or \
+           statement.is_locking_read or \
+           self._in_transaction:
+            return self
+
+        if self._last_write is not None and \
+           time.time() - self._last_write < \
+            group_settings.get('sticky primary', 0):
+            return self
+
+        if self._replica is None:
+            self._replica = self.__class__()
+            self._replica.set_persistent(self.persistent)
+
+        self._replica._charset = self._charset
+        self._replica._ordered_dict_cursor = self._ordered_dict_cursor
+        self._replica.configure(
+            self._settings, self._db, read_group, self._server
+        )
+
+        if self._memcache_key is not None:
+            self._replica.memcache(
+                self._memcache_key, self._memcache_ttl, self._memcache_tags
+            )
+            self._reset_memcache()
+
+        return self._replica
+
+    def run_in_transaction(self, fn, *args, **kwargs):
+        '''
+        Call fn(*args, **kwargs) and commit, returning what fn returns.  If
+        anything fails the transaction is rolled back and, if the error is
+        retryable (a deadlock or lost connection, for example), fn is called
+        again in a new transaction as allowed by the group's retry policy.
+        fn must therefore be safe to repeat.
+        '''
+
+        # Commits are skipped by unit tests, so every write appears to be
+        # part of one long transaction.
+        if self._in_transaction and not Context.env_unit_test():
+            raise DataStoreException(
+                'cannot run in a new transaction because the active '
+                + 'transaction has uncommitted writes'
+            )
+
+        return self._get_retry_policy().run(
+            functools.partial(self.__run_transaction, fn, args, kwargs),
+            self._get_error_code
+        )
+
+    def __run_transaction(self, fn, args, kwargs):
+        self._retry_statements = False
+        try:
+            result = fn(*args, **kwargs)
+            self.commit()
+        except Exception as e:
+            self._recover_from_error(e)
+            raise
+        finally:
+            self._retry_statements = True
+
+        return result
+
     def set_charset(self, charset):
         '''
         Set the character for the RDBMS.
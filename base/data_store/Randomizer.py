@@ -5,6 +5,7 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 # ----- Imports ---------------------------------------------------------------
 
 from .exception import DataStoreException
+from . import host_health
 
 import copy
 import random
@@ -13,7 +14,8 @@ import random
 
 class Randomizer(object):
     '''
-    Implements the randomizer durability algorithm.
+    Implements the randomizer durability algorithm.  Hosts whose circuit
+    is open (see host_health) are only selected if no other host remains.
     '''
 
     def __init__(self, settings):
@@ -27,9 +29,17 @@ class Randomizer(object):
         if len(self.settings) == 0:
             raise DataStoreException('no more hosts remain')
 
-        if len(self.settings) == 1:
-            self.__selected_host = 0
+        candidates = [
+            index
+            for index, entry in enumerate(self.settings)
+            if host_health.is_available(entry[0])
+        ]
+        if len(candidates) == 0:
+            candidates = list(range(len(self.settings)))
+
+        if len(candidates) == 1:
+            self.__selected_host = candidates[0]
         else:
-            self.__selected_host = random.randint(0, len(self.settings) - 1)
+            self.__selected_host = random.choice(candidates)
 
         return self.settings[self.__selected_host]
@@ -0,0 +1,94 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import cache_tags
+from tinyAPI.base.data_store.prepared_statement import get_statement
+
+import re
+import sys
+import timeit
+
+# ----- Constants -------------------------------------------------------------
+
+SQL = '''select id, name, email_address
+           from user
+          where id = %s'''
+
+# ----- Private Functions -----------------------------------------------------
+
+def __adhoc_classify(sql):
+    '''The statement handling query() performed on every call before
+       statements were parsed once.'''
+    is_select = False
+    if re.match(r'^\(?select ', sql) or re.match('^show ', sql):
+        is_select = True
+
+    if is_select:
+        return is_select, cache_tags.get_read_tags(sql), []
+    else:
+        return is_select, [], cache_tags.get_written_tags(sql)
+
+
+def __prepared_classify(statement):
+    return statement.is_select, statement.read_tags, statement.written_tags
+
+
+def __classification(iterations):
+    statement = get_statement(SQL)
+
+    assert __adhoc_classify(SQL) == __prepared_classify(statement)
+
+    adhoc = timeit.timeit(lambda: __adhoc_classify(SQL), number=iterations)
+    cached = \
+        timeit.timeit(lambda: get_statement(SQL), number=iterations)
+    prepared = \
+        timeit.timeit(
+            lambda: __prepared_classify(statement), number=iterations
+        )
+
+    print('statement handling, {:,} point lookups'.format(iterations))
+    print('   ad hoc: {:.2f} usec/call'.format(adhoc / iterations * 1e6))
+    print('   cached: {:.2f} usec/call'.format(cached / iterations * 1e6))
+    print(' prepared: {:.2f} usec/call'.format(prepared / iterations * 1e6))
+
+
+def __database(server, db, group, iterations):
+    from tinyAPI.base.data_store.ConnectionManager import ConnectionManager
+
+    dsh = ConnectionManager().acquire(server, db, group)
+
+    statement = dsh.prepare(SQL)
+
+    adhoc = \
+        timeit.timeit(
+            lambda: dsh.query(SQL, [1]), number=iterations
+        )
+    prepared = \
+        timeit.timeit(
+            lambda: statement.query([1]), number=iterations
+        )
+
+    dsh.rollback()
+
+    print('{} point lookups against "{}"'.format(iterations, server))
+    print('   ad hoc: {:.2f} usec/call'.format(adhoc / iterations * 1e6))
+    print(' prepared: {:.2f} usec/call'.format(prepared / iterations * 1e6))
+
+# ----- Main ------------------------------------------------------------------
+
+def main(iterations=100000):
+    '''Without arguments only the client side statement handling is
+       measured.  Given a configured server, database and group (and a user
+       table with an id column) whole point lookups are executed.'''
+    __classification(iterations)
+
+    if len(sys.argv) == 4:
+        print()
+        __database(sys.argv[1], sys.argv[2], sys.argv[3], iterations)
+
+
+if __name__ == '__main__':
+    main()
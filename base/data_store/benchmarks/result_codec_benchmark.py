@@ -0,0 +1,79 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.result_codec import ColumnarCodec
+from tinyAPI.base.data_store.result_codec import PickleCodec
+
+import datetime
+import decimal
+import pickle
+import timeit
+
+# ----- Private Functions -----------------------------------------------------
+
+def __report(name, encode, decode, iterations):
+    payload = encode()
+    assert decode(payload) is not None
+
+    encode_time = timeit.timeit(encode, number=iterations)
+    decode_time = timeit.timeit(lambda: decode(payload), number=iterations)
+
+    print('  {:<22} {:>9,} bytes {:>9.1f} usec {:>9.1f} usec'
+          .format(name,
+                  len(payload),
+                  encode_time / iterations * 1e6,
+                  decode_time / iterations * 1e6))
+
+# ----- Main ------------------------------------------------------------------
+
+def main(num_rows=500, iterations=200):
+    rows = [
+        {
+            'id': index,
+            'account_id': index % 37,
+            'email_address': 'user{}@example.com'.format(index),
+            'first_name': 'First',
+            'last_name': 'Last {}'.format(index % 11),
+            'balance': decimal.Decimal('19.99'),
+            'is_active': 1,
+            'date_created': datetime.datetime(2020, 1, 1, 12, 0, 0),
+            'date_updated': None
+        }
+        for index in range(num_rows)
+    ]
+
+    print('cached result set, {:,} rows, 9 columns, {:,} iterations'
+          .format(num_rows, iterations))
+    print('  {:<22} {:>15} {:>14} {:>14}'
+          .format('', 'payload', 'encode', 'decode'))
+
+    __report(
+        'pickle (before)',
+        lambda: pickle.dumps(rows),
+        pickle.loads,
+        iterations
+    )
+
+    for name, codec in (('pickle + zlib', PickleCodec('zlib')),
+                        ('columnar', ColumnarCodec(None)),
+                        ('columnar + zlib', ColumnarCodec('zlib'))):
+        __report(name, lambda: codec.encode(rows), codec.decode, iterations)
+
+    try:
+        codec = ColumnarCodec('lz4')
+    except Exception:
+        print('  columnar + lz4         (lz4 is not installed)')
+    else:
+        __report(
+            'columnar + lz4',
+            lambda: codec.encode(rows),
+            codec.decode,
+            iterations
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.statement_cache import get_literal_markers
+from tinyAPI.base.data_store.statement_cache import StatementCache
+
+import datetime
+import re
+import timeit
+
+# ----- Private Functions -----------------------------------------------------
+
+def __legacy_create(target, data):
+    '''The SQL generation performed by create() before statements were
+       cached.'''
+    binds = []
+    for value in list(data.values()):
+        str_value = str(value)
+
+        if re.match('current_timestamp', str_value) is not None or \
+           str_value == 'current_date':
+            binds.append(value)
+        else:
+            binds.append('%s')
+
+    values = []
+    for value in data.values():
+        str_value = str(value)
+
+        if re.match('current_timestamp', str_value) is None and \
+           str_value != 'current_date':
+            values.append(value)
+
+    sql  = 'insert into ' + target + '('
+    sql += ', '.join(list(data.keys()))
+    sql += ')'
+    sql += ' values ('
+    sql += ', '.join(binds)
+    sql += ')'
+
+    return sql, values
+
+
+def __cached_create(statement_cache, target, data):
+    values = list(data.values())
+    statement = \
+        statement_cache.insert(
+            target, tuple(data.keys()), get_literal_markers(values)
+        )
+
+    return statement.sql, statement.get_values(values)
+
+# ----- Main ------------------------------------------------------------------
+
+def main(iterations=100000):
+    data = {
+        'id': 12345,
+        'name': 'some name',
+        'email': 'someone@example.com',
+        'amount': 19.99,
+        'created_on': datetime.datetime.now(),
+        'updated_on': 'current_timestamp',
+        'is_active': True,
+        'notes': None
+    }
+
+    statement_cache = StatementCache()
+
+    assert __legacy_create('abc', data) == \
+           __cached_create(statement_cache, 'abc', data)
+
+    legacy = \
+        timeit.timeit(
+            lambda: __legacy_create('abc', data), number=iterations
+        )
+    cached = \
+        timeit.timeit(
+            lambda: __cached_create(statement_cache, 'abc', data),
+            number=iterations
+        )
+
+    print('create() SQL generation, {:,} calls, 8 columns'.format(iterations))
+    print('  before: {:.2f} usec/call'.format(legacy / iterations * 1e6))
+    print('   after: {:.2f} usec/call'.format(cached / iterations * 1e6))
+    print(' speedup: {:.1f}x'.format(legacy / cached))
+
+
+if __name__ == '__main__':
+    main()
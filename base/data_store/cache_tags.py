@@ -0,0 +1,354 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.exception import ConfigurationException
+
+import hashlib
+import logging
+import re
+import threading
+import time
+
+__all__ = [
+    'get_read_tags',
+    'get_tag',
+    'get_written_tags',
+    'invalidate',
+    'is_enabled',
+    'tag_key'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+_MAX_KEY_LENGTH = 250
+
+# Words that end a list of table references or, when they precede an opening
+# parenthesis, show that it is not a function call.
+_KEYWORDS = frozenset((
+    'all', 'and', 'any', 'as', 'cross', 'else', 'except', 'exists', 'fetch',
+    'for', 'force', 'from', 'full', 'group', 'having', 'ignore', 'in',
+    'inner', 'intersect', 'into', 'join', 'lateral', 'left', 'limit', 'lock',
+    'natural', 'not', 'offset', 'on', 'or', 'order', 'outer', 'partition',
+    'procedure', 'returning', 'right', 'select', 'set', 'some',
+    'straight_join', 'then', 'union', 'use', 'using', 'values', 'when',
+    'where', 'window'
+))
+
+_TOKENS = re.compile(
+    r"""\s+|--[^\n]*|#[^\n]*|/\*.*?\*/|('(?:[^'\\]|\\.)*')|"""
+    + r'((?:`[^`]+`|"[^"]+"|\w+)(?:\.(?:`[^`]+`|"[^"]+"|\w+))?)|'
+    + r'(\S)',
+    re.S)
+
+_WRITTEN_TABLE = re.compile(
+    r'^\s*(?:insert\s+(?:ignore\s+)?(?:into\s+)?|'
+    + r'replace\s+(?:into\s+)?|'
+    + r'truncate\s+(?:table\s+)?|'
+    + r'(?:alter|drop)\s+table\s+(?:if\s+exists\s+)?)'
+    + r'((?:[`"]?\w+[`"]?\.)?[`"]?\w+[`"]?)',
+    re.I)
+
+_GENERATION_KEY_PREFIX = 'tinyAPI:tag:'
+
+# ----- Public Functions ------------------------------------------------------
+
+def get_read_tags(sql):
+    '''
+    Return the names of the tables a select statement reads from, including
+    those of joins, comma separated table lists and subqueries.
+    '''
+
+    tokens = _tokenize(sql)
+
+    tags = set()
+    functions = []
+    for index, token in enumerate(tokens):
+        if token == '(':
+            previous = tokens[index - 1] if index > 0 else ''
+            functions.append(
+                _is_word(previous) and previous.lower() not in _KEYWORDS
+            )
+        elif token == ')':
+            if len(functions) > 0:
+                functions.pop()
+        elif token.lower() in ('from', 'join', 'straight_join'):
+            # from inside of extract(), trim(), etc. is not a table list
+            if len(functions) == 0 or not functions[-1]:
+                tables, end = _read_tables(tokens, index + 1)
+                tags.update(get_tag(table) for table in tables)
+
+    return sorted(tags)
+
+
+def get_tag(table):
+    '''
+    Return the tag for a table name, which may be quoted or qualified by a
+    schema.
+    '''
+
+    return table.replace('`', '').replace('"', '').split('.')[-1].lower()
+
+
+def get_written_tags(sql):
+    '''
+    Return the names of the tables a DML or DDL statement modifies.  For
+    multi-table updates every table referenced is returned.
+    '''
+
+    tokens = _tokenize(sql)
+    if len(tokens) == 0:
+        return []
+
+    command = tokens[0].lower()
+    if command == 'delete':
+        return _get_delete_tags(tokens)
+    elif command == 'update':
+        return _get_update_tags(tokens)
+
+    match = _WRITTEN_TABLE.match(sql)
+    if match is None:
+        return []
+
+    return [get_tag(match.group(1))]
+
+
+def invalidate(memcache, tags):
+    '''
+    Increment the generation of each tag so that every cached query that
+    depends on any of them is no longer found.  Tags are invalidated after
+    the statement that modified their tables has been executed, so a
+    Memcached failure is logged rather than raised.
+    '''
+
+    initial = _get_initial_generation()
+    for tag in set(tags):
+        try:
+            memcache.increment(_GENERATION_KEY_PREFIX + tag, 1, initial)
+        except Exception as e:
+            _get_logger().warning(
+                'cache tag "{}" could not be invalidated: {}'.format(tag, e)
+            )
+
+
+def is_enabled():
+    '''
+    Determine whether cached queries are tagged, and tags invalidated, as
+    configured by "memcached cache tags".
+    '''
+
+    global _enabled
+
+    if _enabled is None:
+        try:
+            _enabled = ConfigManager.value('memcached cache tags') is True
+        except ConfigurationException:
+            _enabled = False
+
+    return _enabled
+
+
+def tag_key(memcache, key, tags):
+    '''
+    Return the key at which a query that depends on tags is cached.  The key
+    embeds the current generation of every tag.
+    '''
+
+    tags = sorted(set(tags))
+    if len(tags) == 0:
+        return key
+
+    generation_keys = [_GENERATION_KEY_PREFIX + tag for tag in tags]
+    generations = memcache.retrieve_counters(generation_keys)
+
+    initial = _get_initial_generation()
+    for generation_key in generation_keys:
+        if generation_key not in generations:
+            generations[generation_key] = \
+                memcache.increment(generation_key, 0, initial)
+
+    tagged_key = \
+        key + ':' + '.'.join(
+            str(generations[generation_key])
+            for generation_key in generation_keys
+        )
+
+    if len(tagged_key) > _MAX_KEY_LENGTH:
+        tagged_key = \
+            key[:_MAX_KEY_LENGTH - 41] + ':' + \
+            hashlib.sha1(tagged_key.encode('utf8')).hexdigest()
+
+    return tagged_key
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _get_delete_tags(tokens):
+    '''
+    Handles "delete from t ...", "delete t1, t2 from t1 join t2 ..." and
+    "delete from t1, t2 using t1 join t2 ...", where the tables deleted from
+    may be aliases.
+    '''
+
+    index = _skip_modifiers(tokens, 1, ('ignore', 'low_priority', 'quick'))
+
+    targets = []
+    while index < len(tokens) and tokens[index].lower() != 'from':
+        if _is_word(tokens[index]):
+            targets.append(tokens[index])
+        index += 1
+
+    aliases = {}
+    tables, index = _read_tables(tokens, index + 1, aliases)
+    if len(targets) == 0:
+        targets = tables
+
+    _read_table_references(tokens, index, aliases, ('where',))
+
+    return sorted(
+        set(get_tag(aliases.get(target.lower(), target))
+            for target in targets)
+    )
+
+
+def _get_initial_generation():
+    '''
+    Generations that are missing (never set or evicted) restart from the
+    current time in microseconds so that they never go backwards and
+    resurrect previously invalidated keys.
+    '''
+
+    return int(time.time() * 1000000)
+
+
+def _get_logger():
+    '''
+    Failed invalidations are written to "app log file" unless the
+    application has configured the tinyAPI.cache_tags logger itself.
+    '''
+
+    logger = logging.getLogger('tinyAPI.cache_tags')
+
+    with _lock:
+        if not logger.handlers:
+            try:
+                log_file = ConfigManager.value('app log file')
+            except ConfigurationException:
+                log_file = None
+
+            if log_file is not None:
+                logger.addHandler(logging.FileHandler(log_file))
+
+    return logger
+
+
+def _get_update_tags(tokens):
+    index = _skip_modifiers(tokens, 1, ('ignore', 'low_priority'))
+
+    tables, index = _read_tables(tokens, index)
+    tables.extend(_read_table_references(tokens, index, {}, ('set',)))
+
+    return sorted(set(get_tag(table) for table in tables))
+
+
+def _is_word(token):
+    return token[:1].isalnum() or token[:1] in ('_', '`', '"')
+
+
+def _read_table_references(tokens, index, aliases, stop):
+    '''
+    Return the tables of every join (or using clause) up to the first of
+    the stop words outside of parentheses.
+    '''
+
+    tables = []
+    depth = 0
+    while index < len(tokens):
+        token = tokens[index].lower()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0:
+            if token in stop:
+                break
+            elif token in ('join', 'straight_join', 'using'):
+                found, end = _read_tables(tokens, index + 1, aliases)
+                tables.extend(found)
+
+        index += 1
+
+    return tables
+
+
+def _read_tables(tokens, index, aliases=None):
+    '''
+    Read a comma separated list of tables, each optionally followed by an
+    alias, starting at tokens[index].  Return the tables and the index of
+    the token that ended the list.
+    '''
+
+    tables = []
+    expect_table = True
+    while index < len(tokens):
+        token = tokens[index]
+        lower = token.lower()
+
+        if expect_table:
+            if not _is_word(token) or lower in _KEYWORDS:
+                break
+
+            tables.append(token)
+            expect_table = False
+        elif token == ',':
+            expect_table = True
+        elif lower == 'as':
+            pass
+        elif _is_word(token) and lower not in _KEYWORDS:
+            if aliases is not None:
+                aliases[lower] = tables[-1]
+        else:
+            break
+
+        index += 1
+
+    return tables, index
+
+
+def _reset():
+    global _enabled
+
+    _enabled = None
+
+
+def _skip_modifiers(tokens, index, modifiers):
+    while index < len(tokens) and tokens[index].lower() in modifiers:
+        index += 1
+
+    return index
+
+
+def _tokenize(sql):
+    '''
+    Split a statement into words (possibly quoted or qualified by a schema)
+    and punctuation.  Comments are dropped and string literals replaced by
+    "?".
+    '''
+
+    tokens = []
+    for match in _TOKENS.finditer(sql):
+        if match.group(1) is not None:
+            tokens.append('?')
+        elif match.group(2) is not None:
+            tokens.append(match.group(2))
+        elif match.group(3) is not None:
+            tokens.append(match.group(3))
+
+    return tokens
+
+# ----- Process Local Data ----------------------------------------------------
+
+_enabled = None
+_lock = threading.RLock()
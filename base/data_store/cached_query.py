@@ -0,0 +1,242 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .result_codec import get_codec
+
+import math
+import random
+import threading
+import time
+
+__all__ = [
+    'CachedQuery'
+]
+
+# ----- Process Local Data ----------------------------------------------------
+
+_stats = {
+    'early refreshes': 0,
+    'lock wait timeouts': 0,
+    'lock waits': 0,
+    'refreshes': 0,
+    'stale serves': 0
+}
+_stats_lock = threading.Lock()
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+# ----- Public Classes --------------------------------------------------------
+
+class CachedQuery(object):
+    '''
+    Protects the result set of a query cached in Memcache from stampedes when
+    it expires.
+
+    Results are stored along with a soft expiration time and kept in
+    Memcache for an additional grace period.  Once the soft expiration time
+    passes (or, with a probability that rises as it approaches, slightly
+    before) a single caller wins a short lock implemented with Memcache's
+    add and refreshes the data while everyone else keeps being served the
+    stale copy.  When there is no copy at all, callers that lose the lock
+    wait briefly for the winner to store the result.
+
+    The data itself is encoded by a ResultSetCodec (by default the one
+    configured by "memcached result codec") before it is stored in
+    Memcache.  The process local cache keeps the decoded rows.
+    '''
+
+    ENVELOPE_VERSION = 1
+    BETA = 1.0
+    LOCK_TTL = 5
+    WAIT_INTERVAL = 0.05
+
+    def __init__(self, memcache, key, ttl=0, codec=None):
+        self.__memcache = memcache
+        self.key = key
+        self.ttl = ttl
+        self.__codec = codec if codec is not None else get_codec()
+        self.__lock_key = key + ':lock'
+        self.__lock_held = False
+        self.__refresh_started = None
+
+    def __acquire_lock(self):
+        if self.__memcache.add(self.__lock_key, 1, self.LOCK_TTL):
+            self.__lock_held = True
+            self.__refresh_started = time.time()
+            _count('refreshes')
+            return True
+
+        return False
+
+    def __copy_rows(self, rows):
+        '''
+        Rows served from the local cache are shared by every thread of the
+        process so callers are given their own copy of each record.
+        '''
+
+        if not isinstance(rows, list):
+            return rows
+
+        return [
+            record.copy() if isinstance(record, dict) else record
+            for record in rows
+        ]
+
+    def __get_local_cache_ttl(self):
+        return self.ttl if self.ttl else None
+
+    def __is_envelope(self, value, field):
+        return isinstance(value, dict) and \
+               value.get('version') == self.ENVELOPE_VERSION and \
+               field in value
+
+    def release(self):
+        '''
+        Release the refresh lock if it is held, for instance because the
+        query that was supposed to refresh the data failed.
+        '''
+
+        if self.__lock_held is True:
+            self.__memcache.purge(self.__lock_key)
+            self.__lock_held = False
+
+    def retrieve(self):
+        '''
+        Return the cached data or None if the caller should execute the query
+        and store its result.
+        '''
+
+        envelope = self.__retrieve_envelope()
+        if envelope is not None and not self.__is_envelope(envelope, 'rows'):
+            return envelope
+
+        if envelope is None:
+            if self.__acquire_lock():
+                return None
+
+            return self.__wait_for_refresh()
+
+        if envelope['expires'] is None:
+            return self.__copy_rows(envelope['rows'])
+
+        now = time.time()
+        early = \
+            envelope['delta'] * self.BETA * -math.log(1.0 - random.random())
+        if now + early < envelope['expires']:
+            return self.__copy_rows(envelope['rows'])
+
+        if self.__acquire_lock():
+            if now < envelope['expires']:
+                _count('early refreshes')
+            return None
+
+        if now >= envelope['expires']:
+            _count('stale serves')
+
+        return self.__copy_rows(envelope['rows'])
+
+    def __retrieve_envelope(self):
+        '''
+        The local cache holds the decoded rows so that they are only decoded
+        when they are fetched from Memcache.  Values that are not envelopes
+        (cached by older versions) are cached locally and returned as is.
+        '''
+
+        envelope = self.__memcache.retrieve_local(self.key)
+        if envelope is not None and not self.__is_envelope(envelope, 'data'):
+            return envelope
+
+        value = self.__memcache.retrieve(self.key, local_cache=False)
+        if value is None:
+            return None
+
+        if not self.__is_envelope(value, 'data'):
+            self.__memcache.store_local(
+                self.key, value, self.__get_local_cache_ttl()
+            )
+            return value
+
+        envelope = {
+            'version': self.ENVELOPE_VERSION,
+            'rows': self.__codec.decode(value['data']),
+            'expires': value['expires'],
+            'delta': value['delta']
+        }
+
+        self.__memcache.store_local(
+            self.key, envelope, self.__get_local_cache_ttl()
+        )
+
+        return envelope
+
+    @staticmethod
+    def stats():
+        '''
+        Return the stampede protection counters for this process.
+        '''
+
+        with _stats_lock:
+            return dict(_stats)
+
+    def store(self, data):
+        '''
+        Store the result of the query and release the refresh lock.  Only
+        the copy stored in Memcache is encoded.
+        '''
+
+        now = time.time()
+
+        delta = 0
+        if self.__refresh_started is not None:
+            delta = now - self.__refresh_started
+
+        expires = now + self.ttl if self.ttl else None
+
+        self.__memcache.store(
+            self.key,
+            {
+                'version': self.ENVELOPE_VERSION,
+                'data': self.__codec.encode(data),
+                'expires': expires,
+                'delta': delta
+            },
+            self.ttl * 2 if self.ttl else 0,
+            local_cache=False
+        )
+
+        self.__memcache.store_local(
+            self.key,
+            {
+                'version': self.ENVELOPE_VERSION,
+                'rows': self.__copy_rows(data),
+                'expires': expires,
+                'delta': delta
+            },
+            self.__get_local_cache_ttl()
+        )
+
+        self.release()
+
+    def __wait_for_refresh(self):
+        _count('lock waits')
+
+        deadline = time.time() + self.LOCK_TTL
+        while time.time() < deadline:
+            time.sleep(self.WAIT_INTERVAL)
+
+            envelope = self.__retrieve_envelope()
+            if envelope is not None:
+                if self.__is_envelope(envelope, 'rows'):
+                    return self.__copy_rows(envelope['rows'])
+                return envelope
+
+        _count('lock wait timeouts')
+
+        return None
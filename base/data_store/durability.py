@@ -0,0 +1,48 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .exception import DataStoreException
+from .FallBack import FallBack
+from .LatencyWeighted import LatencyWeighted
+from .LeastConnections import LeastConnections
+from .Randomizer import Randomizer
+
+__all__ = [
+    'get_durability'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+_ALGORITHMS = {
+    'fall back': FallBack,
+    'latency weighted': LatencyWeighted,
+    'least connections': LeastConnections,
+    'randomizer': Randomizer
+}
+
+# ----- Public Functions ------------------------------------------------------
+
+def get_durability(group_settings, hosts=None):
+    '''
+    Return the durability algorithm configured for a group, selecting from
+    hosts (by default all of the group's hosts).
+    '''
+
+    if group_settings['durability'] not in _ALGORITHMS:
+        raise DataStoreException(
+            'unrecognized durability algorithm "{}"'
+                .format(group_settings['durability'])
+        )
+
+    algorithm = _ALGORITHMS[group_settings['durability']]
+
+    # Fall back is defined by exactly two hosts, so it always gets both:
+    # ejected replicas are not filtered out of a fall back group and host
+    # health only decides which of the two is tried first.
+    if hosts is None or algorithm is FallBack:
+        hosts = group_settings['hosts']
+
+    return algorithm(hosts)
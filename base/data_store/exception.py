@@ -7,6 +7,7 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 from tinyAPI.base.exception import tinyAPIException
 
 __all__ = [
+    'ConnectionPoolTimeoutException',
     'DataStoreDuplicateKeyException',
     'DataStoreException',
     'DataStoreForeignKeyException',
@@ -32,15 +33,29 @@ class ColumnCannotBeNullException(DataStoreException):
         self.column_name = column_name
 
 
+class ConnectionPoolTimeoutException(DataStoreException):
+    '''No connection became available in a connection pool before the
+       checkout timeout expired.'''
+    pass
+
+
 class DataStoreDuplicateKeyException(DataStoreException):
     '''Named exception identifying when a duplicate key is being added to a
        RDBMS.'''
-    pass
+
+    def __init__(self, message, row_index=None):
+        super(DataStoreDuplicateKeyException, self).__init__(message)
+
+        self.row_index = row_index
 
 
 class DataStoreForeignKeyException(DataStoreException):
     '''A foreign key constraint failed to match a parent record.'''
-    pass
+
+    def __init__(self, message, row_index=None):
+        super(DataStoreForeignKeyException, self).__init__(message)
+
+        self.row_index = row_index
 
 
 class IllegalMixOfCollationsException(DataStoreException):
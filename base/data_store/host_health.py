@@ -0,0 +1,196 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+import threading
+import time
+
+__all__ = [
+    'available',
+    'connection_closed',
+    'connection_opened',
+    'get_connections',
+    'get_latency',
+    'is_available',
+    'record_failure',
+    'record_success',
+    'stats'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+_DEFAULT_CIRCUIT_BREAKER = {
+    'failure threshold': 1,
+    'backoff': 1.0,
+    'max backoff': 60.0
+}
+
+_LATENCY_SMOOTHING = 0.3
+
+# ----- Public Functions ------------------------------------------------------
+
+def available(hosts):
+    '''
+    Return the [host, user, password] entries whose circuit is closed (or
+    whose backoff has elapsed so that a single attempt may be made).  If no
+    host is available, the one that will become available first is returned
+    so that a connection can still be attempted.
+    '''
+
+    hosts = list(hosts)
+    if len(hosts) == 0:
+        return hosts
+
+    candidates = [entry for entry in hosts if is_available(entry[0])]
+    if len(candidates) > 0:
+        return candidates
+
+    with _lock:
+        return [min(
+            hosts,
+            key=lambda entry: _get_state(entry[0])['open until']
+        )]
+
+
+def connection_closed(host):
+    '''
+    Record that a connection to host has been closed.
+    '''
+
+    with _lock:
+        state = _get_state(host)
+        if state['connections'] > 0:
+            state['connections'] -= 1
+
+
+def connection_opened(host):
+    '''
+    Record that a connection to host has been opened.
+    '''
+
+    with _lock:
+        _get_state(host)['connections'] += 1
+
+
+def get_connections(host):
+    '''
+    Return the number of connections to host that this process has open.
+    '''
+
+    with _lock:
+        return _get_state(host)['connections']
+
+
+def get_latency(host):
+    '''
+    Return the smoothed connect latency of host in seconds or None if a
+    connection has never been made to it.
+    '''
+
+    with _lock:
+        return _get_state(host)['latency']
+
+
+def is_available(host):
+    '''
+    Determine whether a connection should be attempted to host.
+    '''
+
+    with _lock:
+        return time.time() >= _get_state(host)['open until']
+
+
+def record_failure(host, circuit_breaker=None):
+    '''
+    Record a failure to connect to host.  Once "failure threshold"
+    consecutive failures have occurred the circuit opens and the host is
+    skipped for "backoff" seconds, doubling with every further failure up
+    to "max backoff" seconds.
+    '''
+
+    settings = dict(_DEFAULT_CIRCUIT_BREAKER)
+    if circuit_breaker is not None:
+        settings.update(circuit_breaker)
+
+    with _lock:
+        state = _get_state(host)
+        state['failures'] += 1
+        state['total failures'] += 1
+
+        excess = state['failures'] - settings['failure threshold']
+        if excess >= 0:
+            backoff = \
+                min(settings['backoff'] * (2 ** excess),
+                    settings['max backoff'])
+            state['open until'] = time.time() + backoff
+
+
+def record_success(host, latency=None):
+    '''
+    Record a successful connection to host, closing its circuit.
+    '''
+
+    with _lock:
+        state = _get_state(host)
+        state['failures'] = 0
+        state['open until'] = 0
+
+        if latency is not None:
+            if state['latency'] is None:
+                state['latency'] = latency
+            else:
+                state['latency'] = \
+                    (_LATENCY_SMOOTHING * latency
+                     + (1 - _LATENCY_SMOOTHING) * state['latency'])
+
+
+def stats():
+    '''
+    Return the health of every host this process has considered.
+    '''
+
+    now = time.time()
+
+    with _lock:
+        return {
+            host: {
+                'available': now >= state['open until'],
+                'connections': state['connections'],
+                'consecutive failures': state['failures'],
+                'latency': state['latency'],
+                'total failures': state['total failures']
+            }
+            for host, state in _hosts.items()
+        }
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _get_state(host):
+    '''
+    Must be called with the lock held.
+    '''
+
+    state = _hosts.get(host)
+    if state is None:
+        state = {
+            'connections': 0,
+            'failures': 0,
+            'latency': None,
+            'open until': 0,
+            'total failures': 0
+        }
+        _hosts[host] = state
+
+    return state
+
+
+def _reset():
+    with _lock:
+        _hosts.clear()
+
+# ----- Process Local Data ----------------------------------------------------
+
+_hosts = {}
+_lock = threading.RLock()
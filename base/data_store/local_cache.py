@@ -0,0 +1,133 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from collections import OrderedDict
+
+import copy
+import pickle
+import sys
+import threading
+import time
+
+__all__ = [
+    'LocalCache'
+]
+
+# ----- Public Classes --------------------------------------------------------
+
+class LocalCache(object):
+    '''
+    A process wide, thread safe cache bounded by number of items and by an
+    estimate of the bytes they consume.  Entries expire after their TTL (at
+    most max_ttl seconds, if given) and the least recently used entries are
+    evicted first.
+    '''
+
+    def __init__(self,
+                 max_items=10000,
+                 max_bytes=67108864,
+                 default_ttl=60,
+                 max_ttl=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__num_bytes = 0
+        self.__stats = {
+            'evictions': 0,
+            'expirations': 0,
+            'hits': 0,
+            'misses': 0
+        }
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__num_bytes = 0
+
+    def delete(self, key):
+        with self.__lock:
+            self.__remove(key)
+
+    def __estimate_size(self, data):
+        try:
+            return len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return sys.getsizeof(data)
+
+    def get(self, key):
+        '''
+        Return a copy of the data stored at key or None if it is not present
+        or has expired.
+        '''
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__stats['misses'] += 1
+                return None
+
+            data, expires, size = entry
+            if expires is not None and time.time() >= expires:
+                self.__remove(key)
+                self.__stats['expirations'] += 1
+                self.__stats['misses'] += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.__stats['hits'] += 1
+
+        return copy.copy(data)
+
+    def __remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__num_bytes -= entry[2]
+
+    def set(self, key, data, ttl=None):
+        '''
+        Store data at key, replacing any existing entry.  If ttl is None the
+        default TTL is used; a TTL of 0 means the entry never expires.
+        '''
+
+        if data is None:
+            self.delete(key)
+            return
+
+        if ttl is None:
+            ttl = self.default_ttl
+
+        if self.max_ttl is not None and (ttl == 0 or ttl > self.max_ttl):
+            ttl = self.max_ttl
+
+        size = self.__estimate_size(data)
+        expires = time.time() + ttl if ttl else None
+
+        with self.__lock:
+            self.__remove(key)
+
+            if size > self.max_bytes:
+                return
+
+            self.__entries[key] = (data, expires, size)
+            self.__num_bytes += size
+
+            while len(self.__entries) > self.max_items or \
+                  self.__num_bytes > self.max_bytes:
+                evicted_key, entry = self.__entries.popitem(last=False)
+                self.__num_bytes -= entry[2]
+                self.__stats['evictions'] += 1
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['items'] = len(self.__entries)
+            stats['bytes'] = self.__num_bytes
+
+        return stats
@@ -5,24 +5,46 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 # ----- Imports ---------------------------------------------------------------
 
 from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.data_store.local_cache import LocalCache
+from tinyAPI.base.exception import ConfigurationException
 from tinyAPI.base.stats_logger import StatsLogger
+from tinyAPI.base import tracing
 
+import copy
 import pylibmc
 import threading
-import time
 
 __all__ = [
     'Memcache'
 ]
 
-# ----- Thread Local Data -----------------------------------------------------
+# ----- Process Local Data ----------------------------------------------------
 
-_thread_local_data = threading.local()
-_thread_local_data.stats = {
-    'requests': 0,
-    'hits': 0
-}
-_thread_local_data.cache = {}
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _get_local_cache():
+    global _local_cache
+
+    if _local_cache is None:
+        with _local_cache_lock:
+            if _local_cache is None:
+                try:
+                    settings = ConfigManager.value('memcached local cache')
+                except ConfigurationException:
+                    settings = {}
+
+                _local_cache = \
+                    LocalCache(
+                        settings.get('max items', 10000),
+                        settings.get('max bytes', 67108864),
+                        settings.get('ttl', 5),
+                        settings.get('ttl', 5)
+                    )
+
+    return _local_cache
 
 # ----- Public Classes --------------------------------------------------------
 
@@ -31,23 +53,21 @@ class Memcache(object):
 
     def __init__(self):
         self.__handle = None
+        self.__local_cache = _get_local_cache()
 
 
-    def clear_local_cache(self):
-        _thread_local_data.stats = {
-            'requests': 0,
-            'hits': 0
-        }
-        _thread_local_data.cache = {}
+    def add(self, key, data, ttl=0):
+        '''Stores the data at the specified key only if the key does not
+           already exist.  Returns True if the data was stored.  The local
+           cache is bypassed so that this can be used as a lock.'''
+        self.__connect()
+
+        return self.__handle.add(key, data, ttl) is True
 
 
-    def __add_to_local_cache(self, key, data=None, ttl=None):
-        if key not in _thread_local_data.cache:
-            _thread_local_data.cache[key] = {
-                'added': (time.time() if data is not None else None),
-                'data': data,
-                'ttl': ttl
-            }
+    def clear_local_cache(self):
+        '''Removes everything from the process local cache.'''
+        self.__local_cache.clear()
 
 
     def close(self):
@@ -72,18 +92,29 @@ class Memcache(object):
                     })
 
 
-    def __get_from_local_cache(self, key):
-        if key not in _thread_local_data.cache or \
-           _thread_local_data.cache[key]['data'] is None:
-            return None
+    def increment(self, key, delta=1, initial=None):
+        '''Atomically increments the counter stored at the specified key and
+           returns its new value.  If the counter does not exist it is
+           created with the initial value, unless that is None in which case
+           None is returned.  The local cache is bypassed.'''
+        self.__connect()
 
-        added = _thread_local_data.cache[key]['added']
-        ttl = _thread_local_data.cache[key]['ttl']
-        if added is not None and ttl is not None:
-            if time.time() - added >= ttl:
+        try:
+            return self.__handle.incr(key, delta)
+        except pylibmc.NotFound:
+            if initial is None:
                 return None
 
-        return _thread_local_data.cache[key]['data'].copy()
+        if self.__handle.add(key, initial):
+            return initial
+
+        return self.__handle.incr(key, delta)
+
+
+    def local_cache_stats(self):
+        '''Returns the hit, miss and eviction counters of the process local
+           cache.'''
+        return self.__local_cache.stats()
 
 
     def purge(self, key):
@@ -91,59 +122,141 @@ class Memcache(object):
         self.__connect()
 
         self.__handle.delete(key)
-        if key in _thread_local_data.cache:
-            del _thread_local_data.cache[key]
+        self.__local_cache.delete(key)
+
+
+    def purge_multi(self, keys):
+        '''Removes the values stored at the specified keys from the cache.'''
+        keys = list(keys)
+
+        self.__connect()
+
+        self.__handle.delete_multi(keys)
+        for key in keys:
+            self.__local_cache.delete(key)
 
 
-    def retrieve(self, key):
-        '''Retrieves the data stored at the specified key from the cache.'''
+    def retrieve(self, key, local_cache_ttl=None, local_cache=True):
+        '''Retrieves the data stored at the specified key from the cache.
+           If local_cache is False the process local cache is neither read
+           nor filled.'''
+        stats = self.__local_cache.stats()
         StatsLogger().hit_ratio(
             'Cache Stats',
-            _thread_local_data.stats['requests'],
-            _thread_local_data.stats['hits'])
+            stats['hits'] + stats['misses'],
+            stats['hits'])
 
-        _thread_local_data.stats['requests'] += 1
+        with tracing.span('cache', key) as span:
+            if local_cache:
+                data = self.__local_cache.get(key)
+                if data is not None:
+                    span.set('hit', True)
+                    span.set('local', True)
+                    return data
 
-        data = self.__get_from_local_cache(key)
-        if data is not None:
-            _thread_local_data.stats['hits'] += 1
-            return data
+            self.__connect()
 
-        self.__connect()
+            value = self.__handle.get(key)
+            span.set('hit', value is not None)
 
-        value = self.__handle.get(key)
-        if value is not None:
-            self.__add_to_local_cache(key, value)
+        if value is not None and local_cache:
+            self.__local_cache.set(key, value, local_cache_ttl)
 
         return value.copy() if value else None
 
 
-    def retrieve_multi(self, keys):
-        '''Retrieves the data stored for a number of keys from the cache.'''
+    def retrieve_local(self, key):
+        '''Retrieves the data stored at the specified key from the process
+           local cache only.'''
+        data = self.__local_cache.get(key)
+        if data is not None:
+            with tracing.span('cache', key) as span:
+                span.set('hit', True)
+                span.set('local', True)
+
+        return data
+
+
+    def retrieve_multi(self, keys, local_cache_ttl=None):
+        '''Retrieves the data stored for a number of keys from the cache.
+           Keys found in the local cache are served from it and only the
+           remaining keys are fetched from Memcached in a single request.
+           Returns a dict containing only the keys that were found.'''
+        stats = self.__local_cache.stats()
         StatsLogger().hit_ratio(
             'Cache Stats',
-            _thread_local_data.stats['requests'],
-            _thread_local_data.stats['hits'])
+            stats['hits'] + stats['misses'],
+            stats['hits'])
+
+        keys = list(keys)
+
+        with tracing.span('cache', 'retrieve multi', keys=len(keys)) as span:
+            results = {}
+            missing = []
+            for key in keys:
+                data = self.__local_cache.get(key)
+                if data is not None:
+                    results[key] = data
+                else:
+                    missing.append(key)
+
+            if len(missing) > 0:
+                self.__connect()
+
+                values = self.__handle.get_multi(missing)
+                if values:
+                    for key, value in values.items():
+                        if value is not None:
+                            self.__local_cache.set(
+                                key, value, local_cache_ttl
+                            )
+                            results[key] = copy.copy(value)
+
+            span.set('found', len(results))
+            span.set('hit', len(results) == len(keys))
+
+        return results
+
+
+    def retrieve_counters(self, keys):
+        '''Retrieves the counters stored at the specified keys directly from
+           Memcached in a single request, bypassing the local cache.  Returns
+           a dict containing only the keys that were found.'''
+        self.__connect()
 
-        _thread_local_data.stats['requests'] += 1
+        values = self.__handle.get_multi(list(keys))
 
-        data = self.__get_from_local_cache(key)
-        if data is not None:
-            _thread_local_data.stats['hits'] += 1
-            return data
+        return dict(values) if values else {}
 
+
+    def store(self, key, data, ttl=0, local_cache_ttl=None, local_cache=True):
+        '''Stores the data at the specified key in the cache.  If
+           local_cache is False it is only stored in Memcached.'''
         self.__connect()
 
-        values = self.__handle.get_multi(keys)
-        if values is not None:
-            self.__add_to_local_cache(key, values)
+        self.__handle.set(key, data, ttl)
+        if local_cache:
+            self.__local_cache.set(key, data, local_cache_ttl)
+
 
-        return values.copy() if values else {}
+    def store_local(self, key, data, local_cache_ttl=None):
+        '''Stores the data at the specified key in the process local cache
+           only.'''
+        self.__local_cache.set(key, data, local_cache_ttl)
 
 
-    def store(self, key, data, ttl=0, local_cache_ttl=None):
-        '''Stores the data at the specified key in the cache.'''
+    def store_multi(self, data, ttl=0, local_cache_ttl=None):
+        '''Stores each value of the data dict at its key in the cache using a
+           single request.  Returns the list of keys that could not be
+           stored.'''
         self.__connect()
 
-        self.__handle.set(key, data, ttl)
-        self.__add_to_local_cache(key, data, local_cache_ttl)
+        failed = self.__handle.set_multi(data, ttl)
+        if failed is None:
+            failed = []
+
+        for key, value in data.items():
+            if key not in failed:
+                self.__local_cache.set(key, value, local_cache_ttl)
+
+        return list(failed)
@@ -0,0 +1,307 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .query_stats import fingerprint
+from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.context import env_not_prod
+from tinyAPI.base.context import env_unit_test
+from tinyAPI.base.exception import ConfigurationException
+from tinyAPI.base import tracing
+
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+
+__all__ = [
+    'end_unit_of_work',
+    'format_violation',
+    'is_enabled',
+    'observe',
+    'start_unit_of_work',
+    'unit_of_work',
+    'UnitOfWork'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+# Only this many distinct call sites are kept for each statement.
+MAX_CALL_SITES = 5
+
+_DATA_STORE = os.path.dirname(os.path.abspath(__file__))
+_EQUALS = re.compile(r'([\w.`"]+)\s*=\s*\?')
+_TRACING = os.path.abspath(tracing.__file__)
+
+# ----- Public Functions ------------------------------------------------------
+
+def end_unit_of_work(warn=True):
+    '''
+    End the unit of work started last in the current context and return the
+    statements that were executed more often than its threshold.  Unless
+    warn is False they are also logged to the tinyAPI.n_plus_one logger.
+    '''
+
+    unit = _unit.get()
+    if unit is None:
+        return []
+
+    _unit.set(unit.parent)
+
+    violations = unit.violations()
+    if warn:
+        for violation in violations:
+            _get_logger().warning(format_violation(violation))
+
+    return violations
+
+
+def format_violation(violation):
+    '''
+    Describe a statement reported by a unit of work, where it was executed
+    from and, for selects, how it could be batched.
+    '''
+
+    message = \
+        '{} executions of this statement in one unit of work:\n\n{}\n\n' \
+            .format(violation['calls'], violation['fingerprint'])
+
+    message += 'called from:\n\n'
+    for (file, line, function), count in violation['call sites']:
+        message += \
+            '    {}:{} in {} ({}x)\n'.format(file, line, function, count)
+
+    if violation['suggestion'] is not None:
+        message += \
+            '\nconsider fetching all of the records at once:\n\n{}\n' \
+                .format(violation['suggestion'])
+
+    return message
+
+
+def is_enabled():
+    '''
+    Determine whether repeated statements are detected, as configured by "n
+    plus one detector" (enabled by default outside of production and in
+    unit tests).
+    '''
+
+    return _get_settings()['enabled']
+
+
+def observe(sql):
+    '''
+    Count an execution of sql against every active unit of work.  If none
+    is active but a request is being traced (see tinyAPI.base.tracing), one
+    is started that ends with the request.
+    '''
+
+    unit = _unit.get()
+    if unit is None:
+        if tracing.get_request_id() is None or not is_enabled():
+            return
+
+        unit = start_unit_of_work()
+        unit.is_request = True
+    elif not is_enabled():
+        return
+
+    call_site = _get_call_site()
+    key = fingerprint(sql)
+
+    while unit is not None:
+        unit.add(key, call_site)
+        unit = unit.parent
+
+
+def start_unit_of_work(threshold=None):
+    '''
+    Start counting statements executed in the current context (thread or
+    asyncio task).  A statement whose fingerprint is executed more than
+    threshold times (by default "threshold" from the configuration) is
+    reported when the unit of work ends.  Units of work can be nested.
+    '''
+
+    if threshold is None:
+        threshold = _get_settings()['threshold']
+
+    unit = UnitOfWork(threshold, _unit.get())
+    _unit.set(unit)
+
+    return unit
+
+
+def unit_of_work(threshold=None, warn=True):
+    '''
+    Return a context manager that wraps the enclosed block in a unit of
+    work.  Its violations() are available once the block exits.
+    '''
+
+    return _UnitOfWorkContext(threshold, warn)
+
+# ----- Public Classes --------------------------------------------------------
+
+class UnitOfWork(object):
+    '''
+    Counts the statements executed by a unit of work, by fingerprint, along
+    with the places in the application that executed them.
+    '''
+
+    def __init__(self, threshold, parent=None):
+        self.threshold = threshold
+        self.parent = parent
+        self.is_request = False
+        self.counts = {}
+        self.call_sites = {}
+
+    def add(self, key, call_site):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+        call_sites = self.call_sites.setdefault(key, {})
+        if call_site in call_sites or len(call_sites) < MAX_CALL_SITES:
+            call_sites[call_site] = call_sites.get(call_site, 0) + 1
+
+    def violations(self):
+        '''
+        Return the statements executed more than threshold times, most
+        frequent first.
+        '''
+
+        violations = []
+        for key, count in self.counts.items():
+            if count > self.threshold:
+                violations.append({
+                    'calls': count,
+                    'call sites': sorted(
+                        self.call_sites[key].items(),
+                        key=lambda item: item[1],
+                        reverse=True
+                    ),
+                    'fingerprint': key,
+                    'suggestion': _suggest(key)
+                })
+
+        violations.sort(key=lambda item: item['calls'], reverse=True)
+
+        return violations
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _end_request(summary):
+    unit = _unit.get()
+    if unit is not None and unit.is_request:
+        end_unit_of_work()
+
+
+def _get_call_site():
+    '''
+    Find the first frame on the stack outside of the data store.
+    '''
+
+    frame = sys._getframe(2)
+    while frame is not None:
+        file = frame.f_code.co_filename
+        if os.path.dirname(file) != _DATA_STORE and file != _TRACING:
+            return (file, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+
+    return ('<unknown>', 0, '<unknown>')
+
+
+def _get_logger():
+    '''
+    Repeated statements are written to "app log file" unless the application
+    has configured the tinyAPI.n_plus_one logger itself.
+    '''
+
+    logger = logging.getLogger('tinyAPI.n_plus_one')
+
+    with _lock:
+        if not logger.handlers:
+            try:
+                log_file = ConfigManager.value('app log file')
+            except ConfigurationException:
+                log_file = None
+
+            if log_file is not None:
+                logger.addHandler(logging.FileHandler(log_file))
+
+    return logger
+
+
+def _get_settings():
+    global _settings
+
+    if _settings is None:
+        try:
+            options = ConfigManager.value('n plus one detector')
+        except ConfigurationException:
+            options = None
+
+        if options is None:
+            options = {}
+
+        _settings = {
+            'enabled':
+                options.get('enabled', True) and
+                (env_unit_test() or env_not_prod()),
+            'threshold': options.get('threshold', 5)
+        }
+
+    return _settings
+
+
+def _reset():
+    global _settings
+
+    _settings = None
+    _unit.set(None)
+
+
+def _suggest(key):
+    '''
+    Rewrite the first equality comparison against a bind of a select as an
+    in list.
+    '''
+
+    if not key.lower().startswith('select '):
+        return None
+
+    match = _EQUALS.search(key)
+    if match is None:
+        return None
+
+    return key[:match.start()] \
+           + match.group(1) + ' in (...)' \
+           + key[match.end():]
+
+# ----- Private Classes -------------------------------------------------------
+
+class _UnitOfWorkContext(object):
+
+    def __init__(self, threshold, warn):
+        self.threshold = threshold
+        self.warn = warn
+        self.unit = None
+
+    def __enter__(self):
+        self.unit = start_unit_of_work(self.threshold)
+        return self.unit
+
+    def __exit__(self, type, value, traceback):
+        if _unit.get() is self.unit:
+            end_unit_of_work(self.warn)
+
+# ----- Process Local Data ----------------------------------------------------
+
+_lock = threading.Lock()
+_settings = None
+_unit = contextvars.ContextVar('tinyAPI unit of work', default=None)
+
+# ----- Instructions ----------------------------------------------------------
+
+tracing.register_hook(_end_request)
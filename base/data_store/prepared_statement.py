@@ -0,0 +1,138 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from . import cache_tags
+
+import functools
+import hashlib
+import re
+
+__all__ = [
+    'get_statement',
+    'PreparedQuery',
+    'PreparedStatement'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+_IS_LOCKING_READ = \
+    re.compile(r'\bfor\s+(?:update|share)\b|\block\s+in\s+share\s+mode\b',
+               re.I)
+_IS_SELECT = re.compile(r'^\(?select |^show ')
+_PLACEHOLDER = re.compile(r'%%|%s|%\(')
+_PREPARABLE = re.compile(r'^\s*\(?(?:select|insert|update|delete|values)\s',
+                         re.I)
+
+# ----- Public Functions ------------------------------------------------------
+
+@functools.lru_cache(maxsize=1024)
+def get_statement(sql):
+    '''
+    Return the PreparedStatement for sql.  Statements are parsed once per
+    process and kept in an LRU cache.
+    '''
+
+    return PreparedStatement(sql)
+
+# ----- Public Classes --------------------------------------------------------
+
+class PreparedStatement(object):
+    '''
+    A SQL statement along with everything that can be determined about it
+    without executing it: whether it returns records (and locks them), the
+    tables it reads from or writes to and, if it can be prepared on the
+    server and its binds are all positional, the equivalent statement using
+    numbered ($1, $2, ...) placeholders.
+    '''
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.is_select = _IS_SELECT.match(sql) is not None
+        self.is_locking_read = \
+            self.is_select and _IS_LOCKING_READ.search(sql) is not None
+
+        if self.is_select:
+            self.read_tags = cache_tags.get_read_tags(sql)
+            self.written_tags = []
+        else:
+            self.read_tags = []
+            self.written_tags = cache_tags.get_written_tags(sql)
+
+        self.name = \
+            'tinyapi_' + hashlib.sha1(sql.encode('utf8')).hexdigest()[:16]
+
+        self.num_binds = 0
+        self.server_sql = None
+        if _PREPARABLE.match(sql) is not None:
+            self.num_binds, self.server_sql = \
+                self.__number_placeholders(sql)
+
+    def get_execute_sql(self):
+        '''
+        Return the statement that executes the server side prepared
+        statement with the binds passed to the driver.
+        '''
+
+        if self.num_binds == 0:
+            return 'execute ' + self.name
+
+        return 'execute ' \
+               + self.name \
+               + ' (' \
+               + ', '.join(['%s'] * self.num_binds) \
+               + ')'
+
+    def get_prepare_sql(self):
+        '''
+        Return the statement that prepares this statement on the server.
+        '''
+
+        return 'prepare ' + self.name + ' as ' + self.server_sql
+
+    def __number_placeholders(self, sql):
+        num_binds = 0
+        pieces = []
+        position = 0
+
+        for match in _PLACEHOLDER.finditer(sql):
+            if match.group(0) == '%(':
+                return 0, None
+
+            pieces.append(sql[position:match.start()])
+            if match.group(0) == '%%':
+                pieces.append('%')
+            else:
+                num_binds += 1
+                pieces.append('$' + str(num_binds))
+
+            position = match.end()
+
+        pieces.append(sql[position:])
+
+        return num_binds, ''.join(pieces)
+
+
+class PreparedQuery(object):
+    '''
+    A statement prepared by a data store handle for repeated execution.
+    Returned by RDBMSBase.prepare().
+    '''
+
+    def __init__(self, dsh, statement):
+        self.__dsh = dsh
+        self.statement = statement
+
+    def count(self, binds=tuple()):
+        return self.__dsh.count(self.statement, binds)
+
+    def nth(self, index, binds=tuple()):
+        return self.__dsh.nth(index, self.statement, binds)
+
+    def one(self, binds=tuple(), obj=None):
+        return self.__dsh.one(self.statement, binds, obj)
+
+    def query(self, binds=tuple()):
+        return self.__dsh.query(self.statement, binds)
@@ -10,8 +10,15 @@ from .exception import DataStoreDuplicateKeyException
 from .exception import DataStoreForeignKeyException
 from .exception import IllegalMixOfCollationsException
 from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.data_store import cache_tags
+from tinyAPI.base.data_store.cached_query import CachedQuery
+from tinyAPI.base.data_store.retry import RetryPolicy
 from tinyAPI.base.stats_logger import StatsLogger
 from tinyAPI.base.data_store.memcache import Memcache
+from tinyAPI.base.data_store import n_plus_one
+from tinyAPI.base.data_store import query_hooks
+from tinyAPI.base.data_store import query_stats
+from tinyAPI.base import tracing
 
 import os
 import pymysql
@@ -30,6 +37,12 @@ __all__ = [
     'RDBMSBase'
 ]
 
+# ----- Constants -------------------------------------------------------------
+
+# Only connection errors are retried because a statement that failed for any
+# other reason may have been part of a transaction that has been rolled back.
+_RETRY_POLICY = RetryPolicy(errors=(2003, 2006, 2013))
+
 # ----- Thread Local Data -----------------------------------------------------
 
 _thread_local_data = threading.local()
@@ -72,6 +85,9 @@ class __DataStoreBase(object):
         self._memcache = None
         self._memcache_key = None
         self._memcache_ttl = None
+        self._memcache_tags = None
+        self._cached_query = None
+        self._invalidated_tags = set()
         self._ping_interval = 300
         self._inactive_since = time.time()
         self.requests = 0
@@ -87,6 +103,27 @@ class RDBMSBase(__DataStoreBase):
     '''Defines a data store that handles interactions with a RDBMS (MySQL,
        PostgreSQL, etc.).'''
 
+    def _apply_memcache_tags(self, sql):
+        '''When cache tags are enabled, replace the memcache key of the handle
+           with one that embeds the current generation of each table the
+           query depends on (those given to memcache() or, if none were, the
+           tables it selects from).'''
+        if self._memcache_key is None or \
+           Context.env_unit_test() or \
+           not cache_tags.is_enabled():
+            return
+
+        tags = self._memcache_tags
+        if tags is None:
+            tags = cache_tags.get_read_tags(sql)
+
+        if self._memcache is None:
+            self._memcache = Memcache()
+
+        self._memcache_key = \
+            cache_tags.tag_key(self._memcache, self._memcache_key, tags)
+
+
     def close(self):
         '''Manually close the database connection.'''
         raise NotImplementedError
@@ -112,13 +149,42 @@ class RDBMSBase(__DataStoreBase):
         return False
 
 
-    def memcache(self, key, ttl=0):
-        '''Specify that the result set should be cached in Memcache.'''
+    def _finish_memcache_invalidation(self, committed):
+        '''Tables modified inside of a transaction are invalidated again once
+           it commits so that results cached by other handles before the
+           commit became visible are discarded.'''
+        tags = self._invalidated_tags
+        self._invalidated_tags = set()
+
+        if committed and len(tags) > 0:
+            self.memcache_invalidate(tags)
+
+
+    def memcache(self, key, ttl=0, tags=None):
+        '''Specify that the result set should be cached in Memcache.  When
+           cache tags are enabled the result set is invalidated whenever any
+           of the tables in tags (by default the tables the query selects
+           from) is modified.'''
+        self._reset_memcache()
+
         self._memcache_key = key
         self._memcache_ttl = ttl
+        self._memcache_tags = tags
         return self
 
 
+    def memcache_invalidate(self, tags):
+        '''Invalidate every cached query tagged with any of the provided
+           tags.'''
+        if Context.env_unit_test() or not cache_tags.is_enabled():
+            return
+
+        if self._memcache is None:
+            self._memcache = Memcache()
+
+        cache_tags.invalidate(self._memcache, tags)
+
+
     def memcache_purge(self):
         '''If the data has been cached, purge it.'''
         if self._memcache_key is None or Context.env_unit_test():
@@ -130,13 +196,18 @@ class RDBMSBase(__DataStoreBase):
 
 
     def memcache_retrieve(self):
-        '''If the data needs to be cached, cache it.'''
+        '''If the data has been cached, retrieve it.  When the cached data has
+           expired only one caller is told (by returning None) to refresh it;
+           see CachedQuery.'''
         if self._memcache_key is None or Context.env_unit_test():
             return None
 
         if self._memcache is None:
             self._memcache = Memcache()
-        return self._memcache.retrieve(self._memcache_key)
+
+        self._cached_query = \
+            CachedQuery(self._memcache, self._memcache_key, self._memcache_ttl)
+        return self._cached_query.retrieve()
 
 
     def memcache_store(self, data):
@@ -147,11 +218,12 @@ class RDBMSBase(__DataStoreBase):
         if self._memcache is None:
             self._memcache = Memcache()
 
-        self._memcache.store(
-            self._memcache_key,
-            data,
-            self._memcache_ttl,
-            self._memcache_ttl)
+        if self._cached_query is None:
+            self._cached_query = \
+                CachedQuery(
+                    self._memcache, self._memcache_key, self._memcache_ttl)
+
+        self._cached_query.store(data)
 
 
     def nth(self, index, sql, binds=tuple()):
@@ -184,9 +256,30 @@ class RDBMSBase(__DataStoreBase):
         return None
 
 
+    def _register_write(self, tags):
+        '''Invalidate the tables modified by a statement now and remember them
+           so they can be invalidated again when the transaction commits.'''
+        if len(tags) == 0 or \
+           Context.env_unit_test() or \
+           not cache_tags.is_enabled():
+            return
+
+        tags = set(tags) - self._invalidated_tags
+        if len(tags) == 0:
+            return
+
+        self.memcache_invalidate(tags)
+        self._invalidated_tags.update(tags)
+
+
     def _reset_memcache(self):
+        if self._cached_query is not None:
+            self._cached_query.release()
+            self._cached_query = None
+
         self._memcache_key = None
         self._memcache_ttl = None
+        self._memcache_tags = None
 
 
     def rollback(self):
@@ -230,7 +323,6 @@ class DataStoreMySQL(RDBMSBase):
     def close(self, force=False):
         '''Close the active database connection.'''
         self.__close_cursor()
-        Memcache().clear_local_cache()
 
         if self.__mysql:
             if self.persistent is False or force is True:
@@ -263,6 +355,8 @@ class DataStoreMySQL(RDBMSBase):
                 self.connect()
                 self.__mysql.commit()
 
+                self._finish_memcache_invalidation(True)
+
 
     def connect(self):
         '''Perform the tasks required for connecting to the database.'''
@@ -360,6 +454,7 @@ class DataStoreMySQL(RDBMSBase):
 
         cursor = self.__get_cursor()
 
+        started = time.time()
         try:
             cursor.execute(sql, vals)
         except pymysql.err.IntegrityError as e:
@@ -384,6 +479,10 @@ class DataStoreMySQL(RDBMSBase):
 
         self.__row_count = cursor.rowcount
 
+        self.__record_statement(sql, time.time() - started, vals)
+
+        self._register_write([cache_tags.get_tag(target)])
+
         id = None
         if return_insert_id:
             id = cursor.lastrowid
@@ -405,10 +504,14 @@ class DataStoreMySQL(RDBMSBase):
 
         cursor = self.__get_cursor()
 
+        started = time.time()
         cursor.execute(sql, binds)
 
         self.__row_count = cursor.rowcount
 
+        self.__record_statement(sql, time.time() - started, binds)
+
+        self._register_write([cache_tags.get_tag(target)])
         self.memcache_purge()
 
         self.__close_cursor()
@@ -501,6 +604,8 @@ class DataStoreMySQL(RDBMSBase):
 
 
     def query(self, sql, binds=tuple()):
+        self._apply_memcache_tags(sql)
+
         results_from_cache = self.memcache_retrieve()
         if results_from_cache is not None:
             self._reset_memcache()
@@ -511,12 +616,15 @@ class DataStoreMySQL(RDBMSBase):
            re.match('^show ', sql, re.IGNORECASE):
             is_select = True
 
-        secs_backoff = .25
+        attempt = 1
+        started = time.time()
         while True:
             try:
                 self.connect()
 
                 cursor = self.__get_cursor()
+
+                executed = time.time()
                 cursor.execute(sql, binds)
 
                 break
@@ -542,16 +650,17 @@ class DataStoreMySQL(RDBMSBase):
             ) as e:
                 if isinstance(e, pymysql.err.OperationalError):
                     errno, messages = e.args
-                    if errno not in [2003, 2006, 2013]:
+                    if not _RETRY_POLICY.is_retryable(errno):
                         raise
 
                 self.close(force=True)
 
-                time.sleep(secs_backoff)
-                secs_backoff += secs_backoff
-
-                if secs_backoff >= 4.0:
+                delay = _RETRY_POLICY.get_delay(attempt, started)
+                if delay is None:
                     raise
+
+                time.sleep(delay)
+                attempt += 1
             except pymysql.err.ProgrammingError as e:
                 errno, message = e.args
 
@@ -565,6 +674,8 @@ class DataStoreMySQL(RDBMSBase):
         self.__row_count = cursor.rowcount
         self.__last_row_id = cursor.lastrowid
 
+        self.__record_statement(sql, time.time() - executed, binds)
+
         if is_select:
             results = cursor.fetchall()
             if results == ():
@@ -572,6 +683,8 @@ class DataStoreMySQL(RDBMSBase):
 
             self.memcache_store(results)
         else:
+            self._register_write(cache_tags.get_written_tags(sql))
+
             results = True
 
         self.__close_cursor()
@@ -580,6 +693,13 @@ class DataStoreMySQL(RDBMSBase):
         return results
 
 
+    def __record_statement(self, sql, duration, binds):
+        query_stats.record(sql, duration, self.__row_count, binds)
+        tracing.record('data store', sql, duration, rows=self.__row_count)
+        n_plus_one.observe(sql)
+        query_hooks.run(sql, duration, self.__row_count, binds)
+
+
     def rollback(self, ignore_exceptions=False):
         '''Rolls back the active transaction.'''
         if self.__mysql is None:
@@ -591,6 +711,8 @@ class DataStoreMySQL(RDBMSBase):
             self.connect()
             self.__mysql.rollback()
 
+            self._finish_memcache_invalidation(False)
+
 
     def __rows_to_dict(self, data=tuple()):
         results = []
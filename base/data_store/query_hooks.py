@@ -0,0 +1,48 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+import threading
+
+__all__ = [
+    'add',
+    'remove',
+    'run'
+]
+
+# ----- Public Functions ------------------------------------------------------
+
+def add(hook):
+    '''
+    Register a function that is called as hook(sql, seconds, rows, binds)
+    every time a data store handle executes a statement.
+    '''
+
+    global _hooks
+
+    with _lock:
+        if hook not in _hooks:
+            _hooks = _hooks + (hook,)
+
+
+def remove(hook):
+    global _hooks
+
+    with _lock:
+        _hooks = tuple(value for value in _hooks if value != hook)
+
+
+def run(sql, seconds, rows=None, binds=None):
+    '''
+    Call every registered hook for a statement that has been executed.
+    '''
+
+    for hook in _hooks:
+        hook(sql, seconds, rows, binds)
+
+# ----- Process Local Data ----------------------------------------------------
+
+_hooks = tuple()
+_lock = threading.Lock()
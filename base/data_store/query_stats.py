@@ -0,0 +1,200 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.exception import ConfigurationException
+from tinyAPI.base.stats_logger import BUCKETS
+from tinyAPI.base.stats_logger import StatsLogger
+
+import bisect
+import functools
+import logging
+import re
+import threading
+
+__all__ = [
+    'fingerprint',
+    'is_enabled',
+    'record',
+    'reset',
+    'snapshot'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+_IN_LIST = re.compile(r'\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_LITERAL = \
+    re.compile(
+        r"'(?:[^'\\]|\\.|'')*'"
+        + r'|"(?:[^"\\]|\\.)*"'
+        + r'|%\(\w+\)s|%s'
+        + r'|\b\d+(?:\.\d+)?\b'
+    )
+_ROWS = re.compile(r'(\(\?(?:, \?)*\))(?:\s*,\s*\(\?(?:, \?)*\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+# ----- Public Functions ------------------------------------------------------
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    '''
+    Normalize sql so that statements which differ only in their literals,
+    placeholders, the length of their in lists or the number of rows they
+    insert are counted together.
+    '''
+
+    sql = _WHITESPACE.sub(' ', sql.strip())
+    sql = _LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('in (...)', sql)
+    sql = _ROWS.sub(r'\1, ...', sql)
+
+    return sql
+
+
+def is_enabled():
+    '''
+    Determine whether query stats are recorded, as configured by "query
+    stats" (enabled by default).
+    '''
+
+    return _get_settings()['enabled']
+
+
+def record(sql, seconds, rows=None, binds=None):
+    '''
+    Record one execution of sql that took the provided number of seconds and
+    returned (or affected) rows records.  Executions slower than "slow query
+    threshold" are also logged along with their binds.
+    '''
+
+    settings = _get_settings()
+    if not settings['enabled']:
+        return
+
+    key = fingerprint(sql)
+    milliseconds = seconds * 1000
+
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = {
+                'calls': 0,
+                'histogram': [0] * (len(BUCKETS) + 1),
+                'max time': 0.0,
+                'rows': 0,
+                'slow calls': 0,
+                'total time': 0.0
+            }
+            _stats[key] = stats
+
+        stats['calls'] += 1
+        stats['total time'] += milliseconds
+        if milliseconds > stats['max time']:
+            stats['max time'] = milliseconds
+        if rows is not None and rows > 0:
+            stats['rows'] += rows
+        stats['histogram'][bisect.bisect_left(BUCKETS, milliseconds)] += 1
+
+        threshold = settings['slow query threshold']
+        is_slow = threshold is not None and seconds >= threshold
+        if is_slow:
+            stats['slow calls'] += 1
+
+    metrics = StatsLogger()
+    metrics.histogram('data_store.query_time', milliseconds)
+
+    if is_slow:
+        metrics.counter('data_store.slow_queries')
+
+        _get_slow_query_logger().warning(
+            'slow query ({:.1f} ms, {} rows):\n\n{}\n\n{}'
+                .format(milliseconds, rows, sql, repr(binds))
+        )
+
+
+def reset():
+    '''
+    Discard all of the stats recorded by this process.
+    '''
+
+    with _lock:
+        _stats.clear()
+
+
+def snapshot():
+    '''
+    Return the stats recorded by this process keyed by statement
+    fingerprint.  Times are in milliseconds and each histogram maps the
+    upper bound of a bucket (None for the last) to its count.
+    '''
+
+    with _lock:
+        stats = {
+            key: dict(value, histogram=list(value['histogram']))
+            for key, value in _stats.items()
+        }
+
+    for value in stats.values():
+        value['average time'] = value['total time'] / value['calls']
+        value['histogram'] = \
+            dict(zip(BUCKETS + (None,), value['histogram']))
+
+    return stats
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _get_settings():
+    global _settings
+
+    if _settings is None:
+        try:
+            options = ConfigManager.value('query stats')
+        except ConfigurationException:
+            options = None
+
+        if options is None:
+            options = {}
+
+        _settings = {
+            'enabled': options.get('enabled', True),
+            'slow query threshold': options.get('slow query threshold')
+        }
+
+    return _settings
+
+
+def _get_slow_query_logger():
+    '''
+    Slow queries are written to "app log file" unless the application has
+    configured the tinyAPI.slow_query logger itself.
+    '''
+
+    logger = logging.getLogger('tinyAPI.slow_query')
+
+    with _lock:
+        if not logger.handlers:
+            try:
+                log_file = ConfigManager.value('app log file')
+            except ConfigurationException:
+                log_file = None
+
+            if log_file is not None:
+                logger.addHandler(logging.FileHandler(log_file))
+
+    return logger
+
+
+def _reset():
+    global _settings
+
+    reset()
+    _settings = None
+
+# ----- Process Local Data ----------------------------------------------------
+
+_lock = threading.RLock()
+_settings = None
+_stats = {}
@@ -0,0 +1,94 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+import threading
+import time
+
+__all__ = [
+    'check_replica_lag',
+    'eject',
+    'filter_hosts',
+    'is_ejected'
+]
+
+# ----- Public Functions ------------------------------------------------------
+
+def check_replica_lag(host, get_lag, max_lag, interval=5, eject_time=30):
+    '''
+    Determine whether a replica is within max_lag seconds of its primary.
+    get_lag is only called if the host has not been checked in the last
+    interval seconds; it should return the lag in seconds or None if
+    replication is broken.  Hosts that lag too far behind are ejected for
+    eject_time seconds and False is returned.
+    '''
+
+    now = time.time()
+
+    with _lock:
+        last_checked = _last_checked.get(host)
+        if last_checked is not None and now - last_checked < interval:
+            return not is_ejected(host)
+
+        _last_checked[host] = now
+
+    lag = get_lag()
+    if lag is None or lag > max_lag:
+        eject(host, eject_time)
+        return False
+
+    return True
+
+
+def eject(host, seconds):
+    '''
+    Stop selecting host for new connections for the provided number of
+    seconds.
+    '''
+
+    with _lock:
+        _ejected[host] = time.time() + seconds
+
+
+def filter_hosts(hosts):
+    '''
+    Remove the hosts that are currently ejected from a list of [host, user,
+    password] entries.  If every host is ejected they are all returned so
+    that a connection can still be attempted.
+    '''
+
+    available = [entry for entry in hosts if not is_ejected(entry[0])]
+
+    return available if len(available) > 0 else hosts
+
+
+def is_ejected(host):
+    '''
+    Determine whether a host is currently ejected.
+    '''
+
+    with _lock:
+        until = _ejected.get(host)
+        if until is None:
+            return False
+
+        if time.time() >= until:
+            del _ejected[host]
+            return False
+
+        return True
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _reset():
+    with _lock:
+        _ejected.clear()
+        _last_checked.clear()
+
+# ----- Process Local Data ----------------------------------------------------
+
+_ejected = {}
+_last_checked = {}
+_lock = threading.RLock()
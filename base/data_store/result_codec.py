@@ -0,0 +1,237 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from .exception import DataStoreException
+from collections import OrderedDict
+from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.exception import ConfigurationException
+
+import pickle
+import threading
+import zlib
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+__all__ = [
+    'ColumnarCodec',
+    'get_codec',
+    'PickleCodec',
+    'register_codec',
+    'ResultSetCodec'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+_MAGIC = b'tAR'
+_VERSION = 1
+
+_FORMAT_PICKLE = 0x00
+_FORMAT_COLUMNAR_DICT = 0x01
+_FORMAT_COLUMNAR_ORDERED_DICT = 0x02
+_FORMAT_MASK = 0x0f
+
+_COMPRESSION_ZLIB = 0x10
+_COMPRESSION_LZ4 = 0x20
+_COMPRESSION_MASK = 0xf0
+
+# ----- Public Functions ------------------------------------------------------
+
+def get_codec():
+    '''
+    Return the process wide codec configured by "memcached result codec".
+    '''
+
+    global _codec
+
+    if _codec is None:
+        with _codec_lock:
+            if _codec is None:
+                try:
+                    settings = ConfigManager.value('memcached result codec')
+                except ConfigurationException:
+                    settings = {}
+
+                name = settings.get('name', 'columnar')
+                if name not in _codecs:
+                    raise DataStoreException(
+                        'the result codec "{}" is not registered'
+                            .format(name)
+                    )
+
+                _codec = \
+                    _codecs[name](
+                        settings.get('compression', 'zlib'),
+                        settings.get('compress threshold', 1024)
+                    )
+
+    return _codec
+
+
+def register_codec(name, codec_class):
+    '''
+    Make a ResultSetCodec subclass available to the "memcached result codec"
+    setting under name.
+    '''
+
+    global _codec
+
+    with _codec_lock:
+        _codecs[name] = codec_class
+        _codec = None
+
+# ----- Public Classes --------------------------------------------------------
+
+class ResultSetCodec(object):
+    '''
+    Converts result sets to and from the bytes stored in Memcache.
+
+    Every payload starts with a magic string, a version and a flags byte
+    that records the format and compression used, so payloads written by
+    any codec (or not encoded at all) can always be read back.
+    Subclasses implement _serialize() and may emit any of the formats that
+    decode() understands.
+    '''
+
+    def __init__(self, compression='zlib', compress_threshold=1024):
+        if compression not in (None, 'lz4', 'zlib'):
+            raise DataStoreException(
+                'unsupported compression "{}"'.format(compression)
+            )
+
+        if compression == 'lz4' and lz4 is None:
+            raise DataStoreException(
+                'lz4 compression requires the lz4 package'
+            )
+
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+
+    def __compress(self, payload):
+        if self.compression is None or \
+           len(payload) < self.compress_threshold:
+            return 0, payload
+
+        if self.compression == 'lz4':
+            return _COMPRESSION_LZ4, lz4.frame.compress(payload)
+
+        return _COMPRESSION_ZLIB, zlib.compress(payload, 1)
+
+    def decode(self, value):
+        '''
+        Return the result set encoded in value.  Values that were not
+        produced by a codec are returned unchanged.
+        '''
+
+        if value.__class__ is not bytes or value[:3] != _MAGIC:
+            return value
+
+        if value[3] != _VERSION:
+            raise DataStoreException(
+                'unsupported result codec version {}'.format(value[3])
+            )
+
+        flags = value[4]
+        payload = value[5:]
+
+        compression = flags & _COMPRESSION_MASK
+        if compression == _COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression == _COMPRESSION_LZ4:
+            if lz4 is None:
+                raise DataStoreException(
+                    'lz4 compression requires the lz4 package'
+                )
+
+            payload = lz4.frame.decompress(payload)
+
+        data = pickle.loads(payload)
+
+        format = flags & _FORMAT_MASK
+        if format == _FORMAT_PICKLE:
+            return data
+
+        row_class = OrderedDict \
+                    if format == _FORMAT_COLUMNAR_ORDERED_DICT else \
+                    dict
+        columns, rows = data
+
+        return [row_class(zip(columns, row)) for row in rows]
+
+    def encode(self, data):
+        '''
+        Return the bytes that represent data.
+        '''
+
+        format, data = self._serialize(data)
+
+        compression, payload = \
+            self.__compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+        return _MAGIC + bytes((_VERSION, format | compression)) + payload
+
+    def _serialize(self, data):
+        raise NotImplementedError
+
+
+class ColumnarCodec(ResultSetCodec):
+    '''
+    Stores a result set made of rows that share the same columns as a single
+    list of column names followed by a tuple of values for each row, rather
+    than repeating every column name in every row.  Anything else is pickled
+    as is.
+    '''
+
+    def _serialize(self, data):
+        if data.__class__ is not list or len(data) == 0:
+            return _FORMAT_PICKLE, data
+
+        row_class = data[0].__class__
+        if row_class is dict:
+            format = _FORMAT_COLUMNAR_DICT
+        elif row_class is OrderedDict:
+            format = _FORMAT_COLUMNAR_ORDERED_DICT
+        else:
+            return _FORMAT_PICKLE, data
+
+        columns = tuple(data[0].keys())
+        num_columns = len(columns)
+
+        rows = []
+        for row in data:
+            if row.__class__ is not row_class or len(row) != num_columns:
+                return _FORMAT_PICKLE, data
+
+            values = tuple(row.values())
+            if tuple(row.keys()) != columns:
+                try:
+                    values = tuple(row[column] for column in columns)
+                except KeyError:
+                    return _FORMAT_PICKLE, data
+
+            rows.append(values)
+
+        return format, (columns, rows)
+
+
+class PickleCodec(ResultSetCodec):
+    '''
+    Pickles result sets as is, optionally compressing them.
+    '''
+
+    def _serialize(self, data):
+        return _FORMAT_PICKLE, data
+
+# ----- Process Local Data ----------------------------------------------------
+
+_codec = None
+_codec_lock = threading.Lock()
+_codecs = {
+    'columnar': ColumnarCodec,
+    'pickle': PickleCodec
+}
@@ -0,0 +1,145 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+import random
+import threading
+import time
+
+__all__ = [
+    'get_retry_policy',
+    'RetryPolicy'
+]
+
+# ----- Process Local Data ----------------------------------------------------
+
+_stats = {
+    'exhausted': 0,
+    'retries': 0
+}
+_stats_lock = threading.Lock()
+
+# ----- Public Functions ------------------------------------------------------
+
+def get_retry_policy(group_settings, errors):
+    '''
+    Build the retry policy configured by the "retry" setting of a data store
+    group.  errors are the retryable error codes of the data store, used
+    unless the group lists its own.
+    '''
+
+    options = group_settings.get('retry', {})
+
+    return RetryPolicy(
+        options.get('max attempts', 5),
+        options.get('backoff', 0.25),
+        options.get('max backoff', 4.0),
+        options.get('jitter', True),
+        options.get('deadline', None),
+        options.get('errors', errors)
+    )
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+# ----- Public Classes --------------------------------------------------------
+
+class RetryPolicy(object):
+    '''
+    Decides whether, and after how long, a failed operation is attempted
+    again.
+
+    The delay before attempt N + 1 is backoff * 2 ** (N - 1) seconds, capped
+    at max backoff.  With jitter the delay is drawn at random from
+    [0, delay] so that clients that failed together (both sides of a
+    deadlock, say) do not retry together.  No further attempt is made once
+    max attempts have been made or if it would start more than deadline
+    seconds after the first.
+    '''
+
+    def __init__(self,
+                 max_attempts=5,
+                 backoff=0.25,
+                 max_backoff=4.0,
+                 jitter=True,
+                 deadline=None,
+                 errors=tuple()):
+        if max_attempts < 1:
+            raise ValueError('max attempts must be at least 1')
+
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.errors = frozenset(errors)
+
+    def get_delay(self, attempt, started):
+        '''
+        Return the number of seconds to wait before making the attempt that
+        follows attempt (counting from 1) or None if no further attempt
+        should be made.  started is when the first attempt was made.
+        '''
+
+        if attempt >= self.max_attempts:
+            return None
+
+        delay = min(self.backoff * (2 ** (attempt - 1)), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if self.deadline is not None and \
+           time.time() + delay - started >= self.deadline:
+            return None
+
+        return delay
+
+    def is_retryable(self, code):
+        return code in self.errors
+
+    def run(self, fn, get_error_code, recover=None):
+        '''
+        Call fn until it succeeds and return its result.  get_error_code
+        maps an exception raised by fn to an error code (or None).  If the
+        code is not retryable, or no attempts remain, the exception is
+        raised.  Otherwise recover, if provided, is called with the exception
+        before fn is called again.
+        '''
+
+        started = time.time()
+        attempt = 1
+
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if not self.is_retryable(get_error_code(e)):
+                    raise
+
+                delay = self.get_delay(attempt, started)
+                if delay is None:
+                    _count('exhausted')
+                    raise
+
+                if recover is not None:
+                    recover(e)
+
+                _count('retries')
+
+                time.sleep(delay)
+                attempt += 1
+
+    @staticmethod
+    def stats():
+        '''
+        Return the number of retries made and the number of operations that
+        failed after exhausting their retries in this process.
+        '''
+
+        with _stats_lock:
+            return dict(_stats)
@@ -0,0 +1,191 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from collections import OrderedDict
+
+import datetime
+import decimal
+import re
+import threading
+
+__all__ = [
+    'CompiledStatement',
+    'get_literal_markers',
+    'is_literal',
+    'StatementCache'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+_CURRENT_TIMESTAMP = re.compile('current_timestamp')
+
+_NON_LITERAL_TYPES = (
+    bool,
+    bytes,
+    bytearray,
+    datetime.date,
+    datetime.datetime,
+    datetime.time,
+    datetime.timedelta,
+    decimal.Decimal,
+    float,
+    int
+)
+
+# ----- Public Functions ------------------------------------------------------
+
+def get_literal_markers(values):
+    '''
+    Return a tuple that contains, for each value, the SQL literal it
+    represents (like current_timestamp) or None if it must be bound.
+    '''
+
+    return tuple(
+        str(value) if is_literal(value) else None for value in values
+    )
+
+
+def is_literal(value):
+    '''
+    Determine whether a value is a SQL literal that should be written into
+    the statement rather than bound as a parameter.
+    '''
+
+    if value.__class__ is not str:
+        if value is None or isinstance(value, _NON_LITERAL_TYPES):
+            return False
+
+        value = str(value)
+
+    return value == 'current_date' or \
+           _CURRENT_TIMESTAMP.match(value) is not None
+
+# ----- Public Classes --------------------------------------------------------
+
+class CompiledStatement(object):
+    '''
+    The SQL for a statement along with the binds used to build it and the
+    positions of the values that must be passed to the driver.
+    '''
+
+    def __init__(self, sql, binds, value_indexes):
+        self.sql = sql
+        self.binds = binds
+        self.value_indexes = value_indexes
+
+    def get_values(self, values):
+        '''
+        Return only the values that are bound (as opposed to literals).
+        '''
+
+        return [values[index] for index in self.value_indexes]
+
+
+class StatementCache(object):
+    '''
+    A thread safe LRU cache of compiled create and delete statements keyed by
+    target, column names and literal marker positions.
+    '''
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+
+        self.__lock = threading.Lock()
+        self.__statements = OrderedDict()
+        self.__stats = {
+            'evictions': 0,
+            'hits': 0,
+            'misses': 0
+        }
+
+    def clear(self):
+        with self.__lock:
+            self.__statements.clear()
+
+    def __compile_delete(self, target, keys, markers):
+        binds = self.__get_binds(markers)
+
+        sql = 'delete from ' + target
+        if len(keys) > 0:
+            clause = []
+            for index, key in enumerate(keys):
+                clause.append(key + ' = ' + binds[index])
+
+            sql += ' where ' + ' and '.join(clause)
+
+        return CompiledStatement(sql, binds, tuple(range(len(keys))))
+
+    def __compile_insert(self, target, keys, markers):
+        binds = self.__get_binds(markers)
+
+        sql  = 'insert into ' + target + '('
+        sql += ', '.join(keys)
+        sql += ')'
+        sql += ' values ('
+        sql += ', '.join(binds)
+        sql += ')'
+
+        return CompiledStatement(
+            sql,
+            binds,
+            tuple(
+                index
+                for index, marker in enumerate(markers)
+                if marker is None
+            )
+        )
+
+    def delete(self, target, keys, markers):
+        '''
+        Retrieve the compiled delete statement for the provided target,
+        where clause columns and literal markers.
+        '''
+
+        return self.__get(
+            ('delete', target, keys, markers), self.__compile_delete
+        )
+
+    def __get(self, key, compile):
+        with self.__lock:
+            statement = self.__statements.get(key)
+            if statement is not None:
+                self.__statements.move_to_end(key)
+                self.__stats['hits'] += 1
+                return statement
+
+            self.__stats['misses'] += 1
+
+        statement = compile(key[1], key[2], key[3])
+
+        with self.__lock:
+            self.__statements[key] = statement
+            self.__statements.move_to_end(key)
+
+            while len(self.__statements) > self.max_size:
+                self.__statements.popitem(last=False)
+                self.__stats['evictions'] += 1
+
+        return statement
+
+    def __get_binds(self, markers):
+        return ['%s' if marker is None else marker for marker in markers]
+
+    def insert(self, target, keys, markers):
+        '''
+        Retrieve the compiled insert statement for the provided target,
+        columns and literal markers.
+        '''
+
+        return self.__get(
+            ('insert', target, keys, markers), self.__compile_insert
+        )
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['size'] = len(self.__statements)
+
+        return stats
@@ -0,0 +1,109 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.AsyncConnectionPool import AsyncConnectionPool
+from tinyAPI.base.data_store.exception import ConnectionPoolTimeoutException
+
+import asyncio
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class AsyncConnectionPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+        self.closed = []
+        self.healthy = True
+
+
+    async def __connect(self):
+        connection = object()
+        self.opened.append(connection)
+        return connection
+
+
+    async def __disconnect(self, connection):
+        self.closed.append(connection)
+
+
+    async def __ping(self, connection):
+        return self.healthy
+
+
+    def __pool(self, **options):
+        return AsyncConnectionPool(
+            self.__connect, self.__ping, None, self.__disconnect, **options
+        )
+
+
+    def test_connections_are_reused(self):
+        async def run():
+            pool = self.__pool()
+
+            connection = await pool.checkout()
+            await pool.checkin(connection)
+
+            self.assertIs(connection, await pool.checkout())
+
+        asyncio.run(run())
+
+        self.assertEqual(1, len(self.opened))
+
+
+    def test_waiters_receive_checked_in_connections(self):
+        async def run():
+            pool = self.__pool(max_size=1)
+
+            connection = await pool.checkout()
+            waiter = asyncio.ensure_future(pool.checkout(timeout=1))
+
+            await asyncio.sleep(0)
+            await pool.checkin(connection)
+
+            self.assertIs(connection, await waiter)
+            self.assertEqual(1, pool.stats()['waits'])
+
+        asyncio.run(run())
+
+
+    def test_max_size_is_enforced(self):
+        async def run():
+            pool = self.__pool(max_size=1)
+
+            await pool.checkout()
+
+            try:
+                await pool.checkout(timeout=0.01)
+
+                self.fail('Was able to check out more connections than '
+                          + 'the configured max size.')
+            except ConnectionPoolTimeoutException:
+                pass
+
+            self.assertEqual(1, pool.stats()['timeouts'])
+
+        asyncio.run(run())
+
+
+    def test_unhealthy_connections_are_replaced(self):
+        async def run():
+            pool = self.__pool()
+
+            connection = await pool.checkout()
+            await pool.checkin(connection)
+
+            self.healthy = False
+            self.assertIsNot(connection, await pool.checkout())
+            self.assertEqual([connection], self.closed)
+
+        asyncio.run(run())
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
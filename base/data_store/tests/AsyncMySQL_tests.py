@@ -0,0 +1,141 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.AsyncMySQL import AsyncMySQL
+from tinyAPI.base.data_store import query_hooks
+
+import asyncio
+import mock
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class AsyncMySQLTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cursor = mock.Mock()
+        self.cursor.execute = mock.AsyncMock()
+        self.cursor.fetchall = mock.AsyncMock(return_value=[{'a': 1}])
+        self.cursor.close = mock.AsyncMock()
+        self.cursor.rowcount = 1
+        self.cursor.lastrowid = 5
+
+        self.connection = mock.Mock()
+        self.connection.cursor = mock.AsyncMock(return_value=self.cursor)
+        self.connection.commit = mock.AsyncMock()
+        self.connection.rollback = mock.AsyncMock()
+        self.connection.ping = mock.AsyncMock()
+
+        self.patchers = [
+            mock.patch.object(
+                AsyncMySQL,
+                '_open_connection',
+                mock.AsyncMock(return_value=self.connection)
+            ),
+            mock.patch('tinyAPI.base.data_store.AsyncMySQL.aiomysql')
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+
+    def __dsh(self):
+        return AsyncMySQL().configure(
+            {'read write': {'durability': 'randomizer', 'hosts': []}},
+            'db',
+            'read write',
+            'my server'
+        )
+
+
+    def test_query_and_one(self):
+        async def run():
+            dsh = self.__dsh()
+
+            self.assertEqual(
+                [{'a': 1}], await dsh.query('select a from abc')
+            )
+            self.assertEqual(
+                {'a': 1}, await dsh.one('select a from abc where a = %s', [1])
+            )
+            self.cursor.execute.assert_called_with(
+                'select a from abc where a = %s', [1]
+            )
+            self.assertEqual(1, dsh.get_row_count())
+
+            await dsh.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(1, self.connection.rollback.call_count)
+
+
+    def test_create(self):
+        async def run():
+            dsh = self.__dsh()
+
+            self.assertEqual(5, await dsh.create('abc', {'a': 1}))
+            self.cursor.execute.assert_called_once_with(
+                'insert into abc(a) values (%s)', [1]
+            )
+
+            await dsh.commit()
+            await dsh.close()
+
+        asyncio.run(run())
+
+
+    def test_statements_are_recorded(self):
+        hook = mock.Mock()
+        query_hooks.add(hook)
+
+        async def run():
+            dsh = self.__dsh()
+
+            await dsh.one('select a from abc where a = %s', [1])
+            await dsh.create('abc', {'a': 1})
+            await dsh.delete('abc', {'a': 1})
+
+            await dsh.close()
+
+        try:
+            asyncio.run(run())
+        finally:
+            query_hooks.remove(hook)
+
+        self.assertEqual(
+            [mock.call('select a from abc where a = %s', mock.ANY, 1, [1]),
+             mock.call('insert into abc(a) values (%s)', mock.ANY, 1, [1]),
+             mock.call('delete from abc where a = %s', mock.ANY, 1, [1])],
+            hook.call_args_list
+        )
+
+
+    def test_concurrent_handles_use_separate_connections(self):
+        async def run():
+            dsh_1 = self.__dsh()
+            dsh_2 = self.__dsh()
+
+            await asyncio.gather(
+                dsh_1.query('select 1'), dsh_2.query('select 2')
+            )
+
+            await dsh_1.close()
+            await dsh_2.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(2, AsyncMySQL._open_connection.call_count)
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.ConnectionPool import ConnectionPool
+from tinyAPI.base.data_store.exception import ConnectionPoolTimeoutException
+
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+        self.closed = []
+        self.healthy = True
+        self.pings = 0
+        self.resets = 0
+
+
+    def __connect(self):
+        connection = object()
+        self.opened.append(connection)
+        return connection
+
+
+    def __disconnect(self, connection):
+        self.closed.append(connection)
+
+
+    def __ping(self, connection):
+        self.pings += 1
+        return self.healthy
+
+
+    def __pool(self, **options):
+        return ConnectionPool(
+            self.__connect,
+            self.__ping,
+            self.__reset,
+            self.__disconnect,
+            **options
+        )
+
+
+    def __reset(self, connection):
+        self.resets += 1
+
+
+    def test_connections_are_reused(self):
+        pool = self.__pool()
+
+        connection = pool.checkout()
+        pool.checkin(connection)
+
+        self.assertIs(connection, pool.checkout())
+        self.assertEqual(1, len(self.opened))
+
+
+    def test_max_size_is_enforced(self):
+        pool = self.__pool(max_size=2)
+
+        pool.checkout()
+        pool.checkout()
+
+        try:
+            pool.checkout(timeout=0.01)
+
+            self.fail('Was able to check out more connections than the '
+                      + 'configured max size.')
+        except ConnectionPoolTimeoutException:
+            pass
+
+        stats = pool.stats()
+        self.assertEqual(1, stats['timeouts'])
+        self.assertEqual(1, stats['waits'])
+        self.assertEqual(2, stats['in use'])
+        self.assertEqual(1.0, stats['utilization'])
+
+
+    def test_recently_used_connections_are_not_pinged(self):
+        pool = self.__pool()
+
+        connection = pool.checkout()
+        pool.checkin(connection)
+
+        self.healthy = False
+        self.assertIs(connection, pool.checkout())
+        self.assertEqual(0, self.pings)
+
+
+    def test_reset_can_be_skipped(self):
+        pool = self.__pool()
+
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertEqual(1, self.resets)
+
+        connection = pool.checkout()
+        pool.checkin(connection, reset=False)
+        self.assertEqual(1, self.resets)
+
+
+    def test_check_runs_on_every_checkout(self):
+        checked = []
+        pool = \
+            ConnectionPool(
+                self.__connect,
+                self.__ping,
+                check=lambda connection: checked.append(connection) or False
+            )
+
+        connection = pool.checkout()
+        pool.checkin(connection)
+
+        self.assertIsNot(connection, pool.checkout())
+        self.assertEqual([connection], checked)
+        self.assertEqual(0, self.pings)
+
+
+    def test_unhealthy_connections_are_replaced(self):
+        pool = self.__pool(ping_interval=0)
+
+        connection = pool.checkout()
+        pool.checkin(connection)
+
+        self.healthy = False
+        replacement = pool.checkout()
+
+        self.assertIsNot(connection, replacement)
+        self.assertEqual([connection], self.closed)
+        self.assertEqual(1, pool.stats()['failed health checks'])
+        self.assertEqual(1, pool.stats()['size'])
+
+
+    def test_discarded_connections_are_closed(self):
+        pool = self.__pool(max_size=1)
+
+        connection = pool.checkout()
+        pool.checkin(connection, True)
+
+        self.assertEqual([connection], self.closed)
+        self.assertIsNot(connection, pool.checkout())
+
+
+    def test_fill_opens_min_size_connections(self):
+        pool = self.__pool(min_size=2)
+
+        pool.fill()
+        pool.fill()
+
+        self.assertEqual(2, len(self.opened))
+        self.assertEqual(2, pool.stats()['idle'])
+        self.assertIn(pool.checkout(), self.opened)
+        self.assertEqual(2, len(self.opened))
+
+
+    def test_idle_connections_are_pruned(self):
+        pool = self.__pool(min_size=1, max_idle_time=0)
+
+        connection_1 = pool.checkout()
+        connection_2 = pool.checkout()
+        pool.checkin(connection_1)
+        pool.checkin(connection_2)
+
+        self.assertEqual([connection_1], self.closed)
+        self.assertEqual(1, pool.stats()['size'])
+
+
+    def test_invalid_sizes(self):
+        try:
+            self.__pool(max_size=0)
+
+            self.fail('Was able to create a pool with a max size of 0.')
+        except ValueError:
+            pass
+
+        try:
+            self.__pool(min_size=2, max_size=1)
+
+            self.fail('Was able to create a pool with a min size greater '
+                      + 'than its max size.')
+        except ValueError:
+            pass
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,457 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import MySQL as mysql_module
+from tinyAPI.base.data_store.MySQL import MySQL
+from tinyAPI.base.data_store import query_hooks
+from tinyAPI.base.data_store import query_stats
+from tinyAPI.base.data_store import retry
+
+import mock
+import pymysql
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class MySQLTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = mock.Mock()
+        self.cursor = self.connection.cursor.return_value
+        self.cursor.rowcount = 2
+
+        self.patcher = \
+            mock.patch.object(
+                MySQL, '_open_connection', return_value=self.connection
+            )
+        self.patcher.start()
+
+        self.dsh = \
+            MySQL().configure(
+                {'read write': {'durability': 'randomizer', 'hosts': []}},
+                'db',
+                'read write'
+            )
+
+
+    def tearDown(self):
+        self.patcher.stop()
+
+
+    def test_create_many_chunks_rows(self):
+        row_counts = \
+            self.dsh.create_many(
+                'abc',
+                [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}, {'a': 5, 'b': 6}],
+                2
+            )
+
+        self.assertEqual([2, 2], row_counts)
+        self.assertEqual(2, self.cursor.execute.call_count)
+
+        sql, vals = self.cursor.execute.call_args_list[0][0]
+        self.assertEqual(
+            'insert into abc(a, b) values (%s, %s), (%s, %s)', sql
+        )
+        self.assertEqual([1, 2, 3, 4], vals)
+
+        sql, vals = self.cursor.execute.call_args_list[1][0]
+        self.assertEqual('insert into abc(a, b) values (%s, %s)', sql)
+        self.assertEqual([5, 6], vals)
+
+
+    def test_create_many_splits_on_literals(self):
+        self.dsh.create_many(
+            'abc',
+            [{'a': 1, 'b': 'current_timestamp'}, {'a': 2, 'b': 3}]
+        )
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+
+        sql, vals = self.cursor.execute.call_args_list[0][0]
+        self.assertEqual(
+            'insert into abc(a, b) values (%s, current_timestamp)', sql
+        )
+        self.assertEqual([1], vals)
+
+
+    def test_create_many_with_no_rows(self):
+        self.assertEqual([], self.dsh.create_many('abc', []))
+        self.assertEqual(0, self.cursor.execute.call_count)
+
+
+    def test_tables_are_invalidated_once_per_transaction(self):
+        with mock.patch.object(
+                 mysql_module.Context, 'env_unit_test', return_value=False
+             ), \
+             mock.patch.object(
+                 mysql_module.cache_tags, 'is_enabled', return_value=True
+             ), \
+             mock.patch.object(self.dsh, 'memcache_invalidate') as invalidate:
+            self.dsh.create('abc', {'a': 1})
+            self.dsh.create('abc', {'a': 2})
+            self.dsh.query('update def set a = 1')
+            self.assertEqual(
+                [mock.call({'abc'}), mock.call({'def'})],
+                invalidate.call_args_list
+            )
+
+            self.dsh.commit()
+            self.assertEqual(
+                mock.call({'abc', 'def'}), invalidate.call_args_list[-1]
+            )
+
+            self.dsh.create('abc', {'a': 3})
+            self.assertEqual(
+                mock.call({'abc'}), invalidate.call_args_list[-1]
+            )
+
+
+    def test_iterate_fetches_in_batches(self):
+        self.cursor.fetchmany.side_effect = \
+            [[{'a': 1}, {'a': 2}], [{'a': 3}], []]
+
+        records = list(self.dsh.iterate('select a from abc', tuple(), 2))
+
+        self.assertEqual([{'a': 1}, {'a': 2}, {'a': 3}], records)
+        self.cursor.fetchmany.assert_called_with(2)
+        self.assertEqual(1, self.cursor.close.call_count)
+        self.assertEqual(0, self.cursor.fetchall.call_count)
+
+
+    def test_one_sets_row_count_and_last_row_id(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+        self.cursor.rowcount = 1
+        self.cursor.lastrowid = 5
+
+        self.assertEqual({'a': 1}, self.dsh.one('select a from abc'))
+        self.assertEqual(1, self.dsh.get_row_count())
+        self.assertEqual(5, self.dsh.get_last_row_id())
+        self.assertEqual(0, self.cursor.fetchmany.call_count)
+
+
+    def test_pooled_connection_is_returned_at_commit(self):
+        dsh = \
+            MySQL().configure(
+                {'read write': {'durability': 'randomizer',
+                                'hosts': [],
+                                'pool': {'min size': 1}}},
+                'db',
+                'read write',
+                'pool test'
+            )
+
+        key = ('pool test', 'read write', 'db', 'utf8')
+
+        try:
+            dsh.query('update abc set a = 1')
+
+            stats = MySQL.pool_stats()[key]
+            self.assertEqual(1, stats['in use'])
+
+            with mock.patch.object(
+                mysql_module.Context, 'env_unit_test', return_value=False
+            ):
+                dsh.commit()
+                dsh.commit()
+
+            stats = MySQL.pool_stats()[key]
+            self.assertEqual(0, stats['in use'])
+            self.assertEqual(1, stats['idle'])
+
+            dsh.query('update abc set a = 2')
+
+            stats = MySQL.pool_stats()[key]
+            self.assertEqual(1, stats['connects'])
+            self.assertEqual(2, stats['checkouts'])
+            self.assertEqual(0, self.connection.ping.call_count)
+            self.assertEqual(0, self.connection.rollback.call_count)
+        finally:
+            dsh.close()
+            MySQL._pools.clear()
+
+
+    def test_pooling_is_opt_in(self):
+        dsh = \
+            MySQL().configure(
+                {'read write': {'durability': 'randomizer', 'hosts': []}},
+                'db',
+                'read write',
+                'no pool test'
+            )
+
+        try:
+            dsh.query('update abc set a = 1')
+
+            self.assertNotIn(
+                ('no pool test', 'read write', 'db', 'utf8'),
+                MySQL.pool_stats()
+            )
+            self.assertEqual(1, self.cursor.execute.call_count)
+        finally:
+            dsh.close()
+
+
+    def test_prepared_query(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+
+        statement = self.dsh.prepare('select a from abc where a = %s')
+
+        self.assertEqual([{'a': 1}], statement.query([1]))
+        self.assertEqual([{'a': 1}], statement.query([2]))
+        self.cursor.execute.assert_called_with(
+            'select a from abc where a = %s', [2]
+        )
+
+
+    def test_query_hooks_are_called(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+
+        hook = mock.Mock()
+        query_hooks.add(hook)
+        try:
+            self.dsh.query('select a from abc where a = %s', [1])
+            self.dsh.delete('abc', {'a': 1})
+        finally:
+            query_hooks.remove(hook)
+
+        self.dsh.query('select a from abc', [])
+
+        self.assertEqual(2, hook.call_count)
+        sql, seconds, rows, binds = hook.call_args_list[0][0]
+        self.assertEqual('select a from abc where a = %s', sql)
+        self.assertEqual([1], binds)
+        self.assertEqual(1, rows)
+
+
+    def test_streamed_statements_are_recorded(self):
+        self.cursor.fetchall.side_effect = [[{'a': 1}], [{'count': 2}]]
+        self.cursor.fetchmany.side_effect = [[{'a': 1}, {'a': 2}], []]
+
+        with mock.patch.object(query_stats, 'record') as record:
+            self.dsh.one('select a from abc where a = %s', [1])
+            self.dsh.count('select count(*) as count from abc')
+            list(self.dsh.iterate('select a from abc', tuple(), 2))
+
+        self.assertEqual(
+            [mock.call('select a from abc where a = %s', mock.ANY, 1, [1]),
+             mock.call('select count(*) as count from abc',
+                       mock.ANY,
+                       1,
+                       tuple()),
+             mock.call('select a from abc', mock.ANY, 2, tuple())],
+            record.call_args_list
+        )
+
+
+    def test_create_many_chunks_are_recorded(self):
+        with mock.patch.object(query_stats, 'record') as record:
+            self.dsh.create_many(
+                'abc', [{'a': 1}, {'a': 2}, {'a': 3}], 2
+            )
+
+        self.assertEqual(
+            [mock.call('insert into abc(a) values (%s), (%s)',
+                       mock.ANY,
+                       2,
+                       [1, 2]),
+             mock.call('insert into abc(a) values (%s)', mock.ANY, 2, [3])],
+            record.call_args_list
+        )
+
+
+    def test_query_is_retried_after_deadlock(self):
+        self.cursor.execute.side_effect = \
+            [pymysql.err.OperationalError(1213, 'Deadlock found'), None]
+
+        with mock.patch.object(retry.time, 'sleep'):
+            self.assertTrue(self.dsh.query('update abc set a = 1'))
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+        self.assertEqual(1, self.connection.rollback.call_count)
+
+
+    def test_create_many_is_retried_after_deadlock(self):
+        self.cursor.execute.side_effect = \
+            [pymysql.err.OperationalError(1213, 'Deadlock found'), None]
+
+        with mock.patch.object(retry.time, 'sleep'):
+            self.assertEqual([2], self.dsh.create_many('abc', [{'a': 1}]))
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+        self.assertEqual(1, self.connection.rollback.call_count)
+
+
+    def test_create_many_chunk_is_not_retried_after_first_chunk(self):
+        self.cursor.execute.side_effect = \
+            [None, pymysql.err.OperationalError(1213, 'Deadlock found')]
+
+        try:
+            self.dsh.create_many('abc', [{'a': 1}, {'a': 2}], 1)
+
+            self.fail('Was able to retry a chunk even though the '
+                      + 'transaction had already inserted the one before.')
+        except pymysql.err.OperationalError:
+            pass
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+        self.assertEqual(0, self.connection.rollback.call_count)
+
+
+    def test_iterate_is_retried_after_deadlock(self):
+        self.cursor.execute.side_effect = \
+            [pymysql.err.OperationalError(1213, 'Deadlock found'), None]
+        self.cursor.fetchmany.side_effect = [[{'a': 1}], []]
+
+        with mock.patch.object(retry.time, 'sleep'):
+            self.assertEqual(
+                [{'a': 1}], list(self.dsh.iterate('select a from abc'))
+            )
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+        self.assertEqual(1, self.connection.rollback.call_count)
+
+
+    def test_query_is_not_retried_after_locking_read(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+        self.dsh.query('select a from abc where a = 1 for update')
+
+        self.cursor.execute.side_effect = \
+            pymysql.err.OperationalError(1213, 'Deadlock found')
+
+        try:
+            self.dsh.query('update abc set a = 2 where a = 1')
+
+            self.fail('Was able to retry a statement even though its '
+                      + 'transaction had already locked rows.')
+        except pymysql.err.OperationalError:
+            pass
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+        self.assertEqual(0, self.connection.rollback.call_count)
+
+
+    def test_query_is_not_retried_after_write(self):
+        self.dsh.query('update abc set a = 1')
+
+        self.cursor.execute.side_effect = \
+            pymysql.err.OperationalError(1213, 'Deadlock found')
+
+        try:
+            self.dsh.query('update abc set a = 2')
+
+            self.fail('Was able to retry a statement even though the '
+                      + 'transaction had already written.')
+        except pymysql.err.OperationalError:
+            pass
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+
+
+    def test_reads_are_routed_to_read_group(self):
+        self.patcher.stop()
+
+        connections = {'primary': mock.Mock(), 'replica': mock.Mock()}
+        for connection in connections.values():
+            connection.cursor.return_value.fetchall.return_value = []
+            connection.cursor.return_value.rowcount = 1
+
+        self.patcher = \
+            mock.patch.object(
+                MySQL,
+                '_open_connection',
+                side_effect=
+                    lambda settings, db, group, charset: connections[group]
+            )
+        self.patcher.start()
+
+        dsh = \
+            MySQL().configure(
+                {'primary': {'durability': 'randomizer',
+                             'hosts': [],
+                             'read group': 'replica',
+                             'sticky primary': 60},
+                 'replica': {'durability': 'randomizer', 'hosts': []}},
+                'db',
+                'primary'
+            )
+
+        primary = connections['primary'].cursor.return_value
+        replica = connections['replica'].cursor.return_value
+
+        dsh.query('select a from abc')
+        self.assertEqual(0, primary.execute.call_count)
+        self.assertEqual(1, replica.execute.call_count)
+
+        dsh.query('select a from abc for update')
+        self.assertEqual(1, primary.execute.call_count)
+
+        dsh.query('update abc set a = 1')
+        dsh.query('select a from abc')
+        self.assertEqual(3, primary.execute.call_count)
+
+        dsh.rollback()
+        self.assertEqual(1, connections['replica'].rollback.call_count)
+
+        dsh.query('select a from abc')
+        self.assertEqual(4, primary.execute.call_count)
+        self.assertEqual(1, replica.execute.call_count)
+
+
+    def test_run_in_transaction_retries_transaction(self):
+        calls = []
+
+        def transfer(dsh):
+            calls.append(True)
+
+            dsh.query('update abc set a = a - 1')
+            dsh.query('update abc set a = a + 1')
+
+            return len(calls)
+
+        self.cursor.execute.side_effect = \
+            [None,
+             pymysql.err.OperationalError(1213, 'Deadlock found'),
+             None,
+             None]
+
+        with mock.patch.object(retry.time, 'sleep'):
+            self.assertEqual(
+                2, self.dsh.run_in_transaction(transfer, self.dsh)
+            )
+
+        self.assertEqual(4, self.cursor.execute.call_count)
+        self.assertEqual(1, self.connection.rollback.call_count)
+
+
+    def test_run_in_transaction_does_not_retry_other_errors(self):
+        self.cursor.execute.side_effect = \
+            pymysql.err.OperationalError(1054, 'Unknown column')
+
+        try:
+            self.dsh.run_in_transaction(
+                self.dsh.query, 'update abc set z = 1'
+            )
+
+            self.fail('Was able to run in a transaction even though the '
+                      + 'statement failed.')
+        except pymysql.err.OperationalError:
+            pass
+
+        self.assertEqual(1, self.cursor.execute.call_count)
+        self.assertEqual(1, self.connection.rollback.call_count)
+
+
+    def test_count_with_no_records(self):
+        self.cursor.fetchall.return_value = []
+
+        self.assertIsNone(self.dsh.count('select count(*) from abc'))
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import host_health
+from tinyAPI.base.data_store import PostgreSQL as postgresql_module
+from tinyAPI.base.data_store.PostgreSQL import PostgreSQL
+from tinyAPI.base.data_store import query_stats
+
+import mock
+import psycopg2
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class PostgreSQLTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = mock.Mock()
+        self.cursor = self.connection.cursor.return_value
+        self.cursor.rowcount = 1
+
+        self.patcher = \
+            mock.patch.object(
+                PostgreSQL, '_open_connection', return_value=self.connection
+            )
+        self.patcher.start()
+
+        self.dsh = \
+            PostgreSQL().configure(
+                {'read write': {'durability': 'randomizer', 'hosts': []}},
+                'db',
+                'read write'
+            )
+
+
+    def tearDown(self):
+        self.patcher.stop()
+
+
+    def test_prepared_query_is_prepared_once_per_connection(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+
+        statement = self.dsh.prepare('select a from abc where a = %s')
+        name = statement.statement.name
+
+        self.assertEqual([{'a': 1}], statement.query([1]))
+        self.assertEqual([{'a': 1}], statement.query([2]))
+
+        self.assertEqual(
+            [mock.call(
+                'prepare ' + name + ' as select a from abc where a = $1',
+                None),
+             mock.call('execute ' + name + ' (%s)', [1]),
+             mock.call('execute ' + name + ' (%s)', [2])],
+            self.cursor.execute.call_args_list
+        )
+
+
+    def test_unprepared_query(self):
+        self.cursor.fetchall.return_value = []
+
+        self.assertEqual([], self.dsh.query('select a from abc'))
+        self.cursor.execute.assert_called_once_with(
+            'select a from abc', tuple()
+        )
+
+
+    def test_iterate_uses_named_cursor_for_queries_only(self):
+        self.cursor.fetchmany.side_effect = [[{'a': 1}], [], [{'a': 2}], []]
+
+        list(self.dsh.iterate('select a from abc'))
+        self.assertEqual(
+            'tinyapi_iterate_1', self.connection.cursor.call_args[0][0]
+        )
+
+        records = \
+            list(self.dsh.iterate('update abc set a = 2 returning a'))
+
+        self.assertEqual([{'a': 2}], records)
+        self.assertEqual(tuple(), self.connection.cursor.call_args[0])
+
+
+    def test_create_many_chunks_are_recorded(self):
+        with mock.patch.object(query_stats, 'record') as record:
+            self.dsh.create_many('abc', [{'a': 1}, {'a': 2}])
+
+        record.assert_called_once_with(
+            'insert into abc(a) values (%s), (%s)', mock.ANY, 1, [1, 2]
+        )
+
+
+    def test_one_sets_row_count(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+        self.cursor.rowcount = 3
+
+        self.assertEqual({'a': 1}, self.dsh.one('select a from abc'))
+        self.assertEqual(3, self.dsh.get_row_count())
+        self.assertEqual(0, self.cursor.fetchmany.call_count)
+
+
+    def test_prepared_one_uses_prepared_statement(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+
+        statement = self.dsh.prepare('select a from abc where a = %s')
+
+        self.assertEqual({'a': 1}, statement.one([1]))
+        self.cursor.execute.assert_called_with(
+            'execute ' + statement.statement.name + ' (%s)', [1]
+        )
+
+
+class PostgreSQLConnectTestCase(unittest.TestCase):
+
+    def setUp(self):
+        host_health._reset()
+
+        self.settings = {
+            'read write': {
+                'durability': 'fall back',
+                'hosts': [['a', 'b', 'c'], ['d', 'e', 'f']]
+            }
+        }
+
+
+    def tearDown(self):
+        host_health._reset()
+
+
+    def test_unreachable_host_is_skipped(self):
+        connection = mock.Mock()
+        with mock.patch.object(
+            postgresql_module.psycopg2,
+            'connect',
+            side_effect=[
+                psycopg2.OperationalError(
+                    'could not connect to server: Connection refused'
+                ),
+                connection
+            ]
+        ):
+            self.assertIs(
+                connection,
+                PostgreSQL()._open_connection(
+                    self.settings, 'db', 'read write', 'utf8'
+                )
+            )
+
+        self.assertFalse(host_health.is_available('a'))
+
+
+    def test_authentication_failure_is_raised(self):
+        with mock.patch.object(
+            postgresql_module.psycopg2,
+            'connect',
+            side_effect=psycopg2.OperationalError(
+                'FATAL:  password authentication failed for user "b"'
+            )
+        ) as connect:
+            try:
+                PostgreSQL()._open_connection(
+                    self.settings, 'db', 'read write', 'utf8'
+                )
+
+                self.fail('Was able to connect even though authentication '
+                          + 'failed.')
+            except psycopg2.OperationalError:
+                pass
+
+        self.assertEqual(1, connect.call_count)
+        self.assertTrue(host_health.is_available('a'))
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
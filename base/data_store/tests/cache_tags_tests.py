@@ -0,0 +1,186 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import cache_tags
+
+import mock
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class CacheTagsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.memcache = _FakeCounterMemcache()
+
+
+    def test_get_read_tags(self):
+        self.assertEqual(
+            ['abc', 'def'],
+            cache_tags.get_read_tags(
+                '''select a.id
+                     from `db`.abc as a
+                     join def as d
+                       on d.abc_id = a.id
+                    where a.id in (select abc_id from def)'''
+            )
+        )
+        self.assertEqual([], cache_tags.get_read_tags('select 1'))
+
+
+    def test_get_read_tags_with_comma_joins(self):
+        self.assertEqual(
+            ['abc', 'def', 'ghi'],
+            cache_tags.get_read_tags(
+                '''select *
+                     from abc as a, `db`.def d,
+                          ghi
+                    where a.id = d.abc_id
+                    group by a.id'''
+            )
+        )
+
+
+    def test_get_read_tags_ignores_from_in_functions(self):
+        self.assertEqual(
+            ['abc'],
+            cache_tags.get_read_tags(
+                '''select extract(year from now()),
+                          trim(leading 'x' from a),
+                          substring(b from 2 for 3)
+                     from abc
+                    where c = 'from def' -- from ghi
+                    limit 1'''
+            )
+        )
+        self.assertEqual(
+            ['abc', 'def'],
+            cache_tags.get_read_tags(
+                '''select coalesce((select max(a) from def), 0)
+                     from abc'''
+            )
+        )
+
+
+    def test_get_written_tags(self):
+        for sql in ('insert into abc (a) values (1)',
+                    'insert ignore into abc (a) values (1)',
+                    'replace into abc (a) values (1)',
+                    ' update abc set a = 1',
+                    'UPDATE db.abc SET a = 1',
+                    'delete from `abc` where a = 1',
+                    'truncate table abc',
+                    'alter table abc add column b int'):
+            self.assertEqual(['abc'], cache_tags.get_written_tags(sql), sql)
+
+        self.assertEqual([], cache_tags.get_written_tags('set names utf8'))
+
+
+    def test_get_written_tags_for_multi_table_statements(self):
+        self.assertEqual(
+            ['abc'],
+            cache_tags.get_written_tags(
+                'delete abc from abc join def on def.id = abc.def_id'
+            )
+        )
+        self.assertEqual(
+            ['abc', 'def'],
+            cache_tags.get_written_tags(
+                '''delete a, d
+                     from abc a
+                     join def as d
+                       on d.id = a.def_id
+                    where a.id = 1'''
+            )
+        )
+        self.assertEqual(
+            ['abc'],
+            cache_tags.get_written_tags(
+                'delete from abc using abc join def where abc.a = def.a'
+            )
+        )
+        self.assertEqual(
+            ['abc', 'def'],
+            cache_tags.get_written_tags(
+                'update abc a join def d on d.id = a.def_id set d.b = 1'
+            )
+        )
+
+
+    def test_invalidate_changes_tagged_key(self):
+        key = cache_tags.tag_key(self.memcache, 'k', ['abc', 'def'])
+        self.assertEqual(
+            key, cache_tags.tag_key(self.memcache, 'k', ['def', 'abc'])
+        )
+
+        cache_tags.invalidate(self.memcache, ['def'])
+
+        self.assertNotEqual(
+            key, cache_tags.tag_key(self.memcache, 'k', ['abc', 'def'])
+        )
+
+
+    def test_invalidate_logs_memcache_errors(self):
+        memcache = mock.Mock()
+        memcache.increment.side_effect = RuntimeError('server is down')
+
+        with self.assertLogs('tinyAPI.cache_tags', 'WARNING') as logs:
+            cache_tags.invalidate(memcache, ['abc'])
+
+        self.assertIn('"abc" could not be invalidated', logs.output[0])
+        self.assertIn('server is down', logs.output[0])
+
+
+    def test_missing_generation_does_not_go_backwards(self):
+        cache_tags.tag_key(self.memcache, 'k', ['abc'])
+        generation = self.memcache.counters['tinyAPI:tag:abc']
+
+        self.memcache.counters.clear()
+
+        cache_tags.tag_key(self.memcache, 'k', ['abc'])
+        self.assertGreater(
+            self.memcache.counters['tinyAPI:tag:abc'], generation
+        )
+
+
+    def test_long_keys_are_hashed(self):
+        key = cache_tags.tag_key(self.memcache, 'k' * 300, ['abc'])
+
+        self.assertLessEqual(len(key), 250)
+
+
+    def test_no_tags(self):
+        self.assertEqual('k', cache_tags.tag_key(self.memcache, 'k', []))
+
+# ----- Private Classes -------------------------------------------------------
+
+class _FakeCounterMemcache(object):
+
+    def __init__(self):
+        self.counters = {}
+
+
+    def increment(self, key, delta=1, initial=None):
+        if key not in self.counters:
+            if initial is None:
+                return None
+
+            self.counters[key] = initial
+            return initial
+
+        self.counters[key] += delta
+        return self.counters[key]
+
+
+    def retrieve_counters(self, keys):
+        return {key: self.counters[key] for key in keys
+                if key in self.counters}
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
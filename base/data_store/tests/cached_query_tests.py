@@ -0,0 +1,170 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.cached_query import CachedQuery
+
+import time
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class CachedQueryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.memcache = _FakeMemcache()
+
+
+    def __cached_query(self, ttl=60):
+        cached_query = CachedQuery(self.memcache, 'abc', ttl)
+        cached_query.LOCK_TTL = 0.05
+        cached_query.WAIT_INTERVAL = 0.01
+        return cached_query
+
+
+    def test_miss_acquires_lock(self):
+        cached_query = self.__cached_query()
+
+        self.assertIsNone(cached_query.retrieve())
+        self.assertIn('abc:lock', self.memcache.data)
+
+        cached_query.store([{'a': 1}])
+
+        self.assertNotIn('abc:lock', self.memcache.data)
+        self.assertEqual([{'a': 1}], self.__cached_query().retrieve())
+
+
+    def test_miss_waits_for_lock_holder(self):
+        self.__cached_query().retrieve()
+
+        stats = CachedQuery.stats()
+        self.assertIsNone(self.__cached_query().retrieve())
+        self.assertEqual(
+            stats['lock waits'] + 1, CachedQuery.stats()['lock waits'])
+        self.assertEqual(
+            stats['lock wait timeouts'] + 1,
+            CachedQuery.stats()['lock wait timeouts'])
+
+
+    def test_stale_data_is_served_while_refreshing(self):
+        self.__cached_query().store([{'a': 1}])
+        self.memcache.data['abc']['expires'] = time.time() - 1
+        self.memcache.local.clear()
+
+        refresher = self.__cached_query()
+        self.assertIsNone(refresher.retrieve())
+
+        stats = CachedQuery.stats()
+        self.assertEqual([{'a': 1}], self.__cached_query().retrieve())
+        self.assertEqual(
+            stats['stale serves'] + 1, CachedQuery.stats()['stale serves'])
+
+        refresher.store([{'a': 2}])
+        self.assertEqual([{'a': 2}], self.__cached_query().retrieve())
+
+
+    def test_release_frees_lock(self):
+        cached_query = self.__cached_query()
+        cached_query.retrieve()
+        cached_query.release()
+
+        self.assertNotIn('abc:lock', self.memcache.data)
+
+
+    def test_no_ttl_never_expires(self):
+        self.__cached_query(0).store([{'a': 1}])
+
+        self.assertIsNone(self.memcache.data['abc']['expires'])
+        self.assertEqual([{'a': 1}], self.__cached_query(0).retrieve())
+
+
+    def test_local_cache_holds_decoded_rows(self):
+        codec = _CountingCodec()
+
+        CachedQuery(self.memcache, 'abc', 60, codec).store([{'a': 1}])
+        self.assertEqual('encoded', self.memcache.data['abc']['data'][0])
+        self.assertEqual([{'a': 1}], self.memcache.local['abc']['rows'])
+
+        records = CachedQuery(self.memcache, 'abc', 60, codec).retrieve()
+        records[0]['a'] = 2
+
+        self.assertEqual(
+            [{'a': 1}], CachedQuery(self.memcache, 'abc', 60, codec).retrieve()
+        )
+        self.assertEqual(0, codec.decodes)
+
+        self.memcache.local.clear()
+
+        self.assertEqual(
+            [{'a': 1}], CachedQuery(self.memcache, 'abc', 60, codec).retrieve()
+        )
+        self.assertEqual(
+            [{'a': 1}], CachedQuery(self.memcache, 'abc', 60, codec).retrieve()
+        )
+        self.assertEqual(1, codec.decodes)
+
+
+    def test_legacy_values_are_returned_as_is(self):
+        self.memcache.data['abc'] = [{'a': 1}]
+
+        self.assertEqual([{'a': 1}], self.__cached_query().retrieve())
+
+# ----- Private Classes -------------------------------------------------------
+
+class _FakeMemcache(object):
+
+    def __init__(self):
+        self.data = {}
+        self.local = {}
+
+
+    def add(self, key, data, ttl=0):
+        if key in self.data:
+            return False
+
+        self.data[key] = data
+        return True
+
+
+    def purge(self, key):
+        self.data.pop(key, None)
+        self.local.pop(key, None)
+
+
+    def retrieve(self, key, local_cache_ttl=None, local_cache=True):
+        return self.data.get(key)
+
+
+    def retrieve_local(self, key):
+        return self.local.get(key)
+
+
+    def store(self, key, data, ttl=0, local_cache_ttl=None, local_cache=True):
+        self.data[key] = data
+
+
+    def store_local(self, key, data, local_cache_ttl=None):
+        self.local[key] = data
+
+
+class _CountingCodec(object):
+
+    def __init__(self):
+        self.decodes = 0
+
+
+    def decode(self, data):
+        self.decodes += 1
+        return data[1]
+
+
+    def encode(self, data):
+        return ('encoded', data)
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.durability import get_durability
+from tinyAPI.base.data_store.exception import DataStoreException
+from tinyAPI.base.data_store.FallBack import FallBack
+from tinyAPI.base.data_store import host_health
+from tinyAPI.base.data_store.LatencyWeighted import LatencyWeighted
+from tinyAPI.base.data_store.LeastConnections import LeastConnections
+from tinyAPI.base.data_store.Randomizer import Randomizer
+
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class DurabilityTestCase(unittest.TestCase):
+
+    def setUp(self):
+        host_health._reset()
+
+
+    def tearDown(self):
+        host_health._reset()
+
+
+    def test_fall_back_skips_open_circuit(self):
+        host_health.record_failure('a')
+
+        durability = FallBack([['a', 'b', 'c'], ['d', 'e', 'f']])
+
+        self.assertEqual(['d', 'e', 'f'], durability.next())
+        self.assertEqual(['a', 'b', 'c'], durability.next())
+
+
+    def test_get_durability(self):
+        hosts = [['a', 'b', 'c'], ['d', 'e', 'f']]
+
+        self.assertIsInstance(
+            get_durability({'durability': 'fall back', 'hosts': hosts}),
+            FallBack
+        )
+        self.assertIsInstance(
+            get_durability(
+                {'durability': 'latency weighted', 'hosts': hosts}
+            ),
+            LatencyWeighted
+        )
+
+        try:
+            get_durability({'durability': 'round robin', 'hosts': hosts})
+
+            self.fail('Was able to get a durability algorithm that does not '
+                      + 'exist.')
+        except DataStoreException as e:
+            self.assertEqual(
+                'unrecognized durability algorithm "round robin"', e.message
+            )
+
+
+    def test_latency_weighted_visits_every_host(self):
+        host_health.record_success('a', 0.001)
+        host_health.record_success('d', 10.0)
+
+        durability = LatencyWeighted([['a', 'b', 'c'], ['d', 'e', 'f']])
+
+        self.assertEqual(
+            ['a', 'd'],
+            sorted([durability.next()[0], durability.next()[0]])
+        )
+
+        try:
+            durability.next()
+
+            self.fail('Was able to get next even though no more hosts remain.')
+        except DataStoreException as e:
+            self.assertEqual('no more hosts remain', e.message)
+
+
+    def test_least_connections(self):
+        host_health.connection_opened('a')
+
+        for i in range(20):
+            self.assertEqual(
+                ['d', 'e', 'f'],
+                LeastConnections([['a', 'b', 'c'], ['d', 'e', 'f']]).next()
+            )
+
+
+    def test_randomizer_skips_open_circuit(self):
+        host_health.record_failure('a')
+
+        for i in range(20):
+            self.assertEqual(
+                ['d', 'e', 'f'],
+                Randomizer([['a', 'b', 'c'], ['d', 'e', 'f']]).next()
+            )
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import host_health
+
+import mock
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class HostHealthTestCase(unittest.TestCase):
+
+    def setUp(self):
+        host_health._reset()
+
+
+    def tearDown(self):
+        host_health._reset()
+
+
+    def test_available_falls_back_to_first_host_to_recover(self):
+        with mock.patch.object(host_health.time, 'time', return_value=100):
+            host_health.record_failure('a', {'backoff': 10})
+            host_health.record_failure('b', {'backoff': 5})
+
+            self.assertEqual(
+                [['b', 'u', 'p']],
+                host_health.available([['a', 'u', 'p'], ['b', 'u', 'p']])
+            )
+
+
+    def test_circuit_backs_off_exponentially(self):
+        circuit_breaker = {
+            'failure threshold': 2,
+            'backoff': 1.0,
+            'max backoff': 3.0
+        }
+
+        with mock.patch.object(host_health.time, 'time', return_value=100):
+            host_health.record_failure('a', circuit_breaker)
+            self.assertTrue(host_health.is_available('a'))
+
+            host_health.record_failure('a', circuit_breaker)
+            self.assertFalse(host_health.is_available('a'))
+
+        with mock.patch.object(host_health.time, 'time', return_value=101):
+            self.assertTrue(host_health.is_available('a'))
+
+            host_health.record_failure('a', circuit_breaker)
+
+        with mock.patch.object(host_health.time, 'time', return_value=102.5):
+            self.assertFalse(host_health.is_available('a'))
+
+        with mock.patch.object(host_health.time, 'time', return_value=103):
+            self.assertTrue(host_health.is_available('a'))
+
+            host_health.record_failure('a', circuit_breaker)
+
+        with mock.patch.object(host_health.time, 'time', return_value=105.5):
+            self.assertFalse(host_health.is_available('a'))
+
+        with mock.patch.object(host_health.time, 'time', return_value=106):
+            self.assertTrue(host_health.is_available('a'))
+
+
+    def test_connection_counts(self):
+        host_health.connection_opened('a')
+        host_health.connection_opened('a')
+        host_health.connection_closed('a')
+        host_health.connection_closed('a')
+        host_health.connection_closed('a')
+
+        self.assertEqual(0, host_health.get_connections('a'))
+
+
+    def test_success_closes_circuit_and_smooths_latency(self):
+        host_health.record_failure('a')
+        self.assertFalse(host_health.is_available('a'))
+
+        host_health.record_success('a', 1.0)
+        host_health.record_success('a', 2.0)
+
+        stats = host_health.stats()['a']
+
+        self.assertTrue(stats['available'])
+        self.assertEqual(0, stats['consecutive failures'])
+        self.assertEqual(1, stats['total failures'])
+        self.assertAlmostEqual(1.3, stats['latency'])
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
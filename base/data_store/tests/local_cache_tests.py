@@ -0,0 +1,126 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.local_cache import LocalCache
+
+import mock
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class LocalCacheTestCase(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = LocalCache()
+
+        self.assertIsNone(cache.get('a'))
+
+        cache.set('a', [1, 2, 3])
+        self.assertEqual([1, 2, 3], cache.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['items'])
+
+
+    def test_set_overwrites_existing_entry(self):
+        cache = LocalCache()
+
+        cache.set('a', [1])
+        cache.set('a', [2])
+
+        self.assertEqual([2], cache.get('a'))
+        self.assertEqual(1, cache.stats()['items'])
+
+
+    def test_data_returned_is_a_copy(self):
+        cache = LocalCache()
+
+        cache.set('a', [1])
+        cache.get('a').append(2)
+
+        self.assertEqual([1], cache.get('a'))
+
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LocalCache(max_items=2)
+
+        cache.set('a', [1])
+        cache.set('b', [2])
+        cache.get('a')
+        cache.set('c', [3])
+
+        self.assertEqual([1], cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+
+    def test_byte_budget_is_enforced(self):
+        cache = LocalCache(max_bytes=100)
+
+        cache.set('a', 'x' * 40)
+        cache.set('b', 'x' * 40)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+        self.assertLessEqual(cache.stats()['bytes'], 100)
+
+        cache.set('c', 'x' * 1000)
+        self.assertIsNone(cache.get('c'))
+
+
+    def test_entries_expire(self):
+        cache = LocalCache(default_ttl=10)
+
+        with mock.patch('tinyAPI.base.data_store.local_cache.time') as time:
+            time.time.return_value = 100
+            cache.set('a', [1])
+            cache.set('b', [2], 0)
+
+            time.time.return_value = 110
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual([2], cache.get('b'))
+
+        self.assertEqual(1, cache.stats()['expirations'])
+
+
+    def test_ttl_is_capped_by_max_ttl(self):
+        cache = LocalCache(default_ttl=10, max_ttl=5)
+
+        with mock.patch('tinyAPI.base.data_store.local_cache.time') as time:
+            time.time.return_value = 100
+            cache.set('a', [1], 180)
+            cache.set('b', [2], 0)
+            cache.set('c', [3], 2)
+
+            time.time.return_value = 104
+            self.assertEqual([1], cache.get('a'))
+            self.assertIsNone(cache.get('c'))
+
+            time.time.return_value = 105
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNone(cache.get('b'))
+
+
+    def test_delete_and_clear(self):
+        cache = LocalCache()
+
+        cache.set('a', [1])
+        cache.set('b', [2])
+
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+
+        cache.clear()
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(0, cache.stats()['bytes'])
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
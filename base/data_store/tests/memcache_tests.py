@@ -5,6 +5,8 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 # ----- Imports ---------------------------------------------------------------
 
 from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.data_store import cache_tags
+from tinyAPI.base.data_store.memcache import Memcache
 
 import mock
 import tinyAPI
@@ -18,13 +20,18 @@ class MemcacheTestCase(unittest.TestCase):
         if ConfigManager().value('data store') == 'mysql':
             tinyAPI.dsh.select_db('local', 'tinyAPI')
 
+        Memcache().clear_local_cache()
+
 
     def test_cached_data(self):
         patcher_1 = mock.patch('tinyAPI.base.data_store.memcache.pylibmc')
         patcher_2 = mock.patch('tinyAPI.base.data_store.provider.Context')
+        patcher_3 = \
+            mock.patch.object(cache_tags, 'is_enabled', return_value=False)
 
         memcache = patcher_1.start()
         context = patcher_2.start()
+        patcher_3.start()
 
         client = mock.Mock()
         memcache.Client.return_value = client
@@ -41,6 +48,16 @@ class MemcacheTestCase(unittest.TestCase):
         self.assertEqual(1, client.get.call_count)
         tinyAPI.dsh().close()
 
+        tinyAPI.dsh() \
+            .memcache(
+                'test_memcache_cache', 180) \
+            .query(
+                """select 1
+                     from dual""")
+
+        self.assertEqual(1, client.get.call_count)
+        Memcache().clear_local_cache()
+
         tinyAPI.dsh() \
             .memcache(
                 'test_memcache_cache', 180) \
@@ -52,6 +69,74 @@ class MemcacheTestCase(unittest.TestCase):
 
         patcher_1.stop()
         patcher_2.stop()
+        patcher_3.stop()
+
+
+    def test_increment_creates_missing_counter(self):
+        patcher = mock.patch('tinyAPI.base.data_store.memcache.pylibmc')
+        memcache = patcher.start()
+
+        memcache.NotFound = KeyError
+
+        client = mock.Mock()
+        client.incr.side_effect = KeyError('a')
+        client.add.return_value = True
+        memcache.Client.return_value = client
+
+        cache = Memcache()
+
+        self.assertIsNone(cache.increment('a'))
+        self.assertEqual(10, cache.increment('a', 1, 10))
+        client.add.assert_called_once_with('a', 10)
+
+        patcher.stop()
+
+
+    def test_retrieve_multi_merges_local_cache(self):
+        patcher = mock.patch('tinyAPI.base.data_store.memcache.pylibmc')
+        memcache = patcher.start()
+
+        client = mock.Mock()
+        client.get_multi.return_value = {'b': [2]}
+        memcache.Client.return_value = client
+
+        cache = Memcache()
+        cache.store('a', [1], 180)
+
+        self.assertEqual(
+            {'a': [1], 'b': [2]},
+            cache.retrieve_multi(['a', 'b', 'c'])
+        )
+        client.get_multi.assert_called_once_with(['b', 'c'])
+
+        self.assertEqual(
+            {'a': [1], 'b': [2]}, cache.retrieve_multi(['a', 'b'])
+        )
+        self.assertEqual(1, client.get_multi.call_count)
+
+        patcher.stop()
+
+
+    def test_store_and_purge_multi(self):
+        patcher = mock.patch('tinyAPI.base.data_store.memcache.pylibmc')
+        memcache = patcher.start()
+
+        client = mock.Mock()
+        client.set_multi.return_value = ['b']
+        client.get_multi.return_value = {}
+        memcache.Client.return_value = client
+
+        cache = Memcache()
+
+        self.assertEqual(['b'], cache.store_multi({'a': [1], 'b': [2]}, 180))
+        client.set_multi.assert_called_once_with({'a': [1], 'b': [2]}, 180)
+        self.assertEqual({'a': [1]}, cache.retrieve_multi(['a', 'b']))
+
+        cache.purge_multi(['a'])
+        client.delete_multi.assert_called_once_with(['a'])
+        self.assertEqual({}, cache.retrieve_multi(['a']))
+
+        patcher.stop()
 
 # ----- Main ------------------------------------------------------------------
 
@@ -0,0 +1,140 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.MySQL import MySQL
+from tinyAPI.base.data_store import n_plus_one
+from tinyAPI.base import tracing
+
+import mock
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class NPlusOneTestCase(unittest.TestCase):
+
+    def setUp(self):
+        n_plus_one._reset()
+        n_plus_one._settings = {
+            'enabled': True,
+            'threshold': 3
+        }
+
+
+    def tearDown(self):
+        tracing.end_request()
+        n_plus_one._reset()
+
+
+    def test_disabled(self):
+        n_plus_one._settings['enabled'] = False
+
+        with n_plus_one.unit_of_work(warn=False) as unit:
+            for i in range(5):
+                n_plus_one.observe('select * from abc where id = %s')
+
+        self.assertEqual([], unit.violations())
+
+
+    def test_nested_units_of_work(self):
+        with n_plus_one.unit_of_work(warn=False) as outer:
+            for i in range(2):
+                with n_plus_one.unit_of_work(warn=False) as inner:
+                    for j in range(2):
+                        n_plus_one.observe('select * from abc where id = 1')
+
+                self.assertEqual([], inner.violations())
+
+        self.assertEqual(1, len(outer.violations()))
+        self.assertEqual(4, outer.violations()[0]['calls'])
+
+
+    def test_queries_through_handle_are_observed(self):
+        connection = mock.Mock()
+        connection.cursor.return_value.fetchall.return_value = [{'a': 1}]
+
+        with mock.patch.object(
+            MySQL, '_open_connection', return_value=connection
+        ):
+            dsh = \
+                MySQL().configure(
+                    {'read write': {'durability': 'randomizer', 'hosts': []}},
+                    'db',
+                    'read write'
+                )
+
+            with n_plus_one.unit_of_work(threshold=2, warn=False) as unit:
+                for i in range(3):
+                    dsh.one('select a from abc where id = %s', [i])
+
+        violations = unit.violations()
+
+        self.assertEqual(1, len(violations))
+        self.assertEqual(3, violations[0]['calls'])
+        self.assertEqual(
+            'select a from abc where id = ?', violations[0]['fingerprint']
+        )
+
+
+    def test_repeated_statements_are_reported(self):
+        logger = mock.Mock()
+        with mock.patch.object(
+            n_plus_one, '_get_logger', return_value=logger
+        ):
+            with n_plus_one.unit_of_work() as unit:
+                for i in range(4):
+                    n_plus_one.observe(
+                        'select * from abc where id = {}'.format(i)
+                    )
+                for i in range(3):
+                    n_plus_one.observe('update abc set a = 1')
+
+        violations = unit.violations()
+
+        self.assertEqual(1, len(violations))
+        self.assertEqual(4, violations[0]['calls'])
+        self.assertEqual(
+            'select * from abc where id = ?', violations[0]['fingerprint']
+        )
+        self.assertEqual(
+            'select * from abc where id in (...)',
+            violations[0]['suggestion']
+        )
+
+        file, line, function = violations[0]['call sites'][0][0]
+        self.assertEqual(__file__, file)
+        self.assertEqual(
+            'test_repeated_statements_are_reported', function
+        )
+        self.assertEqual(4, violations[0]['call sites'][0][1])
+
+        self.assertEqual(1, logger.warning.call_count)
+        self.assertIn('in (...)', logger.warning.call_args[0][0])
+
+
+    def test_requests_are_units_of_work(self):
+        n_plus_one.observe('select 1')
+        self.assertIsNone(n_plus_one._unit.get())
+
+        logger = mock.Mock()
+        with mock.patch.object(
+            n_plus_one, '_get_logger', return_value=logger
+        ):
+            tracing.start_request()
+            for i in range(4):
+                n_plus_one.observe('select 1')
+
+            self.assertTrue(n_plus_one._unit.get().is_request)
+
+            tracing.end_request()
+
+        self.assertIsNone(n_plus_one._unit.get())
+        self.assertEqual(1, logger.warning.call_count)
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.prepared_statement import get_statement
+from tinyAPI.base.data_store.prepared_statement import PreparedStatement
+
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class PreparedStatementTestCase(unittest.TestCase):
+
+    def test_select(self):
+        statement = \
+            PreparedStatement(
+                'select a from abc join def on def.id = abc.id where a = %s'
+            )
+
+        self.assertTrue(statement.is_select)
+        self.assertEqual(['abc', 'def'], statement.read_tags)
+        self.assertEqual([], statement.written_tags)
+        self.assertEqual(1, statement.num_binds)
+        self.assertEqual(
+            'select a from abc join def on def.id = abc.id where a = $1',
+            statement.server_sql
+        )
+
+
+    def test_dml(self):
+        statement = \
+            PreparedStatement(
+                "update abc set b = 'x%%' where a = %s and c = %s"
+            )
+
+        self.assertFalse(statement.is_select)
+        self.assertEqual([], statement.read_tags)
+        self.assertEqual(['abc'], statement.written_tags)
+        self.assertEqual(
+            "update abc set b = 'x%' where a = $1 and c = $2",
+            statement.server_sql
+        )
+
+
+    def test_prepare_and_execute_sql(self):
+        statement = PreparedStatement('select a from abc where a = %s')
+
+        self.assertEqual(
+            'prepare ' + statement.name + ' as '
+            + 'select a from abc where a = $1',
+            statement.get_prepare_sql()
+        )
+        self.assertEqual(
+            'execute ' + statement.name + ' (%s)',
+            statement.get_execute_sql()
+        )
+        self.assertEqual(
+            'execute ' + PreparedStatement('select 1').name,
+            PreparedStatement('select 1').get_execute_sql()
+        )
+
+
+    def test_statements_that_cannot_be_prepared(self):
+        self.assertIsNone(PreparedStatement('show tables').server_sql)
+        self.assertIsNone(
+            PreparedStatement('select a from abc where a = %(a)s').server_sql
+        )
+        self.assertIsNone(PreparedStatement('truncate table abc').server_sql)
+
+
+    def test_statements_are_cached(self):
+        self.assertIs(
+            get_statement('select a from abc'),
+            get_statement('select a from abc')
+        )
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import query_stats
+
+import mock
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class QueryStatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        query_stats._reset()
+
+
+    def tearDown(self):
+        query_stats._reset()
+
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            'select * from abc where id = ? and name = ?',
+            query_stats.fingerprint(
+                "select *\n  from abc\n where id = 12 and name = 'x''y'"
+            )
+        )
+        self.assertEqual(
+            'select * from abc where id in (...) and b = ?',
+            query_stats.fingerprint(
+                'select * from abc where id in (%s, %s, %s) and b = %s'
+            )
+        )
+        self.assertEqual(
+            'insert into abc(a, b) values (?, ?), ...',
+            query_stats.fingerprint(
+                'insert into abc(a, b) values (%s, %s), (%s, %s), (%s, %s)'
+            )
+        )
+        self.assertEqual(
+            'select a1 from table2',
+            query_stats.fingerprint('select a1 from table2')
+        )
+
+
+    def test_record_and_snapshot(self):
+        query_stats.record('select * from abc where id = 1', 0.0005, 1)
+        query_stats.record('select * from abc where id = 2', 0.0200, 3)
+
+        stats = query_stats.snapshot()['select * from abc where id = ?']
+
+        self.assertEqual(2, stats['calls'])
+        self.assertEqual(4, stats['rows'])
+        self.assertAlmostEqual(20.5, stats['total time'])
+        self.assertAlmostEqual(20.0, stats['max time'])
+        self.assertAlmostEqual(10.25, stats['average time'])
+        self.assertEqual(1, stats['histogram'][1])
+        self.assertEqual(1, stats['histogram'][25])
+        self.assertEqual(0, stats['histogram'][None])
+
+        query_stats.reset()
+
+        self.assertEqual({}, query_stats.snapshot())
+
+
+    def test_slow_queries_are_logged(self):
+        query_stats._settings = {
+            'enabled': True,
+            'slow query threshold': 0.1
+        }
+
+        logger = mock.Mock()
+        with mock.patch.object(
+            query_stats, '_get_slow_query_logger', return_value=logger
+        ):
+            query_stats.record('select 1', 0.05, 1)
+            query_stats.record('select * from abc where a = %s', 0.5, 0, [7])
+
+        self.assertEqual(1, logger.warning.call_count)
+        self.assertIn('500.0 ms', logger.warning.call_args[0][0])
+        self.assertIn('[7]', logger.warning.call_args[0][0])
+        self.assertEqual(
+            1,
+            query_stats.snapshot()['select * from abc where a = ?']
+                ['slow calls']
+        )
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import replication
+
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class ReplicationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        replication._reset()
+
+
+    def tearDown(self):
+        replication._reset()
+
+
+    def test_lagging_replicas_are_ejected(self):
+        self.assertTrue(
+            replication.check_replica_lag('a', lambda: 1, 10, 0))
+        self.assertFalse(replication.is_ejected('a'))
+
+        self.assertFalse(
+            replication.check_replica_lag('a', lambda: 11, 10, 0))
+        self.assertTrue(replication.is_ejected('a'))
+
+
+    def test_broken_replication_is_ejected(self):
+        self.assertFalse(
+            replication.check_replica_lag('a', lambda: None, 10, 0))
+        self.assertTrue(replication.is_ejected('a'))
+
+
+    def test_lag_is_checked_once_per_interval(self):
+        calls = []
+
+        def get_lag():
+            calls.append(1)
+            return 0
+
+        replication.check_replica_lag('a', get_lag, 10, 60)
+        replication.check_replica_lag('a', get_lag, 10, 60)
+
+        self.assertEqual(1, len(calls))
+
+
+    def test_ejection_expires(self):
+        replication.eject('a', 0)
+
+        self.assertFalse(replication.is_ejected('a'))
+
+
+    def test_filter_hosts(self):
+        hosts = [['a', 'user', 'pass'], ['b', 'user', 'pass']]
+
+        replication.eject('a', 60)
+        self.assertEqual([['b', 'user', 'pass']],
+                         replication.filter_hosts(hosts))
+
+        replication.eject('b', 60)
+        self.assertEqual(hosts, replication.filter_hosts(hosts))
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from collections import OrderedDict
+from tinyAPI.base.data_store.exception import DataStoreException
+from tinyAPI.base.data_store.result_codec import ColumnarCodec
+from tinyAPI.base.data_store.result_codec import PickleCodec
+
+import datetime
+import pickle
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class ResultCodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [
+            {'id': index,
+             'name': 'name ' + str(index),
+             'created_on': datetime.datetime(2020, 1, 1)}
+            for index in range(100)
+        ]
+
+
+    def test_columnar_round_trip(self):
+        codec = ColumnarCodec(None)
+
+        self.assertEqual(self.rows, codec.decode(codec.encode(self.rows)))
+
+
+    def test_columnar_is_smaller_than_pickle(self):
+        codec = ColumnarCodec(None)
+
+        self.assertLess(
+            len(codec.encode(self.rows)),
+            len(pickle.dumps(self.rows, pickle.HIGHEST_PROTOCOL))
+        )
+
+
+    def test_ordered_dict_rows_are_preserved(self):
+        codec = ColumnarCodec(None)
+        rows = [OrderedDict([('b', 1), ('a', 2)]),
+                OrderedDict([('b', 3), ('a', 4)])]
+
+        decoded = codec.decode(codec.encode(rows))
+
+        self.assertEqual(rows, decoded)
+        self.assertIsInstance(decoded[0], OrderedDict)
+        self.assertEqual(['b', 'a'], list(decoded[1].keys()))
+
+
+    def test_rows_with_different_key_order(self):
+        codec = ColumnarCodec(None)
+        rows = [{'a': 1, 'b': 2}, {'b': 3, 'a': 4}]
+
+        self.assertEqual(rows, codec.decode(codec.encode(rows)))
+
+
+    def test_irregular_data_is_pickled(self):
+        codec = ColumnarCodec(None)
+
+        for data in ([], [{'a': 1}, {'b': 2}], [{'a': 1}, 2], True):
+            self.assertEqual(data, codec.decode(codec.encode(data)))
+
+
+    def test_compression_above_threshold(self):
+        compressed = ColumnarCodec('zlib', 0).encode(self.rows)
+        uncompressed = ColumnarCodec('zlib', len(compressed) * 100) \
+                        .encode(self.rows)
+
+        self.assertLess(len(compressed), len(uncompressed))
+        self.assertEqual(self.rows, PickleCodec().decode(compressed))
+
+
+    def test_values_not_encoded_are_returned_as_is(self):
+        codec = ColumnarCodec()
+
+        self.assertEqual([{'a': 1}], codec.decode([{'a': 1}]))
+        self.assertEqual(b'abc', codec.decode(b'abc'))
+
+
+    def test_unsupported_compression(self):
+        try:
+            ColumnarCodec('abc')
+
+            self.fail('Was able to create a codec with an unsupported '
+                      + 'compression.')
+        except DataStoreException as e:
+            self.assertEqual('unsupported compression "abc"', e.message)
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
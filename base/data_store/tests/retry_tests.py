@@ -0,0 +1,105 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store import retry
+from tinyAPI.base.data_store.retry import get_retry_policy
+from tinyAPI.base.data_store.retry import RetryPolicy
+
+import mock
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class RetryPolicyTestCase(unittest.TestCase):
+
+    def test_backoff_doubles_up_to_max_backoff(self):
+        policy = RetryPolicy(10, 0.25, 1.0, False)
+
+        self.assertEqual(
+            [0.25, 0.5, 1.0, 1.0],
+            [policy.get_delay(attempt, 0) for attempt in range(1, 5)]
+        )
+
+
+    def test_deadline(self):
+        policy = RetryPolicy(10, 1.0, 1.0, False, 5.0)
+
+        with mock.patch.object(retry.time, 'time', return_value=103.5):
+            self.assertEqual(1.0, policy.get_delay(1, 100))
+
+        with mock.patch.object(retry.time, 'time', return_value=104.5):
+            self.assertIsNone(policy.get_delay(1, 100))
+
+
+    def test_get_retry_policy(self):
+        policy = \
+            get_retry_policy(
+                {'retry': {'max attempts': 2, 'jitter': False}}, (1213,)
+            )
+
+        self.assertEqual(2, policy.max_attempts)
+        self.assertFalse(policy.jitter)
+        self.assertEqual(frozenset([1213]), policy.errors)
+
+
+    def test_jitter(self):
+        policy = RetryPolicy(10, 1.0, 8.0, True)
+
+        for i in range(20):
+            delay = policy.get_delay(3, 0)
+            self.assertTrue(0 <= delay <= 4.0)
+
+
+    def test_run_gives_up_after_max_attempts(self):
+        fn = mock.Mock(side_effect=ValueError(1213))
+        recover = mock.Mock()
+
+        with mock.patch.object(retry.time, 'sleep'):
+            try:
+                RetryPolicy(3, errors=(1213,)).run(
+                    fn, lambda e: e.args[0], recover
+                )
+
+                self.fail('Was able to run even though every attempt '
+                          + 'failed.')
+            except ValueError:
+                pass
+
+        self.assertEqual(3, fn.call_count)
+        self.assertEqual(2, recover.call_count)
+
+
+    def test_run_raises_errors_that_are_not_retryable(self):
+        fn = mock.Mock(side_effect=ValueError(1062))
+
+        try:
+            RetryPolicy(errors=(1213,)).run(fn, lambda e: e.args[0])
+
+            self.fail('Was able to run even though the error is not '
+                      + 'retryable.')
+        except ValueError:
+            pass
+
+        self.assertEqual(1, fn.call_count)
+
+
+    def test_run_retries(self):
+        fn = mock.Mock(side_effect=[ValueError(1213), 'ok'])
+
+        with mock.patch.object(retry.time, 'sleep') as sleep:
+            self.assertEqual(
+                'ok',
+                RetryPolicy(errors=(1213,)).run(fn, lambda e: e.args[0])
+            )
+
+        self.assertEqual(2, fn.call_count)
+        self.assertEqual(1, sleep.call_count)
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
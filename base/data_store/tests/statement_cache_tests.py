@@ -0,0 +1,97 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.statement_cache import get_literal_markers
+from tinyAPI.base.data_store.statement_cache import is_literal
+from tinyAPI.base.data_store.statement_cache import StatementCache
+
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class StatementCacheTestCase(unittest.TestCase):
+
+    def test_is_literal(self):
+        self.assertTrue(is_literal('current_timestamp'))
+        self.assertTrue(is_literal('current_timestamp(6)'))
+        self.assertTrue(is_literal('current_date'))
+        self.assertFalse(is_literal('current_dates'))
+        self.assertFalse(is_literal('abc'))
+        self.assertFalse(is_literal(1))
+        self.assertFalse(is_literal(None))
+
+
+    def test_literal_markers(self):
+        self.assertEqual(
+            (None, 'current_timestamp', None),
+            get_literal_markers([1, 'current_timestamp', 'abc'])
+        )
+
+
+    def test_insert_statement(self):
+        statement = \
+            StatementCache().insert(
+                'abc', ('a', 'b', 'c'), (None, 'current_timestamp', None)
+            )
+
+        self.assertEqual(
+            'insert into abc(a, b, c) values (%s, current_timestamp, %s)',
+            statement.sql
+        )
+        self.assertEqual(
+            [1, 3], statement.get_values([1, 'current_timestamp', 3])
+        )
+
+
+    def test_delete_statement(self):
+        statement_cache = StatementCache()
+
+        self.assertEqual(
+            'delete from abc',
+            statement_cache.delete('abc', tuple(), tuple()).sql
+        )
+        self.assertEqual(
+            'delete from abc where a = %s',
+            statement_cache.delete('abc', ('a',), (None,)).sql
+        )
+        self.assertEqual(
+            'delete from abc where a = %s and b = %s',
+            statement_cache.delete('abc', ('a', 'b'), (None, None)).sql
+        )
+
+
+    def test_statements_are_cached(self):
+        statement_cache = StatementCache()
+
+        statement = statement_cache.insert('abc', ('a',), (None,))
+        self.assertIs(
+            statement, statement_cache.insert('abc', ('a',), (None,))
+        )
+
+        stats = statement_cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+
+
+    def test_least_recently_used_is_evicted(self):
+        statement_cache = StatementCache(2)
+
+        statement = statement_cache.insert('a', ('a',), (None,))
+        statement_cache.insert('b', ('a',), (None,))
+        statement_cache.insert('a', ('a',), (None,))
+        statement_cache.insert('c', ('a',), (None,))
+
+        self.assertIs(
+            statement, statement_cache.insert('a', ('a',), (None,))
+        )
+        self.assertEqual(1, statement_cache.stats()['evictions'])
+        self.assertEqual(2, statement_cache.stats()['size'])
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
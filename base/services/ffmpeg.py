@@ -4,6 +4,8 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 
 # ----- Imports ---------------------------------------------------------------
 
+from tinyAPI.base import tracing
+
 import re
 import subprocess
 
@@ -27,49 +29,51 @@ class Ffmpeg(object):
 
     def get_duration(self):
         if self.duration is None:
-            with subprocess.Popen(
-                [
-                    self.FFPROBE,
-                    '-v',
-                    'error',
-                    '-of',
-                    'default=noprint_wrappers=1:nokey=1',
-                    '-select_streams',
-                    'v:0',
-                    '-show_entries',
-                    'stream=duration',
-                    self.video_file_path
-                ],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            ) as process:
-                self.duration = \
-                    int(round(float(process.stdout.readline().decode())))
+            with tracing.span('process', 'ffprobe duration'):
+                with subprocess.Popen(
+                    [
+                        self.FFPROBE,
+                        '-v',
+                        'error',
+                        '-of',
+                        'default=noprint_wrappers=1:nokey=1',
+                        '-select_streams',
+                        'v:0',
+                        '-show_entries',
+                        'stream=duration',
+                        self.video_file_path
+                    ],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                ) as process:
+                    self.duration = \
+                        int(round(float(process.stdout.readline().decode())))
 
         return self.duration
 
 
     def get_geometry(self):
         if self.width is None or self.height is None:
-            with subprocess.Popen(
-                [
-                    self.FFPROBE,
-                    '-v',
-                    'error',
-                    '-of',
-                    'default=noprint_wrappers=1:nokey=1',
-                    '-select_streams',
-                    'v:0',
-                    '-show_entries',
-                    'stream=height,width',
-                    self.video_file_path
-                ],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            ) as process:
-                self.width = int(process.stdout.readline().decode())
-                self.height = int(process.stdout.readline().decode())
+            with tracing.span('process', 'ffprobe geometry'):
+                with subprocess.Popen(
+                    [
+                        self.FFPROBE,
+                        '-v',
+                        'error',
+                        '-of',
+                        'default=noprint_wrappers=1:nokey=1',
+                        '-select_streams',
+                        'v:0',
+                        '-show_entries',
+                        'stream=height,width',
+                        self.video_file_path
+                    ],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                ) as process:
+                    self.width = int(process.stdout.readline().decode())
+                    self.height = int(process.stdout.readline().decode())
 
         return self.width, self.height
@@ -4,6 +4,8 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 
 # ----- Imports ---------------------------------------------------------------
 
+from tinyAPI.base import tracing
+
 import os
 import re
 import subprocess
@@ -27,11 +29,12 @@ class ImageMagick(object):
                     .format(file_name)
             )
 
-        output = \
-            subprocess.check_output(
-                [self.IDENTIFY,
-                 file_name]
-            )
+        with tracing.span('process', 'identify'):
+            output = \
+                subprocess.check_output(
+                    [self.IDENTIFY,
+                     file_name]
+                )
 
         matches = re.search('(\d+)x(\d+)\+', output.decode())
         if not matches:
@@ -44,18 +47,19 @@ class ImageMagick(object):
 
 
     def resize(self, source, width, height, destination):
-        process = \
-            subprocess.Popen(
-                [self.CONVERT,
-                 '-geometry',
-                 '{}x{}'.format(width, height),
-                 source,
-                 destination],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+        with tracing.span('process', 'convert'):
+            process = \
+                subprocess.Popen(
+                    [self.CONVERT,
+                     '-geometry',
+                     '{}x{}'.format(width, height),
+                     source,
+                     destination],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                )
 
-        error = process.stderr.readline().decode()
+            error = process.stderr.readline().decode()
         if len(error) > 0:
             raise RuntimeError(error)
@@ -6,25 +6,280 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 
 from .exception import RDBMSBuilderException
 from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.data_store import cache_tags
 from tinyAPI.base.data_store.exception import DataStoreDuplicateKeyException
+from tinyAPI.base.services.table_builder.mysql import LoadDataStatement
 from tinyAPI.base.utils import find_dirs, find_files
+from pymysql.constants import CLIENT
 
 import codecs
+import concurrent.futures
 import hashlib
 import importlib.machinery
+import json
 import os
+import pymysql
 import re
 import subprocess
 import sys
-import tempfile
+import threading
+import time
 import tinyAPI
 
 __all__ = [
     'Manager'
 ]
 
+# ----- Constants -------------------------------------------------------------
+
+# Batched statements are sent to the server in chunks of at most this many
+# bytes, well under the default max_allowed_packet.
+MAX_BATCH_SIZE = 1048576
+
+# The SHA1 of every build and DML file is cached here along with the file's
+# modification time and size.
+CACHE_FILE = os.path.join(os.path.expanduser('~'), '.tinyAPI_rdbms_builder')
+
+_DELIMITER = re.compile(r'[ \t]*delimiter[ \t]+(\S+)[ \t]*(?:\r?\n|$)', re.I)
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _get_view_dependencies(definition):
+    '''Returns the prefixes of the tables (or views) a view definition
+       selects from.'''
+    return sorted(set(table.split('_')[0]
+                      for table in cache_tags.get_read_tags(definition)))
+
+
+def _split_sql(sql):
+    '''Splits a script into the statements it contains the way the mysql
+       client does, honoring "delimiter" commands, quoted strings and
+       comments.'''
+    statements = []
+    current = []
+    delimiter = ';'
+    quote = None
+    line_start = True
+
+    def flush():
+        statement = ''.join(current).strip()
+        if statement != '':
+            statements.append(statement)
+        del current[:]
+
+    i = 0
+    length = len(sql)
+    while i < length:
+        c = sql[i]
+
+        if quote is not None:
+            if c == '\\' and quote != '`':
+                current.append(sql[i:i + 2])
+                i += 2
+                continue
+
+            if c == quote:
+                quote = None
+            current.append(c)
+            i += 1
+            continue
+
+        if line_start:
+            matches = _DELIMITER.match(sql, i)
+            if matches is not None:
+                flush()
+                delimiter = matches.group(1)
+                i = matches.end()
+                continue
+        line_start = c == '\n'
+
+        if c in '\'"`':
+            quote = c
+        elif c == '#' or \
+             (sql.startswith('--', i) and
+              (i + 2 == length or sql[i + 2] in ' \t\r\n')):
+            end = sql.find('\n', i)
+            i = length if end == -1 else end
+            continue
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            end = length if end == -1 else end + 2
+            current.append(sql[i:end])
+            i = end
+            continue
+        elif sql.startswith(delimiter, i):
+            flush()
+            i += len(delimiter)
+            continue
+
+        current.append(c)
+        i += 1
+
+    flush()
+
+    return statements
+
 # ----- Protected Classes -----------------------------------------------------
 
+class _RDBMSBuilderConnection(object):
+    '''A connection over which the RDBMS Builder executes SQL.  It is kept
+       open for the whole build and, like the mysql client, autocommits.'''
+
+    def __init__(self, host, user, password):
+        self.__db_name = None
+        self.__mysql = \
+            pymysql.connect(
+                host=host if host != '' else 'localhost',
+                user=user,
+                password=password,
+                charset='utf8mb4',
+                local_infile=True,
+                autocommit=True,
+                client_flag=CLIENT.MULTI_STATEMENTS
+            )
+
+
+    def close(self):
+        self.__mysql.close()
+
+
+    def execute(self, sql, db_name=None):
+        '''Executes each of the statements in a script.  A script (a DML
+           file, for example) may "use" another database so the database
+           selected afterwards is no longer known and is selected again by
+           the next call that provides one.'''
+        self.__select_db(db_name)
+
+        try:
+            with self.__mysql.cursor() as cursor:
+                for statement in _split_sql(sql):
+                    cursor.execute(statement)
+        finally:
+            self.__db_name = None
+
+
+    def execute_batch(self, statements, db_name=None):
+        '''Executes statements that contain no delimiter commands, sending
+           as many as fit in MAX_BATCH_SIZE to the server at a time.  A
+           LoadDataStatement is executed on its own once the statements
+           before it have been.  The statements are generated by the
+           builder and never change the selected database.'''
+        self.__select_db(db_name)
+
+        with self.__mysql.cursor() as cursor:
+            batch = []
+            size = 0
+            for statement in statements:
+                if isinstance(statement, LoadDataStatement):
+                    if len(batch) > 0:
+                        self.__execute_multi(cursor, batch)
+                        batch = []
+                        size = 0
+
+                    with statement.open() as sql:
+                        cursor.execute(sql)
+                    continue
+
+                statement = statement.strip()
+                if not statement.endswith(';'):
+                    statement += ';'
+
+                if size + len(statement) > MAX_BATCH_SIZE and \
+                   len(batch) > 0:
+                    self.__execute_multi(cursor, batch)
+                    batch = []
+                    size = 0
+
+                batch.append(statement)
+                size += len(statement) + 1
+
+            if len(batch) > 0:
+                self.__execute_multi(cursor, batch)
+
+
+    def __execute_multi(self, cursor, statements):
+        cursor.execute('\n'.join(statements))
+        while cursor.nextset():
+            pass
+
+
+    def __select_db(self, db_name):
+        if db_name is not None and db_name != self.__db_name:
+            self.__mysql.select_db(db_name)
+            self.__db_name = db_name
+
+
+class _RDBMSBuilderFileHashes(object):
+    '''Computes the SHA1 of build and DML files.  Files whose modification
+       time and size have not changed since they were last hashed are not
+       read again.'''
+
+    def __init__(self, cache_file=None):
+        self.__cache_file = cache_file
+        self.__hashes = {}
+        self.__lock = threading.Lock()
+        self.__modified = False
+
+        if cache_file is not None:
+            try:
+                with open(cache_file) as f:
+                    hashes = json.load(f)
+
+                if isinstance(hashes, dict):
+                    self.__hashes = hashes
+            except (OSError, ValueError):
+                pass
+
+
+    def get(self, file):
+        '''Return the SHA1 of a file.'''
+        stat = os.stat(file)
+        key = os.path.abspath(file)
+        fingerprint = [stat.st_mtime_ns, stat.st_size]
+
+        with self.__lock:
+            cached = self.__hashes.get(key)
+
+        if cached is not None and cached[:2] == fingerprint:
+            return cached[2]
+
+        with open(file, 'rb') as f:
+            sha1 = hashlib.sha1(f.read()).hexdigest()
+
+        # A file modified in the last couple of seconds could be modified
+        # again without its modification time changing.
+        if time.time() - stat.st_mtime > 2:
+            with self.__lock:
+                self.__hashes[key] = fingerprint + [sha1]
+                self.__modified = True
+
+        return sha1
+
+
+    def get_all(self, files):
+        '''Return a dictionary mapping each file to its SHA1, hashing the
+           files that are not cached concurrently.'''
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            return dict(zip(files, executor.map(self.get, files)))
+
+
+    def save(self):
+        '''Write the hashes to the cache file, if there is one.'''
+        if self.__cache_file is None or not self.__modified:
+            return
+
+        with self.__lock:
+            temp_file = self.__cache_file + '.' + str(os.getpid())
+            try:
+                with open(temp_file, 'w') as f:
+                    json.dump(self.__hashes, f)
+
+                os.replace(temp_file, self.__cache_file)
+                self.__modified = False
+            except OSError:
+                pass
+
+
 class _RDBMSBuilderModuleSQL(object):
     '''Simple container for all of the SQL related assets for a module.'''
 
@@ -90,12 +345,106 @@ class _RDBMSBuilderModuleSQL(object):
         self.__build_file = build_file
         return self
 
+
+class _RDBMSBuilderScheduler(object):
+    '''Processes modules in dependency order, processing modules that do not
+       depend on one another concurrently.'''
+
+    def __init__(self, module_names, dependencies_map):
+        self.__module_names = list(module_names)
+        self.__dependencies = {}
+        for module_name in self.__module_names:
+            self.__dependencies[module_name] = \
+                set(dependency
+                    for dependency in dependencies_map.get(module_name, [])
+                    if dependency in module_names and
+                       dependency != module_name)
+
+
+    def get_order(self):
+        '''Returns the modules in an order in which every module follows the
+           modules it depends on.'''
+        order = []
+        done = set()
+        while len(order) < len(self.__module_names):
+            module_name = self.__next_ready(done, set(order))
+            order.append(module_name)
+            done.add(module_name)
+
+        return order
+
+
+    def __next_ready(self, done, started):
+        remaining = [module_name for module_name in self.__module_names
+                     if module_name not in started]
+
+        for module_name in remaining:
+            if self.__dependencies[module_name] <= done:
+                return module_name
+
+        if len(started - done) == 0:
+            # The remaining modules depend on each other; since foreign keys
+            # are added after all modules are built, break the cycle.
+            return remaining[0]
+
+        return None
+
+
+    def run(self, function, jobs=1, on_complete=None):
+        '''Calls function for each module, with up to jobs calls running at
+           a time, and calls on_complete with each module and its result, in
+           this thread, as soon as it is available.'''
+        if jobs <= 1:
+            for module_name in self.get_order():
+                result = function(module_name)
+                if on_complete is not None:
+                    on_complete(module_name, result)
+            return
+
+        done = set()
+        started = set()
+        running = {}
+        error = None
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            while len(done) < len(self.__module_names):
+                while error is None and len(running) < jobs:
+                    module_name = self.__next_ready(done, started)
+                    if module_name is None:
+                        break
+
+                    started.add(module_name)
+                    running[executor.submit(function, module_name)] = \
+                        module_name
+
+                if len(running) == 0:
+                    break
+
+                completed, pending = \
+                    concurrent.futures.wait(
+                        running,
+                        return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+
+                for future in completed:
+                    module_name = running.pop(future)
+                    done.add(module_name)
+
+                    if future.exception() is not None:
+                        if error is None:
+                            error = future.exception()
+                    elif on_complete is not None:
+                        on_complete(module_name, future.result())
+
+        if error is not None:
+            raise error
+
 # ----- Public Classes --------------------------------------------------------
 
 class Manager(object):
     '''Determines which database objects to build and builds them.'''
 
     def __init__(self, cli=None):
+        self.__cache_file = CACHE_FILE
         self.__cli = cli
         self.__managed_schema = None
         self.__modules = {}
@@ -112,6 +461,13 @@ class Manager(object):
         self.__prefix_to_module = {}
         self.__foreign_keys = {}
         self.__unindexed_foreign_keys = []
+        self.__connections = []
+        self.__file_hashes = None
+        self.__jobs = 1
+        self.__local = threading.local()
+        self.__lock = threading.RLock()
+        self.__module_build_times = {}
+        self.__output = threading.local()
 
 
     def __add_foreign_key_constraints(self):
@@ -211,7 +567,19 @@ class Manager(object):
                                       object.get_definition())
 
                 if isinstance(object, tinyAPI.Table):
-                    self.__assign_dependencies(module, object)
+                    self.__assign_dependencies(
+                        module, object.get_dependencies()
+                    )
+                elif isinstance(object, tinyAPI.View):
+                    # A view can only be created once the tables it selects
+                    # from exist; tables no module builds are ignored.
+                    self.__assign_dependencies(
+                        module,
+                        [dependency
+                         for dependency in
+                            _get_view_dependencies(object.get_definition())
+                         if dependency in self.__prefix_to_module]
+                    )
 
                 if isinstance(object, tinyAPI.Table):
                     indexes = object.get_index_definitions()
@@ -238,10 +606,9 @@ class Manager(object):
             self.__handle_module_dml(module)
 
 
-    def __assign_dependencies(self, module, table):
+    def __assign_dependencies(self, module, dependencies):
         '''Record all of the dependencies between modules so the system can be
            rebuilt with dependencies in mind.'''
-        dependencies = table.get_dependencies()
         for dependency in dependencies:
             if dependency not in self.__prefix_to_module.keys():
                 raise RDBMSBuilderException(
@@ -268,13 +635,14 @@ class Manager(object):
 
             self.__track_module_info(module, file)
 
-        routines = tinyAPI.dsh().query(
-            """select routine_type,
-                      routine_name
-                 from information_schema.routines
-                where routine_name like '"""
-                + module.get_prefix()
-                + "\_%%'")
+        with self.__lock:
+            routines = tinyAPI.dsh().query(
+                """select routine_type,
+                          routine_name
+                     from information_schema.routines
+                    where routine_name like '"""
+                    + module.get_prefix()
+                    + "\_%%'")
 
         for routine in routines:
             self.__notice('(+) '
@@ -284,7 +652,33 @@ class Manager(object):
                           + '()',
                           2)
 
-            self.__num_rdbms_routines += 1
+            with self.__lock:
+                self.__num_rdbms_routines += 1
+
+
+    def __build_modules(self, module_names, message, build):
+        '''Builds modules with up to "jobs" of them being built at a time,
+           timing each one.  Output from modules being built concurrently is
+           held until the module is complete so it is not interleaved.'''
+        def build_module(module_name):
+            if self.__jobs > 1:
+                self.__output.messages = []
+
+            try:
+                started = time.time()
+                self.__notice(message + module_name, 1)
+                build(self.__modules[module_name])
+
+                return time.time() - started
+            finally:
+                self.__flush_output()
+
+        def record_time(module_name, elapsed):
+            self.__module_build_times[module_name] = \
+                self.__module_build_times.get(module_name, 0) + elapsed
+
+        _RDBMSBuilderScheduler(module_names, self.__dependencies_map) \
+            .run(build_module, self.__jobs, record_time)
 
 
     def __build_sql(self, module):
@@ -304,8 +698,10 @@ class Manager(object):
                                   + statement[0]
                                   + '.'
                                   + matches.group(1), 2)
-                    self.__num_rdbms_tables += 1
-                    self.__num_rdbms_objects += 1
+
+                    with self.__lock:
+                        self.__num_rdbms_tables += 1
+                        self.__num_rdbms_objects += 1
 
                 self.__execute_statement(statement[1], statement[0])
 
@@ -320,8 +716,10 @@ class Manager(object):
                                   + statement[0]
                                   + '.'
                                   + matches.group(1), 2)
-                    self.__num_rdbms_indexes += 1
-                    self.__num_rdbms_objects += 1
+
+                    with self.__lock:
+                        self.__num_rdbms_indexes += 1
+                        self.__num_rdbms_objects += 1
 
                 self.__execute_statement(statement[1], statement[0])
 
@@ -338,18 +736,42 @@ class Manager(object):
                 self.__notice('(-) /tmp/' + file, 1)
 
 
+    def __close_connections(self):
+        with self.__lock:
+            for connection in self.__connections:
+                connection.close()
+
+            self.__connections = []
+
+
     def __compile_build_list_by_changes(self):
         '''Mark for build modules that contain modified build or DML files.'''
-        for module in list(self.__modules.values()):
-            requires_build = False
+        if ConfigManager.value('data store') != 'mysql':
+            self.__data_store_not_supported()
 
-            if self.__file_has_been_modified(module.get_build_file()):
-                requires_build = True
-            else:
-                for file in module.get_dml_files():
-                    if self.__file_has_been_modified(file):
-                        requires_build = True
-                        break
+        modules = list(self.__modules.values())
+
+        files = []
+        for module in modules:
+            files.append(module.get_build_file())
+            files.extend(module.get_dml_files())
+
+        sha1s = self.__get_file_hashes().get_all(files)
+        self.__get_file_hashes().save()
+
+        tracked = {}
+        for record in tinyAPI.dsh().query(
+            '''select file,
+                      sha1
+                 from rdbms_builder.module_info'''):
+            tracked[record['file']] = record['sha1']
+
+        for module in modules:
+            requires_build = False
+            for file in [module.get_build_file()] + module.get_dml_files():
+                if tracked.get(file) != sha1s[file]:
+                    requires_build = True
+                    break
 
             if requires_build and \
                module.get_name() not in self.__modules_to_build:
@@ -535,23 +957,20 @@ builtins._tinyapi_ref_unit_test = _tinyapi_ref_unit_test
         if len(inserts) == 0:
             return
 
-        print('        (+) adding table data ', end = '')
-        sys.stdout.flush()
+        self.__notice(
+            '(+) adding table data ({:,} statements)'.format(len(inserts)), 2
+        )
 
-        chars = ['-', '-', '\\', '\\', '|', '|', '/', '/']
         index = 0
-        for insert in inserts:
-            print(chars[index], end = '')
-            sys.stdout.flush()
-            self.__execute_statement(insert[1], insert[0])
-            print("\b", end = '')
-            sys.stdout.flush()
+        while index < len(inserts):
+            db_name = inserts[index][0]
 
-            index += 1
-            if index >= len(chars):
-                index = 0
+            statements = []
+            while index < len(inserts) and inserts[index][0] == db_name:
+                statements.append(inserts[index][1])
+                index += 1
 
-        print(" ")
+            self.__execute_statements(statements, db_name)
 
 
     def __drop_foreign_key_constraints(self):
@@ -843,6 +1262,19 @@ builtins._tinyapi_ref_unit_test = _tinyapi_ref_unit_test
                       + '{:,}'.format(self.__num_rdbms_objects),
                       1)
 
+        if len(self.__module_build_times) > 0:
+            self.__notice('Module build times:')
+
+            module_build_times = \
+                sorted(self.__module_build_times.items(),
+                       key=lambda item: item[1],
+                       reverse=True)
+            for module_name, elapsed in module_build_times:
+                self.__notice('{:8.2f}s {}'.format(elapsed, module_name), 1)
+
+        self.__get_file_hashes().save()
+        self.__close_connections()
+
 
     def __execute_postbuild_scripts(self):
         self.__notice('Finding and executing post-build files...')
@@ -906,55 +1338,19 @@ builtins._tinyapi_ref_unit_test = _tinyapi_ref_unit_test
 
 
     def __execute_statement(self, statement, db_name=None):
-        file = tempfile.NamedTemporaryFile(dir='/tmp',
-                                           prefix='tinyAPI_rdbms_builder_',
-                                           delete=False)
-
-        file.write(statement.encode())
-        file.close()
-
         try:
-            subprocess.check_output(
-                self.__get_exec_sql_command()
-                + ('' if db_name is None else ' --database=' + db_name)
-                + ' < ' + file.name,
-                stderr=subprocess.STDOUT,
-                shell=True)
-        except subprocess.CalledProcessError as e:
-            message = e.output.rstrip().decode()
-
-            if len(statement) <= 2048:
-                raise RDBMSBuilderException(
-                        'execution of this:\n\n'
-                        + statement
-                        + "\n\nproduced this error:\n\n"
-                        + message
-                        + self.__enhance_build_error(message))
-            else:
-                raise RDBMSBuilderException(
-                        'execution of this file:\n\n'
-                        + file.name
-                        + "\n\nproduced this error:\n\n"
-                        + message
-                        + self.__enhance_build_error(message))
-
-        os.remove(file.name)
+            self.__get_connection().execute(statement, db_name)
+        except pymysql.err.MySQLError as e:
+            self.__raise_execution_error(statement, e)
 
 
-    def __file_has_been_modified(self, file):
-        if ConfigManager.value('data store') != 'mysql':
-            self.__data_store_not_supported()
-
-        with open(file, 'rb') as f:
-            sha1 = hashlib.sha1(f.read()).hexdigest();
-
-        records = tinyAPI.dsh().query(
-            '''select sha1
-                 from rdbms_builder.module_info
-                where file = %s''',
-            [file])
-
-        return len(records) == 0 or records[0]['sha1'] != sha1
+    def __execute_statements(self, statements, db_name=None):
+        try:
+            self.__get_connection().execute_batch(statements, db_name)
+        except pymysql.err.MySQLError as e:
+            self.__raise_execution_error(
+                "\n".join(str(statement) for statement in statements), e
+            )
 
 
     def __find_potentially_incorrect_default_values(self):
@@ -980,44 +1376,81 @@ builtins._tinyapi_ref_unit_test = _tinyapi_ref_unit_test
             self.__notice('has default of "0000-00-00 00:00:00"', 3)
 
 
+    def __flush_output(self):
+        messages = getattr(self.__output, 'messages', None)
+        if messages is None:
+            return
+
+        self.__output.messages = None
+        with self.__lock:
+            for message, indent in messages:
+                self.__notice(message, indent)
+
+
+    def __get_connection(self):
+        '''Each thread building modules uses its own connection for the
+           duration of the build.'''
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = _RDBMSBuilderConnection(*self.__get_connection_data())
+            self.__local.connection = connection
+
+            with self.__lock:
+                self.__connections.append(connection)
+
+        return connection
+
+
+    def __get_connection_data(self):
+        if ConfigManager.value('data store') != 'mysql':
+            self.__data_store_not_supported()
+
+        if self.__connection_name is None:
+            raise RDBMSBuilderException(
+                'cannot execute SQL because connection name has not been '
+                + 'set')
+
+        connection_data = ConfigManager.value('mysql connection data')
+        if self.__connection_name not in connection_data:
+            raise RDBMSBuilderException(
+                'no connection data has been configured for "'
+                + self.__connection_name
+                + '"')
+
+        host, user, password = connection_data[self.__connection_name]
+        if user == '' and password == '':
+            user = 'root'
+
+        return host, user, password
+
+
     def __get_exec_sql_command(self):
         if self.__exec_sql_command is not None:
             return self.__exec_sql_command
 
-        if ConfigManager.value('data store') == 'mysql':
-            if self.__connection_name is None:
-                raise RDBMSBuilderException(
-                    'cannot execute SQL because connection name has not been '
-                    + 'set')
+        host, user, password = self.__get_connection_data()
 
-            connection_data = ConfigManager.value('mysql connection data')
-            if self.__connection_name not in connection_data:
-                raise RDBMSBuilderException(
-                    'no connection data has been configured for "'
-                    + self.__connection_name
-                    + '"')
+        command = ['/usr/bin/mysql']
+        if host != '':
+            command.append('--host=' + host)
 
-            host = connection_data[self.__connection_name][0]
-            user = connection_data[self.__connection_name][1]
-            password = connection_data[self.__connection_name][2]
+        if user != '':
+            command.append('--user=' + user)
 
-            command = ['/usr/bin/mysql']
-            if host != '':
-                command.append('--host=' + host)
+        if password != '':
+            command.append("--password='" + password + "'")
 
-            if user != '':
-                command.append('--user=' + user)
+        self.__exec_sql_command = ' '.join(command)
+        return self.__exec_sql_command
 
-            if password != '':
-                command.append("--password='" + password + "'")
 
-            if user == '' and password == '':
-                command.append('--user root')
+    def __get_file_hashes(self):
+        with self.__lock:
+            if self.__file_hashes is None:
+                self.__file_hashes = \
+                    _RDBMSBuilderFileHashes(self.__cache_file)
 
-            self.__exec_sql_command = ' '.join(command)
-            return self.__exec_sql_command
-        else:
-            self.__data_store_not_supported()
+            return self.__file_hashes
 
 
     def __handle_module_dml(self, module):
@@ -1034,26 +1467,56 @@ builtins._tinyapi_ref_unit_test = _tinyapi_ref_unit_test
         if self.__cli is None:
             return None
 
-        self.__cli.notice(message, indent)
+        messages = getattr(self.__output, 'messages', None)
+        if messages is not None:
+            messages.append((message, indent))
+        else:
+            self.__cli.notice(message, indent)
+
+
+    def __raise_execution_error(self, statement, error):
+        if len(error.args) == 2:
+            message = 'ERROR {}: {}'.format(*error.args)
+        else:
+            message = str(error)
+
+        if len(statement) > 2048:
+            statement = statement[:2048] + '\n...'
+
+        raise RDBMSBuilderException(
+                'execution of this:\n\n'
+                + statement
+                + "\n\nproduced this error:\n\n"
+                + message
+                + self.__enhance_build_error(message))
 
 
     def __rebuild_modules(self):
         self.__notice('Rebuilding all DDL...')
 
-        for module_name in self.__modules_to_build.keys():
-            self.__notice('building module ' + module_name, 1)
-            self.__build_sql(self.__modules[module_name])
+        self.__build_modules(
+            self.__modules_to_build.keys(),
+            'building module ',
+            self.__build_sql
+        )
 
 
     def __recompile_dml(self):
         self.__notice('Recompiling all DML...')
 
-        for module_name in self.__modules_to_build.keys():
-            dml_files = self.__modules[module_name].get_dml_files()
-            if len(dml_files) > 0:
-                self.__notice('compiling for ' + module_name, 1);
+        self.__build_modules(
+            [module_name for module_name in self.__modules_to_build.keys()
+             if len(self.__modules[module_name].get_dml_files()) > 0],
+            'compiling for ',
+            self.__build_dml
+        )
 
-                self.__build_dml(self.__modules[module_name])
+
+    def set_cache_file(self, cache_file):
+        '''Set the file in which the hashes of build and DML files are cached
+           (None disables the cache).'''
+        self.__cache_file = cache_file
+        return self
 
 
     def set_connection_name(self, connection_name):
@@ -1064,34 +1527,40 @@ builtins._tinyapi_ref_unit_test = _tinyapi_ref_unit_test
         return self
 
 
+    def set_jobs(self, jobs):
+        '''Set the number of modules that can be built at the same time.'''
+        self.__jobs = max(1, jobs)
+        return self
+
+
     def __track_module_info(self, module, file):
         if ConfigManager.value('data store') != 'mysql':
             self.__data_store_not_supported()
 
-        with open(file, 'rb') as f:
-            sha1 = hashlib.sha1(f.read()).hexdigest();
-
-        tinyAPI.dsh().query(
-            '''insert into rdbms_builder.module_info
-               (
-                  file,
-                  sha1
-               )
-               values
-               (
-                  %s,
-                  %s
-               )
-               on duplicate key
-               update sha1 = %s''',
-            [file, sha1, sha1])
-
-        tinyAPI.dsh().query(
-            '''delete from rdbms_builder.dirty_module
-                where name = %s''',
-            [module.get_name()])
-
-        tinyAPI.dsh().commit()
+        sha1 = self.__get_file_hashes().get(file)
+
+        with self.__lock:
+            tinyAPI.dsh().query(
+                '''insert into rdbms_builder.module_info
+                   (
+                      file,
+                      sha1
+                   )
+                   values
+                   (
+                      %s,
+                      %s
+                   )
+                   on duplicate key
+                   update sha1 = %s''',
+                [file, sha1, sha1])
+
+            tinyAPI.dsh().query(
+                '''delete from rdbms_builder.dirty_module
+                    where name = %s''',
+                [module.get_name()])
+
+            tinyAPI.dsh().commit()
 
 
     def __verify_foreign_key_indexes(self):
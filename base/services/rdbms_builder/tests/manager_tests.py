@@ -4,9 +4,25 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 
 # ----- Imports ---------------------------------------------------------------
 
+from tinyAPI.base.services.rdbms_builder import manager
+from tinyAPI.base.services.rdbms_builder.manager \
+    import _RDBMSBuilderConnection
+from tinyAPI.base.services.rdbms_builder.manager \
+    import _RDBMSBuilderFileHashes
 from tinyAPI.base.services.rdbms_builder.manager import _RDBMSBuilderModuleSQL
+from tinyAPI.base.services.rdbms_builder.manager \
+    import _RDBMSBuilderScheduler
+from tinyAPI.base.services.rdbms_builder.manager \
+    import _get_view_dependencies
+from tinyAPI.base.services.rdbms_builder.manager import _split_sql
 
+import mock
+import os
+import re
+import tempfile
+import threading
 import tinyAPI
+import time
 import unittest
 
 # ----- Test  -----------------------------------------------------------------
@@ -76,6 +92,226 @@ class RDBMSBuilderManagerTestCase(unittest.TestCase):
         self.assertEqual('c', inserts[1][0])
         self.assertEqual('d', inserts[1][1])
 
+
+    def test_scheduler_order(self):
+        scheduler = \
+            _RDBMSBuilderScheduler(
+                ['c', 'b', 'a', 'd'],
+                {'a': [], 'b': ['a'], 'c': ['b', 'a', 'x'], 'd': []}
+            )
+
+        self.assertEqual(['a', 'b', 'c', 'd'], scheduler.get_order())
+
+
+    def test_scheduler_order_with_cycle(self):
+        scheduler = \
+            _RDBMSBuilderScheduler(
+                ['a', 'b', 'c'],
+                {'a': ['b'], 'b': ['a'], 'c': ['a']}
+            )
+
+        self.assertEqual(['a', 'b', 'c'], scheduler.get_order())
+
+
+    def test_scheduler_runs_modules_concurrently(self):
+        lock = threading.Lock()
+        started = {}
+        completed = []
+
+        def build(module_name):
+            with lock:
+                started[module_name] = set(completed)
+            time.sleep(0.05)
+            return module_name.upper()
+
+        def on_complete(module_name, result):
+            self.assertEqual(module_name.upper(), result)
+            completed.append(module_name)
+
+        _RDBMSBuilderScheduler(
+            ['a', 'b', 'c', 'd'],
+            {'c': ['a', 'b'], 'd': ['c']}
+        ) \
+            .run(build, 4, on_complete)
+
+        self.assertEqual(set(), started['a'])
+        self.assertEqual(set(), started['b'])
+        self.assertEqual({'a', 'b'}, started['c'])
+        self.assertEqual({'a', 'b', 'c'}, started['d'])
+        self.assertEqual('d', completed[-1])
+
+
+    def test_scheduler_stops_after_error(self):
+        built = []
+
+        def build(module_name):
+            if module_name == 'a':
+                raise RuntimeError('failed')
+            built.append(module_name)
+
+        with self.assertRaises(RuntimeError):
+            _RDBMSBuilderScheduler(['a', 'b'], {'b': ['a']}) \
+                .run(build, 2)
+
+        self.assertEqual([], built)
+
+
+
+    def test_connection_batches_statements(self):
+        with mock.patch.object(manager.pymysql, 'connect') as connect:
+            connection = _RDBMSBuilderConnection('', 'root', '')
+
+        cursor = \
+            connect.return_value.cursor.return_value.__enter__.return_value
+        cursor.nextset.return_value = None
+
+        with mock.patch.object(manager, 'MAX_BATCH_SIZE', 60):
+            connection.execute_batch(
+                ['insert into a values (1);',
+                 'insert into a values (2)',
+                 'insert into a values (3);'],
+                'db'
+            )
+
+        connect.return_value.select_db.assert_called_once_with('db')
+        self.assertEqual(
+            [mock.call('insert into a values (1);\n'
+                       + 'insert into a values (2);'),
+             mock.call('insert into a values (3);')],
+            cursor.execute.call_args_list
+        )
+
+
+    def test_connection_selects_db_again_after_script(self):
+        with mock.patch.object(manager.pymysql, 'connect') as connect:
+            connection = _RDBMSBuilderConnection('', 'root', '')
+
+        cursor = \
+            connect.return_value.cursor.return_value.__enter__.return_value
+        cursor.nextset.return_value = None
+
+        connection.execute_batch(['insert into a values (1);'], 'db')
+        connection.execute_batch(['insert into a values (2);'], 'db')
+        self.assertEqual(1, connect.return_value.select_db.call_count)
+
+        connection.execute('use other_db;\nupdate b set c = 1;')
+        connection.execute_batch(['insert into a values (3);'], 'db')
+
+        self.assertEqual(
+            [mock.call('db'), mock.call('db')],
+            connect.return_value.select_db.call_args_list
+        )
+
+
+    def test_connection_executes_load_data_on_its_own(self):
+        with mock.patch.object(manager.pymysql, 'connect') as connect:
+            connection = _RDBMSBuilderConnection('', 'root', '')
+
+        cursor = \
+            connect.return_value.cursor.return_value.__enter__.return_value
+        cursor.nextset.return_value = None
+
+        files = []
+        def execute(sql):
+            if sql.startswith('load data'):
+                file = re.match("load data local infile '(.+?)'", sql)[1]
+                with open(file) as f:
+                    files.append((file, f.read()))
+
+        cursor.execute.side_effect = execute
+
+        connection.execute_batch(
+            ['insert into a values (1);',
+             tinyAPI.Table('db', 'b')
+                .id('id', True, True)
+                .ins_with_load_data()
+                .ins(1)
+                .get_insert_statements()[0],
+             'commit;']
+        )
+
+        self.assertEqual(3, cursor.execute.call_count)
+        self.assertEqual(
+            'insert into a values (1);', cursor.execute.call_args_list[0][0][0]
+        )
+        self.assertEqual('commit;', cursor.execute.call_args_list[2][0][0])
+        self.assertEqual('1\n', files[0][1])
+        self.assertFalse(os.path.exists(files[0][0]))
+
+
+    def test_file_hashes_are_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'build.py')
+            with open(file, 'w') as f:
+                f.write('abc')
+            os.utime(file, (time.time() - 60, time.time() - 60))
+
+            cache_file = os.path.join(directory, 'cache')
+            sha1 = 'a9993e364706816aba3e25717850c26c9cd0d89d'
+
+            file_hashes = _RDBMSBuilderFileHashes(cache_file)
+            self.assertEqual({file: sha1}, file_hashes.get_all([file]))
+            file_hashes.save()
+
+            with mock.patch.object(manager, 'open', create=True) as open_:
+                open_.side_effect = open
+                file_hashes = _RDBMSBuilderFileHashes(cache_file)
+                self.assertEqual(sha1, file_hashes.get(file))
+
+            self.assertEqual(1, open_.call_count)
+
+            with open(file, 'w') as f:
+                f.write('abcd')
+
+            self.assertEqual(
+                '81fe8bfe87576c3ecb22426f8e57847382917acf',
+                _RDBMSBuilderFileHashes(cache_file).get(file)
+            )
+
+
+    def test_get_view_dependencies(self):
+        self.assertEqual(
+            ['abc'],
+            _get_view_dependencies(
+                tinyAPI.View('db', 'def_view').tbl('abc_table')
+                    .get_definition()
+            )
+        )
+        self.assertEqual(
+            ['abc', 'ghi'],
+            _get_view_dependencies(
+                '''create view def_view
+                        as select a.id
+                             from abc_table as a
+                             join ghi_table as g
+                               on g.id = a.id'''
+            )
+        )
+
+
+    def test_split_sql(self):
+        self.assertEqual(
+            ['create table a (b int)',
+             "insert into a values ('x;y', \"-- z\")",
+             'create procedure a_b()\nbegin\n    select 1;\nend',
+             'select 2'],
+            _split_sql(
+                """
+-- a comment; with a semicolon
+create table a (b int);
+insert into a values ('x;y', "-- z"); # another comment
+
+delimiter //
+create procedure a_b()
+begin
+    select 1;
+end//
+delimiter ;
+
+select 2
+""")
+        )
+
 # ----- Main ------------------------------------------------------------------
 
 if __name__ == '__main__':
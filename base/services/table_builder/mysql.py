@@ -7,13 +7,23 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 from .exception import TableBuilderException
 from inspect import stack
 
+import contextlib
+import os
 import re
+import tempfile
 
 __all__ = [
+    'LoadDataStatement',
     'RefTable',
     'Table'
 ]
 
+# ----- Constants -------------------------------------------------------------
+
+# Rows added with Table.ins() are inserted with multi-row insert statements
+# of at most this many bytes (unless Table.ins_max_size() says otherwise).
+MAX_INSERT_SIZE = 262144
+
 # ----- Private Classes  ------------------------------------------------------
 
 class __MySQLColumn(object):
@@ -501,6 +511,55 @@ class _MySQLDateTimeColumn(__MySQLColumn):
 
 # ----- Public Classes  -------------------------------------------------------
 
+class LoadDataStatement(object):
+    '''A "load data local infile" statement that loads the rows of a table
+       from a tab separated file.  The file is only written when the
+       statement is about to be executed; see open().'''
+
+    def __init__(self, table_name, cols, charset, lines):
+        self.__table_name = table_name
+        self.__cols = cols
+        self.__charset = charset
+        self.__lines = lines
+
+
+    def get_sql(self, file):
+        '''Get the SQL statement that loads the rows from file.'''
+        sql = "load data local infile '" + file + "'\n" \
+              + '    into table ' + self.__table_name + '\n'
+        if self.__charset is not None:
+            sql += '    character set ' + self.__charset + '\n'
+
+        return sql \
+               + "    fields terminated by '\\t' escaped by '\\\\'\n" \
+               + "    lines terminated by '\\n'\n" \
+               + '(\n' + self.__cols + '\n);'
+
+
+    @contextlib.contextmanager
+    def open(self):
+        '''Writes the rows to a file in /tmp and returns the SQL statement
+           that loads them.  The file is removed when the block exits.'''
+        with tempfile.NamedTemporaryFile(
+            'w',
+            encoding='utf-8',
+            dir='/tmp',
+            prefix='tinyAPI_rdbms_builder_',
+            suffix='.tsv',
+            delete=False
+        ) as f:
+            f.writelines(self.__lines)
+
+        try:
+            yield self.get_sql(f.name)
+        finally:
+            os.remove(f.name)
+
+
+    def __str__(self):
+        return self.get_sql('<' + self.__table_name + '.tsv>')
+
+
 class Table(object):
     '''Allows for the description of a table that can be compiled to SQL.'''
 
@@ -515,7 +574,9 @@ class Table(object):
         self.__foreign_keys = []
         self.__indexed_cols = {}
         self.__indexes = []
+        self.__load_data = False
         self.__map = {}
+        self.__max_insert_size = MAX_INSERT_SIZE
         self.__name = name
         self.__primary_key = []
         self.__rows = []
@@ -902,38 +963,74 @@ class Table(object):
         return indexes
 
 
+    def __format_load_data_value(self, val):
+        if val is None:
+            return '\\N'
+
+        return str(val) \
+                .replace('\\', '\\\\') \
+                .replace("''", "'") \
+                .replace('\t', '\\t') \
+                .replace('\n', '\\n')
+
+
+    def __format_value(self, val):
+        if val == 'current_timestamp':
+            return '    current_timestamp'
+        elif re.match('current_date', str(val)):
+            return val
+        elif val is None:
+            return '    null'
+        else:
+            return "    '" + str(val) + "'"
+
+
     def get_insert_statements(self):
         '''Get SQL statements to add data that should be inserted into this
-           table.'''
+           table: as few multi-row insert statements as fit in the maximum
+           insert size (or a single LoadDataStatement) followed by one
+           commit.'''
         if len(self.__rows) == 0:
             return None
 
-        rows = []
+        cols = ',\n'.join('    ' + col.get_name() for col in self.__columns)
+
+        if self.__load_data and not self.__has_expressions():
+            return [
+                LoadDataStatement(
+                    self.__name,
+                    cols,
+                    self.__charset,
+                    ['\t'.join(self.__format_load_data_value(val)
+                               for val in row) + '\n'
+                     for row in self.__rows]
+                ),
+                'commit;'
+            ]
+
+        head = 'insert into ' + self.__name + '\n(\n' + cols + '\n)\nvalues\n'
+
+        statements = []
+        values = []
+        size = len(head)
         for row in self.__rows:
-            statement = 'insert into ' + self.__name + "\n(\n"
+            value = \
+                '(\n' + ',\n'.join(self.__format_value(val) for val in row) \
+                + '\n)'
 
-            cols = []
-            for col in self.__columns:
-                cols.append('    ' + col.get_name())
+            if len(values) > 0 and \
+               size + len(value.encode()) + 2 > self.__max_insert_size:
+                statements.append(head + ',\n'.join(values) + ';')
+                values = []
+                size = len(head)
 
-            statement += (',\n'.join(cols)
-                          + "\n)\nvalues\n(\n")
+            values.append(value)
+            size += len(value.encode()) + 2
 
-            vals = []
-            for val in row:
-                if val == 'current_timestamp':
-                    vals.append('    current_timestamp')
-                elif re.match('current_date', str(val)):
-                    vals.append(val)
-                elif val is None:
-                    vals.append('    null')
-                else:
-                    vals.append("    '" + str(val) + "'")
+        statements.append(head + ',\n'.join(values) + ';')
+        statements.append('commit;')
 
-            statement += ',\n'.join(vals) + '\n);\ncommit;'
-            rows.append(statement)
-
-        return rows
+        return statements
 
 
     def get_unindexed_foreign_keys(self):
@@ -951,6 +1048,16 @@ class Table(object):
         return unindexed
 
 
+    def __has_expressions(self):
+        for row in self.__rows:
+            for val in row:
+                if val == 'current_timestamp' or \
+                   re.match('current_date', str(val)):
+                    return True
+
+        return False
+
+
     def id(self, name, unique=False, serial=False):
         '''Define a standard ID column.'''
         if name != 'id' and not re.search('_id$', name):
@@ -1007,6 +1114,22 @@ class Table(object):
         return self
 
 
+    def ins_max_size(self, num_bytes):
+        '''Set the maximum size of the statements that insert the rows added
+           with ins().'''
+        self.__max_insert_size = num_bytes
+        return self
+
+
+    def ins_with_load_data(self):
+        '''Load the rows added with ins() using "load data local infile"
+           instead of insert statements, which is much faster for tables
+           with a lot of seed data.  If any row uses an expression (like
+           current_timestamp) the rows are inserted instead.'''
+        self.__load_data = True
+        return self
+
+
     def int(self,
             name,
             not_null=False,
@@ -11,6 +11,8 @@ from tinyAPI.base.services.table_builder.mysql \
            _MySQLNumericColumn, \
            _MySQLStringColumn
 
+import os
+import re
 import tinyAPI
 import unittest
 
@@ -756,28 +758,12 @@ values
     '1',
     'one',
     '1'
-);
-commit;
-insert into abc_ref_def
-(
-    id,
-    value,
-    display_order
-)
-values
+),
 (
     '2',
     'two',
     '2'
-);
-commit;
-insert into abc_ref_def
-(
-    id,
-    value,
-    display_order
-)
-values
+),
 (
     '3',
     'three',
@@ -1139,6 +1125,85 @@ add constraint abc_0_fk
                 .updated(6) \
                 .get_definition())
 
+
+
+    def test_insert_statements_are_split_by_size(self):
+        table = tinyAPI.Table('db', 'abc') \
+                    .id('id', True, True) \
+                    .vchar('value', 100) \
+                    .ins_max_size(100)
+
+        self.assertIsNone(table.get_insert_statements())
+
+        table.ins(1, 'a').ins(2, 'b').ins(3, None)
+
+        statements = table.get_insert_statements()
+
+        self.assertEqual(3, len(statements))
+        self.assertEqual('''insert into abc
+(
+    id,
+    value
+)
+values
+(
+    '1',
+    'a'
+),
+(
+    '2',
+    'b'
+);''', statements[0])
+        self.assertEqual('''insert into abc
+(
+    id,
+    value
+)
+values
+(
+    '3',
+    null
+);''', statements[1])
+        self.assertEqual('commit;', statements[2])
+
+
+    def test_insert_statements_with_load_data(self):
+        table = tinyAPI.Table('db', 'abc') \
+                    .id('id', True, True) \
+                    .vchar('value', 100) \
+                    .ins_with_load_data() \
+                    .ins(1, "it''s") \
+                    .ins(2, None) \
+                    .ins(3, 'a\tb') \
+                    .ins(4, 'a\\nb')
+
+        statements = table.get_insert_statements()
+        with statements[0].open() as sql:
+            file = re.match("load data local infile '(.+?)'", sql)[1]
+            with open(file) as f:
+                self.assertEqual(
+                    "1\tit's\n2\t\\N\n3\ta\\tb\n4\ta\\\\nb\n", f.read()
+                )
+
+        self.assertFalse(os.path.exists(file))
+
+        self.assertEqual(
+            "load data local infile '" + file + "'\n"
+            + '    into table abc\n'
+            + '    character set utf8\n'
+            + "    fields terminated by '\\t' escaped by '\\\\'\n"
+            + "    lines terminated by '\\n'\n"
+            + '(\n    id,\n    value\n);',
+            sql
+        )
+        self.assertEqual('commit;', statements[1])
+
+        table.ins(5, 'current_timestamp')
+
+        self.assertTrue(
+            table.get_insert_statements()[0].startswith('insert into abc')
+        )
+
 # ----- Main ------------------------------------------------------------------
 
 if __name__ == '__main__':
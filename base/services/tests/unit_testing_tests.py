@@ -0,0 +1,232 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.data_store.MySQL import MySQL
+from tinyAPI.base.services.unit_testing import Manager
+from tinyAPI.base.services.unit_testing import run_tests
+from tinyAPI.base.services.unit_testing import TransactionalDataStoreTestCase
+
+import mock
+import os
+import tempfile
+import time
+import tinyAPI
+import unittest
+import xml.etree.ElementTree
+
+# ----- Constants -------------------------------------------------------------
+
+TEST_FILE = '''
+import unittest
+
+class SampleTestCase(unittest.TestCase):
+
+    def test_error(self):
+        raise KeyError('abc')
+
+    def test_fail(self):
+        self.assertEqual(1, 2)
+
+    def test_ok(self):
+        pass
+
+    def test_output(self):
+        print('abc')
+
+    @unittest.skip('not now')
+    def test_skip(self):
+        pass
+'''
+
+# ----- Tests -----------------------------------------------------------------
+
+class ManagerTestCase(unittest.TestCase):
+
+    def test_execute_in_process(self):
+        cli = _FakeCLI()
+
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'sample_tests.py')
+            with open(file, 'w') as f:
+                f.write(TEST_FILE)
+
+            junit_xml_file = os.path.join(directory, 'junit.xml')
+
+            manager = \
+                Manager(cli) \
+                    .disable_stop_on_failure() \
+                    .enable_in_process() \
+                    .set_junit_xml_file(junit_xml_file)
+
+            self.assertFalse(manager.execute([file, '']))
+            self.assertFalse(manager.print_summary())
+
+            root = xml.etree.ElementTree.parse(junit_xml_file).getroot()
+
+        self.assertEqual(5, len(manager.get_results()))
+        self.assertIn('SampleTestCase::test_ok .. OK', cli.messages)
+        self.assertIn('SampleTestCase::test_output .. FAIL', cli.messages)
+
+        self.assertEqual('5', root.get('tests'))
+        self.assertEqual('1', root.get('errors'))
+        self.assertEqual('2', root.get('failures'))
+        self.assertEqual('1', root.get('skipped'))
+
+
+class RunTestsTestCase(unittest.TestCase):
+
+    def test_run_tests(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'sample_tests.py')
+            with open(file, 'w') as f:
+                f.write(TEST_FILE)
+
+            records = run_tests(file)
+
+        self.assertEqual(
+            [('test_error', 'error'),
+             ('test_fail', 'fail'),
+             ('test_ok', 'ok'),
+             ('test_output', 'ok'),
+             ('test_skip', 'skipped')],
+            [(record['method'], record['status']) for record in records]
+        )
+        self.assertEqual('SampleTestCase', records[0]['class'])
+        self.assertIn("KeyError: 'abc'", records[0]['message'])
+        self.assertIn('AssertionError: 1 != 2', records[1]['message'])
+        self.assertEqual('abc\n', records[3]['output'])
+        self.assertEqual('not now', records[4]['message'])
+
+
+    def test_run_tests_with_import_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'broken_tests.py')
+            with open(file, 'w') as f:
+                f.write('import a_module_that_does_not_exist\n')
+
+            records = run_tests(file)
+
+        self.assertEqual(1, len(records))
+        self.assertEqual('error', records[0]['status'])
+        self.assertIn('ModuleNotFoundError', records[0]['message'])
+
+
+class TransactionalDataStoreTestCaseTestCase(TransactionalDataStoreTestCase):
+
+    def set_up(self):
+        self.connection = mock.Mock()
+        self.cursor = self.connection.cursor.return_value
+        self.cursor.rowcount = 1
+
+        patcher = \
+            mock.patch.object(
+                MySQL, '_open_connection', return_value=self.connection
+            )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.dsh = \
+            MySQL().configure(
+                {'read write': {'durability': 'randomizer', 'hosts': []}},
+                'db',
+                'read write'
+            )
+
+
+    def test_assert_max_db_time(self):
+        with self.assertMaxDBTime(100):
+            self.dsh.query('update abc set a = 1')
+
+        self.cursor.execute.side_effect = lambda *args: time.sleep(0.06)
+        try:
+            with self.assertMaxDBTime(100):
+                self.dsh.query('update abc set a = 2')
+                self.dsh.query('update abc set a = %s', [4])
+
+            self.fail('Was able to exceed the database time budget.')
+        except AssertionError as e:
+            self.assertIn('ms spent', str(e))
+            self.assertIn('update abc set a = %s [4]', str(e))
+            self.assertNotIn('a = 1', str(e))
+
+
+    def test_assert_max_queries(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+
+        with self.assertMaxQueries(2):
+            self.dsh.one('select a from abc where id = 1')
+            self.dsh.count('select count(*) from abc')
+
+        self.cursor.fetchmany.side_effect = [[{'a': 1}], []]
+        try:
+            with self.assertMaxQueries(1):
+                self.dsh.nth(0, 'select a from abc')
+                list(self.dsh.iterate('select a from abc'))
+
+            self.fail('Was able to exceed the query budget.')
+        except AssertionError as e:
+            self.assertIn('2 statements executed, at most 1', str(e))
+
+
+    def test_assert_no_repeated_queries(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+
+        try:
+            with self.assertNoRepeatedQueries(2):
+                for i in range(3):
+                    self.dsh.one('select a from abc where id = %s', [i])
+
+            self.fail('Was able to repeat a query in a loop.')
+        except AssertionError as e:
+            self.assertIn('select a from abc where id = ?', str(e))
+
+
+    def test_query_log_includes_create_many(self):
+        with self.assertMaxQueries(2):
+            self.dsh.create_many('abc', [{'a': 1}, {'a': 2}, {'a': 3}], 2)
+
+        self.assertEqual(
+            ['insert into abc(a) values (%s), (%s)',
+             'insert into abc(a) values (%s)'],
+            [record['sql'] for record in self.query_log]
+        )
+        self.assertEqual([1, 2], self.query_log[0]['binds'])
+
+        try:
+            with self.assertMaxQueries(1):
+                self.dsh.create_many('abc', [{'a': 4}, {'a': 5}], 1)
+
+            self.fail('Was able to exceed the query budget with create_many.')
+        except AssertionError as e:
+            self.assertIn('2 statements executed, at most 1', str(e))
+
+
+    def test_query_log(self):
+        self.cursor.fetchall.return_value = [{'a': 1}]
+        self.dsh.one('select * from abc where id = %s', [5])
+
+        self.assertEqual(1, len(self.query_log))
+        self.assertEqual([5], self.query_log[0]['binds'])
+        self.assertEqual(1, self.query_log[0]['rows'])
+        self.assertEqual(
+            'select * from abc where id = %s', self.query_log[0]['sql']
+        )
+
+# ----- Private Classes -------------------------------------------------------
+
+class _FakeCLI(object):
+
+    def __init__(self):
+        self.messages = []
+
+
+    def notice(self, message, indent=None):
+        self.messages.append(message)
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,29 +6,91 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 
 from tinyAPI.base.config import ConfigManager
 from tinyAPI.base.context import Context
-
+from tinyAPI.base.data_store import n_plus_one
+from tinyAPI.base.data_store import query_hooks
+
+import concurrent.futures
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
 import re
 import subprocess
 import sys
+import tempfile
 import time
 import tinyAPI
+import traceback
 import unittest
+import xml.etree.ElementTree
 
 __all__ = [
     'Manager',
+    'run_tests',
     'TransactionalDataStoreTestCase'
 ]
 
+# ----- Constants -------------------------------------------------------------
+
+_JUNIT_ELEMENTS = {
+    'error': ('error', 'errors'),
+    'fail': ('failure', 'failures'),
+    'skipped': ('skipped', 'skipped')
+}
+
+# ----- Public Functions ------------------------------------------------------
+
+def run_tests(file):
+    '''Loads the unit tests defined in file into this process, runs them and
+       returns a result for each one: its class, method, status (ok, fail,
+       error or skipped), time in seconds, message and any output it
+       produced.'''
+    name = '_unit_test_' + re.sub(r'\W', '_', os.path.abspath(file))
+
+    directory = os.path.dirname(os.path.abspath(file))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    result = _TestResult(file)
+    try:
+        spec = importlib.util.spec_from_file_location(name, file)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+
+        suite = unittest.defaultTestLoader.loadTestsFromModule(module)
+    except BaseException as e:
+        result.add_file_error(e)
+    else:
+        suite.run(result)
+
+    return result.records
+
 # ----- Public Classes  -------------------------------------------------------
 
 class Manager(object):
-    '''Provides methods for executing and reporting on unit tests.'''
+    '''Provides methods for executing and reporting on unit tests.
+
+       Test files are run concurrently, each in its own interpreter, by up
+       to "workers" processes.  Results are reported as each file finishes.
+
+       In process mode the test files are loaded into this interpreter (or,
+       with more than one worker, into processes forked from it) so that
+       tinyAPI, its configuration and reference definitions are only loaded
+       once.  Test files then share module level state.'''
 
     def __init__(self, cli):
         self.__cli = cli
         self.__enable_stop_on_failure = True
+        self.__in_process = False
+        self.__junit_xml_file = None
+        self.__num_slowest = 10
+        self.__results = []
         self.__total_run_time = 0
         self.__total_tests = 0
+        self.__workers = 1
 
 
     def disable_stop_on_failure(self):
@@ -36,107 +98,370 @@ class Manager(object):
         return self
 
 
+    def enable_in_process(self):
+        self.__in_process = True
+        return self
+
+
     def execute(self, files=tuple()):
-        for file in files:
-            if file != '':
-                self.__cli.notice(file + "\n")
-
-                file_run_time_start = time.time()
-                num_file_tests = 0
-
-                output = \
-                    subprocess.check_output(
-                        "export ENV_UNIT_TEST=1 ; "
-                        + sys.executable + " " + file + " -v ; "
-                        + "exit 0",
-                        stderr=subprocess.STDOUT,
-                        shell=True
-                    ) \
-                        .decode();
-
-                failed = flush = False
-                test_info = None
-                for line in output.split("\n"):
-                    # Attempt to capture test results
-                    results = re.search(r' \.\.\. (?P<output>.*)(?P<message>ok|fail|error|skipped)$', line, re.IGNORECASE)
-                    if test_info is None:
-                        test_info = re.match(r'^(?P<method>test_[^ ]+) \(.*?\.(?P<class>.*?)\)', line)
-                        if test_info is not None:
-                            flush = False
-
-                    if re.match('FAILED \(', line) or re.search('Error:', line):
-                        flush = True
+        files = [file for file in files if file != '']
+
+        started = time.time()
+        if self.__in_process:
+            failed = self.__execute_in_process(files)
+        else:
+            failed = self.__execute_in_subprocesses(files)
+
+        self.__total_run_time += time.time() - started
+
+        if failed and self.__enable_stop_on_failure:
+            self.write_junit_xml()
+            sys.exit(1)
+
+        return not failed
+
+
+    def __execute_in_process(self, files):
+        os.environ['ENV_UNIT_TEST'] = '1'
+
+        pool = None
+        if self.__workers > 1:
+            # Connections opened by this process must not be shared with
+            # the workers.
+            tinyAPI.dsh().close()
+
+            pool = multiprocessing.get_context('fork').Pool(self.__workers)
+            results = pool.imap_unordered(_run_file, files)
+        else:
+            results = (_run_file(file) for file in files)
+
+        failed = False
+        try:
+            for file, records in results:
+                if not self.__report(file, records):
+                    failed = True
+                    if self.__enable_stop_on_failure:
+                        break
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        return failed
+
+
+    def __execute_in_subprocesses(self, files):
+        failed = False
+        with concurrent.futures.ThreadPoolExecutor(self.__workers) \
+                as executor:
+            futures = [executor.submit(self.__run_file, file)
+                       for file in files]
+
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    file, records = future.result()
+                    if not self.__report(file, records):
                         failed = True
+                        if self.__enable_stop_on_failure:
+                            break
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return failed
+
+
+    def __format_test_name(self, test_class, test_method):
+        length = len(test_class) + len(test_method) + 12
+        if length > 79:
+            test_method = '...' + test_method[(length - 76):]
+
+        return '{}::{}'.format(test_class, test_method)
 
-                    # If results delimiter is found we need to validate case output
-                    if results is not None:
-                        test_class = test_method = message = ''
-                        if test_info is not None:
-                            test_method = test_info.group('method')
-                            test_class = test_info.group('class')
-                            message = results.group('message')
-
-                        # Validate that no output occured
-                        if results.group('output'):
-                            raise RuntimeError(
-                                '\n{}\n{}::{}\n\nproduced\n\n{}\n{}'
-                                    .format(
-                                        '=' * 75,
-                                        test_class,
-                                        test_method,
-                                        results.group('output'),
-                                        '=' * 75
-                                    )
-                            )
-                        else:
-                            if test_method is not None and test_method != line:
-                                length = len(test_class) + len(test_method) + 12
-                                if length > 79:
-                                    test_method = \
-                                        '...' + test_method[(length - 76):]
-
-                            self.__cli.notice(
-                                '{}::{} .. {}'
-                                    .format(
-                                        test_class,
-                                        test_method,
-                                        message.upper()
-                                    ),
-                                1
-                            )
-
-                            # We've already caught the end the current test
-                            # Flush the rest of the incoming lines before the next test
-                            flush = True
-                            test_info = results = None
-                            test_method = test_class = message = ''
-                    elif line == 'OK':
-                        self.__cli.notice('', 1)
-                    elif line != '' and flush:
-                        self.__cli.notice(line, 1)
-
-                    matches = re.match('Ran (\d+) test', line)
-                    if matches is not None:
-                        self.__total_tests += int(matches.group(1))
-
-                if failed is True:
-                    sys.exit(1)
-
-                self.__total_run_time += time.time() - file_run_time_start;
+
+    def get_results(self):
+        '''Returns the result of every test executed so far (see
+           run_tests()) along with the file that defines it.'''
+        return self.__results
 
 
     def print_summary(self):
+        '''Prints the totals and slowest tests, writes the JUnit style XML
+           report (if requested) and returns True if every test passed.'''
         self.__cli.notice('  Total number of tests executed: '
                           + str('{0:,}'.format(self.__total_tests)))
         self.__cli.notice('Total elapsed time for all tests: '
                           + str(self.__total_run_time))
 
+        failures = [record for record in self.__results
+                    if record['status'] in ('error', 'fail')]
+        if len(failures) > 0:
+            self.__cli.notice('         Number of failed tests: '
+                              + str('{0:,}'.format(len(failures))))
+
+        if self.__num_slowest > 0 and len(self.__results) > 0:
+            self.__cli.notice('')
+            self.__cli.notice('Slowest tests:')
+
+            slowest = sorted(self.__results,
+                             key=lambda record: record['time'],
+                             reverse=True)
+            for record in slowest[:self.__num_slowest]:
+                self.__cli.notice(
+                    '{:8.3f}s {}'.format(
+                        record['time'],
+                        self.__format_test_name(
+                            record['class'], record['method']
+                        )
+                    ),
+                    1
+                )
+
+        self.write_junit_xml()
+
+        return len(failures) == 0
+
+
+    def __report(self, file, records):
+        self.__cli.notice(file + "\n")
+
+        passed = True
+        for record in records:
+            if record['output'] and record['status'] == 'ok':
+                record['status'] = 'fail'
+                record['message'] = \
+                    '{}\n{}::{}\n\nproduced\n\n{}\n{}'.format(
+                        '=' * 75,
+                        record['class'],
+                        record['method'],
+                        record['output'],
+                        '=' * 75
+                    )
+
+            self.__results.append(dict(record, file=file))
+            self.__total_tests += 1
+
+            self.__cli.notice(
+                '{} .. {}'.format(
+                    self.__format_test_name(
+                        record['class'], record['method']
+                    ),
+                    record['status'].upper()
+                ),
+                1
+            )
+
+            if record['status'] in ('error', 'fail'):
+                passed = False
+                for line in record['message'].rstrip().split("\n"):
+                    self.__cli.notice(line, 1)
+
+        if passed:
+            self.__cli.notice('', 1)
+
+        return passed
+
+
+    def __run_file(self, file):
+        with tempfile.TemporaryDirectory() as directory:
+            results_file = os.path.join(directory, 'results.json')
+
+            process = \
+                subprocess.run(
+                    [sys.executable,
+                     '-m',
+                     __spec__.name,
+                     file,
+                     results_file],
+                    env=dict(os.environ, ENV_UNIT_TEST='1'),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT
+                )
+
+            try:
+                with open(results_file) as f:
+                    records = json.load(f)
+            except (OSError, ValueError):
+                records = [
+                    _make_record(
+                        os.path.basename(file),
+                        '<module>',
+                        'error',
+                        message=process.stdout.decode(errors='replace')
+                    )
+                ]
+
+        return file, records
+
+
+    def set_junit_xml_file(self, junit_xml_file):
+        '''Writes a JUnit style XML report of every test executed to
+           junit_xml_file.'''
+        self.__junit_xml_file = junit_xml_file
+        return self
+
+
+    def set_num_slowest(self, num_slowest):
+        '''Sets the number of slowest tests listed in the summary.'''
+        self.__num_slowest = num_slowest
+        return self
+
+
+    def set_workers(self, workers):
+        '''Sets the number of test files that are executed concurrently.'''
+        self.__workers = max(1, workers)
+        return self
+
+
+    def write_junit_xml(self):
+        '''Writes the JUnit style XML report, if one has been requested.'''
+        if self.__junit_xml_file is None:
+            return
+
+        root = xml.etree.ElementTree.Element('testsuites')
+        suites = {}
+        for record in self.__results:
+            if record['file'] not in suites:
+                suites[record['file']] = (
+                    xml.etree.ElementTree.SubElement(
+                        root, 'testsuite', name=record['file']
+                    ),
+                    {'errors': 0, 'failures': 0, 'skipped': 0, 'tests': 0,
+                     'time': 0.0}
+                )
+            suite, counts = suites[record['file']]
+
+            case = \
+                xml.etree.ElementTree.SubElement(
+                    suite,
+                    'testcase',
+                    classname=record['class'],
+                    name=record['method'],
+                    time='{:.3f}'.format(record['time'])
+                )
+
+            counts['tests'] += 1
+            counts['time'] += record['time']
+
+            if record['status'] in _JUNIT_ELEMENTS:
+                tag, count = _JUNIT_ELEMENTS[record['status']]
+
+                element = \
+                    xml.etree.ElementTree.SubElement(
+                        case,
+                        tag,
+                        message=record['message'].strip().split("\n")[-1]
+                    )
+                element.text = record['message']
+                counts[count] += 1
+
+            if record['output']:
+                xml.etree.ElementTree.SubElement(case, 'system-out').text = \
+                    record['output']
+
+        totals = {'errors': 0, 'failures': 0, 'skipped': 0, 'tests': 0}
+        for suite, counts in suites.values():
+            for key in totals:
+                suite.set(key, str(counts[key]))
+                totals[key] += counts[key]
+            suite.set('time', '{:.3f}'.format(counts['time']))
+
+        for key, value in totals.items():
+            root.set(key, str(value))
+        root.set('time', '{:.3f}'.format(self.__total_run_time))
+
+        xml.etree.ElementTree.ElementTree(root) \
+            .write(self.__junit_xml_file, 'utf-8', True)
+
 
 class TransactionalDataStoreTestCase(unittest.TestCase):
     '''Provides a test case for transactional data stores that rolls back
-       changes after each unit test.'''
+       changes after each unit test.
+
+       Every statement executed by the data store during a test is recorded
+       in query_log as a dict with its sql, binds, rows and time (in
+       milliseconds).'''
+
+    @contextlib.contextmanager
+    def assertMaxDBTime(self, milliseconds):
+        '''Fails the test if the statements executed in the enclosed block
+           take more than milliseconds in total.'''
+        start = len(self.query_log)
+        yield
+
+        queries = self.query_log[start:]
+        total = sum(query['time'] for query in queries)
+        if total > milliseconds:
+            self.fail(
+                '{:.1f} ms spent executing statements, at most {} ms '
+                    .format(total, milliseconds)
+                + 'expected:\n\n'
+                + self.__format_queries(queries)
+            )
+
+
+    @contextlib.contextmanager
+    def assertMaxQueries(self, count):
+        '''Fails the test if the enclosed block executes more than count
+           statements.'''
+        start = len(self.query_log)
+        yield
+
+        queries = self.query_log[start:]
+        if len(queries) > count:
+            self.fail(
+                '{} statements executed, at most {} expected:\n\n'
+                    .format(len(queries), count)
+                + self.__format_queries(queries)
+            )
+
+
+    @contextlib.contextmanager
+    def assertNoRepeatedQueries(self, threshold=None):
+        '''Fails the test if the enclosed block executes any statement more
+           than threshold times (by default "threshold" of "n plus one
+           detector"), which usually means records are being fetched one at
+           a time in a loop.'''
+        with n_plus_one.unit_of_work(threshold, False) as unit:
+            yield unit
+
+        violations = unit.violations()
+        if len(violations) > 0:
+            self.fail(
+                '\n'.join(
+                    n_plus_one.format_violation(violation)
+                    for violation in violations
+                )
+            )
+
+
+    def __format_queries(self, queries):
+        return '\n'.join(
+            '{:.1f} ms, {} rows: {} {}'
+                .format(
+                    query['time'],
+                    query['rows'],
+                    query['sql'],
+                    repr(query['binds'])
+                )
+            for query in queries
+        )
+
+
+    def __record_query(self, sql, seconds, rows, binds):
+        self.query_log.append({
+            'binds': binds,
+            'rows': rows,
+            'sql': sql,
+            'time': seconds * 1000
+        })
+
 
     def setUp(self):
+        self.query_log = []
+        query_hooks.add(self.__record_query)
+        self.addCleanup(query_hooks.remove, self.__record_query)
+
         default_schema = ConfigManager.value('default schema')
         default_connection = ConfigManager.value('default unit test connection')
         if default_schema and default_connection:
@@ -158,6 +483,144 @@ class TransactionalDataStoreTestCase(unittest.TestCase):
     def tear_down(self):
         pass
 
+# ----- Protected Functions ---------------------------------------------------
+
+def _make_record(test_class, test_method, status, time=0.0, message='',
+                 output=''):
+    return {
+        'class': test_class,
+        'message': message,
+        'method': test_method,
+        'output': output,
+        'status': status,
+        'time': time
+    }
+
+
+def _run_file(file):
+    return file, run_tests(file)
+
+# ----- Private Classes -------------------------------------------------------
+
+class _TestResult(unittest.TestResult):
+    '''Records the outcome, duration and output of each test as it runs.'''
+
+    def __init__(self, file):
+        super(_TestResult, self).__init__()
+
+        self.file = file
+        self.records = []
+        self.__output = None
+        self.__record = None
+        self.__started = None
+        self.__stderr = None
+        self.__stdout = None
+
+
+    def add_file_error(self, error):
+        self.records.append(
+            _make_record(
+                os.path.basename(self.file),
+                '<module>',
+                'error',
+                message=''.join(traceback.format_exception(
+                    type(error), error, error.__traceback__
+                ))
+            )
+        )
+
+
+    def addError(self, test, err):
+        super(_TestResult, self).addError(test, err)
+        self.__set_status(test, 'error', self._exc_info_to_string(err, test))
+
+
+    def addExpectedFailure(self, test, err):
+        super(_TestResult, self).addExpectedFailure(test, err)
+        self.__set_status(test, 'ok')
+
+
+    def addFailure(self, test, err):
+        super(_TestResult, self).addFailure(test, err)
+        self.__set_status(test, 'fail', self._exc_info_to_string(err, test))
+
+
+    def addSkip(self, test, reason):
+        super(_TestResult, self).addSkip(test, reason)
+        self.__set_status(test, 'skipped', reason)
+
+
+    def addSubTest(self, test, subtest, err):
+        super(_TestResult, self).addSubTest(test, subtest, err)
+        if err is not None:
+            self.__set_status(
+                test,
+                'fail' if issubclass(err[0], test.failureException)
+                    else 'error',
+                self._exc_info_to_string(err, test)
+            )
+
+
+    def addSuccess(self, test):
+        super(_TestResult, self).addSuccess(test)
+        self.__set_status(test, 'ok')
+
+
+    def addUnexpectedSuccess(self, test):
+        super(_TestResult, self).addUnexpectedSuccess(test)
+        self.__set_status(test, 'fail', 'unexpected success')
+
+
+    def __set_status(self, test, status, message=''):
+        if self.__record is None or not isinstance(test, unittest.TestCase):
+            # Errors raised by setUpClass() and friends are reported outside
+            # of any test.
+            self.records.append(
+                _make_record(
+                    os.path.basename(self.file), str(test), status,
+                    message=message
+                )
+            )
+        elif self.__record['status'] in ('ok', 'skipped'):
+            self.__record['status'] = status
+            self.__record['message'] = message
+
+
+    def startTest(self, test):
+        super(_TestResult, self).startTest(test)
+
+        self.__record = \
+            _make_record(
+                test.__class__.__name__, test._testMethodName, 'ok'
+            )
+
+        self.__output = io.StringIO()
+        self.__stdout = sys.stdout
+        self.__stderr = sys.stderr
+        sys.stdout = sys.stderr = self.__output
+
+        self.__started = time.time()
+
+
+    def stopTest(self, test):
+        self.__record['time'] = time.time() - self.__started
+
+        sys.stdout = self.__stdout
+        sys.stderr = self.__stderr
+        self.__record['output'] = self.__output.getvalue()
+
+        self.records.append(self.__record)
+        self.__record = None
+
+        super(_TestResult, self).stopTest(test)
+
 # ----- Instructions ----------------------------------------------------------
 
 Context().set_unit_test()
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    # Executed by Manager in a separate process for each test file.
+    with open(sys.argv[2], 'w') as f:
+        json.dump(run_tests(sys.argv[1]), f)
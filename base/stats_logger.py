@@ -5,21 +5,249 @@ __author__ = 'Michael Montero <mcmontero@gmail.com>'
 # ----- Imports ---------------------------------------------------------------
 
 from tinyAPI.base.config import ConfigManager
+from tinyAPI.base.exception import ConfigurationException
+from tinyAPI.base.singleton import Singleton
 
+import atexit
+import bisect
+import json
 import logging
+import os
 import random
+import re
+import socket
+import threading
+import time
 import tinyAPI
 
 __all__ = [
+    'JSONLinesSink',
+    'PrometheusFileSink',
+    'register_sink',
+    'StatsDSink',
     'StatsLogger'
 ]
 
+# ----- Constants -------------------------------------------------------------
+
+# Upper bounds of the histogram buckets.  The last bucket counts everything
+# larger.  Latencies are recorded in milliseconds.
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_PROMETHEUS_INVALID = re.compile(r'[^a-zA-Z0-9_:]')
+
+# ----- Public Functions ------------------------------------------------------
+
+def register_sink(name, sink_class):
+    '''Makes a sink class available to the "metrics" setting under name.
+       Sinks are created with their settings and must implement
+       emit(metrics).'''
+    _sinks[name] = sink_class
+
 # ----- Public Classes --------------------------------------------------------
 
-class StatsLogger(object):
-    '''Manages writing statistics to the application log file.'''
+class StatsLogger(object, metaclass=Singleton):
+    '''Maintains the counters, gauges and histograms of the process and
+       periodically flushes them to the sinks configured by "metrics".
+
+       Counters and histograms are aggregated by each thread in its own
+       buffer whose lock is only ever contended by the flush, so recording
+       a value never waits on other threads.  Sinks receive what has been
+       recorded since the previous flush.  If "metrics" is not configured
+       nothing is recorded.'''
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__collectors = []
+        self.__reset()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__after_fork)
+
+
+    def add_sink(self, sink):
+        '''Adds a sink in addition to those configured by "metrics" and
+           enables the registry if it was not already.'''
+        self.__get_settings()
+        with self.__lock:
+            self.__sinks.append(sink)
+            self.__settings['enabled'] = True
+
+        return self
+
+
+    def __after_fork(self):
+        # Another thread may have held the lock when the process forked.
+        # Anything recorded by the parent is flushed by the parent.
+        self.__lock = threading.Lock()
+        self.__reset(keep_settings=True)
+
+
+    def counter(self, name, value=1, tags=None):
+        '''Increments a counter.'''
+        if not self.__is_enabled():
+            return
+
+        buffer = self.__get_buffer()
+        key = (name, _get_tags_key(tags))
+
+        with buffer.lock:
+            buffer.counters[key] = buffer.counters.get(key, 0) + value
+
+
+    def flush(self):
+        '''Sends everything recorded since the last flush to the sinks and
+           returns it.'''
+        for collector in list(self.__collectors):
+            try:
+                collector()
+            except Exception:
+                pass
+
+        with self.__lock:
+            buffers = list(self.__buffers)
+            self.__buffers = [
+                buffer for buffer in buffers if buffer.thread.is_alive()
+            ]
+            gauges = dict(self.__gauges)
+            sinks = list(self.__sinks)
+
+        counters = {}
+        histograms = {}
+        for buffer in buffers:
+            with buffer.lock:
+                buffer_counters, buffer.counters = buffer.counters, {}
+                buffer_histograms, buffer.histograms = buffer.histograms, {}
+
+            for key, value in buffer_counters.items():
+                counters[key] = counters.get(key, 0) + value
+
+            for key, value in buffer_histograms.items():
+                if key not in histograms:
+                    histograms[key] = {
+                        'buckets': [0] * (len(BUCKETS) + 1),
+                        'count': 0,
+                        'sum': 0
+                    }
+
+                histogram = histograms[key]
+                histogram['count'] += value[0]
+                histogram['sum'] += value[1]
+                for index, count in enumerate(value[2]):
+                    histogram['buckets'][index] += count
+
+        prefix = self.__get_settings()['prefix']
+
+        metrics = {
+            'counters': _prefix(prefix, counters),
+            'gauges': _prefix(prefix, gauges),
+            'histograms': _prefix(prefix, histograms),
+            'timestamp': time.time()
+        }
+
+        for sink in sinks:
+            try:
+                sink.emit(metrics)
+            except Exception:
+                pass
+
+        return metrics
+
+
+    def gauge(self, name, value, tags=None):
+        '''Sets a gauge to its current value.'''
+        if not self.__is_enabled():
+            return
+
+        # Gauges are shared by all threads; the buffer is only retrieved to
+        # make sure that the flusher has been started.
+        self.__get_buffer()
+        self.__gauges[(name, _get_tags_key(tags))] = value
+
+
+    def __get_buffer(self):
+        try:
+            return self.__local.buffer
+        except AttributeError:
+            pass
+
+        buffer = _ThreadBuffer()
+        self.__local.buffer = buffer
+
+        with self.__lock:
+            self.__buffers.append(buffer)
+
+        self.__start_flusher()
+
+        return buffer
+
+
+    def __get_settings(self):
+        if self.__settings is None:
+            try:
+                settings = ConfigManager.value('metrics')
+            except ConfigurationException:
+                settings = None
+
+            if settings is None:
+                settings = {}
+
+            sinks = []
+            for options in settings.get('sinks', []):
+                if options['type'] not in _sinks:
+                    raise ConfigurationException(
+                        'the metrics sink "{}" is not registered'
+                            .format(options['type'])
+                    )
+
+                sinks.append(_sinks[options['type']](options))
+
+            with self.__lock:
+                self.__sinks = sinks + self.__sinks
+                self.__settings = {
+                    'enabled': len(self.__sinks) > 0,
+                    'flush interval': settings.get('flush interval', 10),
+                    'prefix': settings.get('prefix', 'tinyAPI')
+                }
+
+        return self.__settings
+
+
+    def histogram(self, name, value, tags=None):
+        '''Records a value (for latencies, in milliseconds) in a
+           histogram.'''
+        if not self.__is_enabled():
+            return
+
+        buffer = self.__get_buffer()
+        key = (name, _get_tags_key(tags))
+        index = bisect.bisect_left(BUCKETS, value)
+
+        with buffer.lock:
+            histogram = buffer.histograms.get(key)
+            if histogram is None:
+                histogram = [0, 0, [0] * (len(BUCKETS) + 1)]
+                buffer.histograms[key] = histogram
+
+            histogram[0] += 1
+            histogram[1] += value
+            histogram[2][index] += 1
+
 
     def hit_ratio(self, name, requests, hits, pid=None):
+        '''Records the number of requests and hits of a cache (or anything
+           else that can hit or miss).  Without "metrics" configured, one in
+           every 100,000 calls writes them to the application log file.'''
+        if self.__is_enabled():
+            tags = {'pid': pid} if pid is not None else None
+            gauge = _get_metric_name(name)
+
+            self.gauge(gauge + '.requests', requests, tags)
+            self.gauge(gauge + '.hits', hits, tags)
+            if requests > 0:
+                self.gauge(gauge + '.hit_ratio', hits / requests, tags)
+            return
+
         if tinyAPI.env_unit_test() is False and \
            tinyAPI.env_cli() is False and \
            random.randint(1, 100000) == 1:
@@ -44,6 +272,329 @@ class StatsLogger(object):
                     '----- ' + name + ' (stop) ------'
                 ])
 
-                logging.basicConfig(filename = log_file)
-                logging.critical('\n'.join(lines))
-                logging.shutdown()
+                _get_logger(log_file).critical('\n'.join(lines))
+
+
+    def __is_enabled(self):
+        settings = self.__settings
+        if settings is None:
+            settings = self.__get_settings()
+
+        return settings['enabled']
+
+
+    def register_collector(self, collector):
+        '''Registers a function that is called before every flush, typically
+           to set gauges from stats maintained elsewhere.'''
+        with self.__lock:
+            if collector not in self.__collectors:
+                self.__collectors.append(collector)
+
+        return self
+
+
+    def reset(self):
+        '''Discards everything recorded and reloads the configuration.'''
+        self.__reset()
+
+
+    def __reset(self, keep_settings=False):
+        with self.__lock:
+            self.__buffers = []
+            self.__local = threading.local()
+            self.__gauges = {}
+            self.__flusher = None
+            self.__flusher_pid = None
+
+            if keep_settings is False:
+                self.__settings = None
+                self.__sinks = []
+
+
+    def __run_flusher(self, pid):
+        while True:
+            time.sleep(self.__get_settings()['flush interval'])
+
+            if self.__flusher_pid != pid:
+                return
+
+            self.flush()
+
+
+    def __start_flusher(self):
+        if self.__flusher is not None or tinyAPI.env_unit_test():
+            return
+
+        with self.__lock:
+            if self.__flusher is not None:
+                return
+
+            self.__flusher_pid = os.getpid()
+            self.__flusher = \
+                threading.Thread(
+                    target=self.__run_flusher,
+                    args=(self.__flusher_pid,),
+                    name='tinyAPI metrics',
+                    daemon=True
+                )
+            self.__flusher.start()
+
+        atexit.register(self.flush)
+
+
+class JSONLinesSink(object):
+    '''Appends every flush to a file as a single line of JSON.'''
+
+    def __init__(self, settings):
+        self.file = settings['file']
+
+
+    def emit(self, metrics):
+        line = {
+            'counters': _stringify_keys(metrics['counters']),
+            'gauges': _stringify_keys(metrics['gauges']),
+            'histograms': {},
+            'pid': os.getpid(),
+            'timestamp': metrics['timestamp']
+        }
+
+        for key, histogram in metrics['histograms'].items():
+            line['histograms'][_format_key(key)] = {
+                'buckets': dict(zip(
+                    [str(bound) for bound in BUCKETS] + ['+Inf'],
+                    histogram['buckets']
+                )),
+                'count': histogram['count'],
+                'sum': histogram['sum']
+            }
+
+        with open(self.file, 'a') as file:
+            file.write(json.dumps(line, sort_keys=True) + '\n')
+
+
+class PrometheusFileSink(object):
+    '''Maintains a file in the Prometheus text exposition format, as read
+       by the node exporter's textfile collector.  Counters and histograms
+       are accumulated across flushes.  The file is replaced atomically.'''
+
+    def __init__(self, settings):
+        self.file = settings['file']
+        self.__counters = {}
+        self.__gauges = {}
+        self.__histograms = {}
+
+
+    def emit(self, metrics):
+        for key, value in metrics['counters'].items():
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+        self.__gauges.update(metrics['gauges'])
+
+        for key, value in metrics['histograms'].items():
+            if key not in self.__histograms:
+                self.__histograms[key] = {
+                    'buckets': [0] * (len(BUCKETS) + 1),
+                    'count': 0,
+                    'sum': 0
+                }
+
+            histogram = self.__histograms[key]
+            histogram['count'] += value['count']
+            histogram['sum'] += value['sum']
+            for index, count in enumerate(value['buckets']):
+                histogram['buckets'][index] += count
+
+        lines = []
+        self.__format(lines, 'counter', self.__counters, '_total')
+        self.__format(lines, 'gauge', self.__gauges)
+
+        for name, series in self.__group(self.__histograms):
+            lines.append('# TYPE {} histogram'.format(name))
+            for tags, histogram in series:
+                cumulative = 0
+                for bound, count in \
+                    zip(BUCKETS + ('+Inf',), histogram['buckets']):
+                    cumulative += count
+                    lines.append(
+                        '{}_bucket{} {}'.format(
+                            name,
+                            _format_labels(tags + (('le', bound),)),
+                            cumulative
+                        )
+                    )
+
+                lines.append(
+                    '{}_sum{} {}'
+                        .format(name, _format_labels(tags), histogram['sum'])
+                )
+                lines.append(
+                    '{}_count{} {}'
+                        .format(name, _format_labels(tags), histogram['count'])
+                )
+
+        temp_file = '{}.{}.tmp'.format(self.file, os.getpid())
+        with open(temp_file, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+        os.replace(temp_file, self.file)
+
+
+    def __format(self, lines, type, values, suffix=''):
+        for name, series in self.__group(values):
+            name += suffix
+
+            lines.append('# TYPE {} {}'.format(name, type))
+            for tags, value in series:
+                lines.append(
+                    '{}{} {}'.format(name, _format_labels(tags), value)
+                )
+
+
+    def __group(self, values):
+        groups = {}
+        for (name, tags), value in values.items():
+            name = _PROMETHEUS_INVALID.sub('_', name)
+            groups.setdefault(name, []).append((tags, value))
+
+        return sorted(groups.items())
+
+
+class StatsDSink(object):
+    '''Sends every flush to a StatsD server over UDP.  Tags are sent using
+       the DogStatsD extension.  Histograms are sent as a count and a sum
+       counter, and a gauge for each bucket.'''
+
+    def __init__(self, settings):
+        self.address = \
+            (settings.get('host', '127.0.0.1'), settings.get('port', 8125))
+        self.max_packet_size = settings.get('max packet size', 1432)
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+
+    def emit(self, metrics):
+        lines = []
+        for key, value in metrics['counters'].items():
+            lines.append(self.__format(key, value, 'c'))
+
+        for key, value in metrics['gauges'].items():
+            lines.append(self.__format(key, value, 'g'))
+
+        for (name, tags), histogram in metrics['histograms'].items():
+            lines.append(
+                self.__format((name + '.count', tags), histogram['count'], 'c')
+            )
+            lines.append(
+                self.__format((name + '.sum', tags), histogram['sum'], 'c')
+            )
+
+            for bound, count in zip(BUCKETS + ('inf',), histogram['buckets']):
+                if count > 0:
+                    lines.append(
+                        self.__format(
+                            (name + '.bucket', tags + (('le', bound),)),
+                            count,
+                            'c'
+                        )
+                    )
+
+        packet = []
+        size = 0
+        for line in lines:
+            line = line.encode('utf8')
+            if packet and size + len(line) + 1 > self.max_packet_size:
+                self.__socket.sendto(b'\n'.join(packet), self.address)
+                packet = []
+                size = 0
+
+            packet.append(line)
+            size += len(line) + 1
+
+        if packet:
+            self.__socket.sendto(b'\n'.join(packet), self.address)
+
+
+    def __format(self, key, value, type):
+        name, tags = key
+
+        line = '{}:{}|{}'.format(name, value, type)
+        if tags:
+            line += \
+                '|#' + ','.join('{}:{}'.format(tag, val) for tag, val in tags)
+
+        return line
+
+# ----- Protected Functions ---------------------------------------------------
+
+def _format_key(key):
+    name, tags = key
+    if not tags:
+        return name
+
+    return name + '{' + ','.join('{}={}'.format(*tag) for tag in tags) + '}'
+
+
+def _format_labels(tags):
+    if not tags:
+        return ''
+
+    return \
+        '{' \
+        + ','.join(
+            '{}="{}"'.format(
+                _PROMETHEUS_INVALID.sub('_', str(tag)),
+                str(value).replace('\\', '\\\\').replace('"', '\\"')
+            )
+            for tag, value in tags
+        ) \
+        + '}'
+
+
+def _get_logger(log_file):
+    logger = logging.getLogger('tinyAPI.stats')
+    if not logger.handlers:
+        logger.addHandler(logging.FileHandler(log_file))
+
+    return logger
+
+
+def _get_metric_name(name):
+    return re.sub(r'\W+', '_', name.strip().lower())
+
+
+def _get_tags_key(tags):
+    if not tags:
+        return ()
+
+    return tuple(sorted(tags.items()))
+
+
+def _prefix(prefix, values):
+    if not prefix:
+        return values
+
+    return {
+        (prefix + '.' + name, tags): value
+        for (name, tags), value in values.items()
+    }
+
+
+def _stringify_keys(values):
+    return {_format_key(key): value for key, value in values.items()}
+
+# ----- Private Classes -------------------------------------------------------
+
+class _ThreadBuffer(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = threading.current_thread()
+        self.counters = {}
+        self.histograms = {}
+
+# ----- Process Local Data ----------------------------------------------------
+
+_sinks = {
+    'json lines': JSONLinesSink,
+    'prometheus': PrometheusFileSink,
+    'statsd': StatsDSink
+}
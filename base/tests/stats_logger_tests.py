@@ -0,0 +1,153 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base.stats_logger import JSONLinesSink
+from tinyAPI.base.stats_logger import PrometheusFileSink
+from tinyAPI.base.stats_logger import StatsDSink
+from tinyAPI.base.stats_logger import StatsLogger
+
+import json
+import mock
+import os
+import tempfile
+import threading
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class StatsLoggerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = _FakeSink()
+
+        StatsLogger().reset()
+        StatsLogger().add_sink(self.sink)
+
+    def tearDown(self):
+        StatsLogger().reset()
+
+    def test_counters_are_aggregated_across_threads(self):
+        def work():
+            for i in range(100):
+                StatsLogger().counter('requests', tags={'route': 'a'})
+
+        threads = [threading.Thread(target=work) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        StatsLogger().counter('requests', 5, {'route': 'a'})
+
+        metrics = StatsLogger().flush()
+        self.assertEqual(
+            {('tinyAPI.requests', (('route', 'a'),)): 405},
+            metrics['counters']
+        )
+        self.assertIs(metrics, self.sink.metrics[0])
+
+        self.assertEqual({}, StatsLogger().flush()['counters'])
+
+    def test_gauges_and_hit_ratio(self):
+        StatsLogger().hit_ratio('Cache Stats', 200, 150)
+
+        gauges = StatsLogger().flush()['gauges']
+
+        self.assertEqual(200, gauges[('tinyAPI.cache_stats.requests', ())])
+        self.assertEqual(150, gauges[('tinyAPI.cache_stats.hits', ())])
+        self.assertEqual(0.75, gauges[('tinyAPI.cache_stats.hit_ratio', ())])
+
+        self.assertEqual(
+            gauges, StatsLogger().flush()['gauges']
+        )
+
+    def test_histograms(self):
+        StatsLogger().histogram('query_time', 0.5)
+        StatsLogger().histogram('query_time', 7)
+        StatsLogger().histogram('query_time', 20000)
+
+        histogram = \
+            StatsLogger().flush()['histograms'][('tinyAPI.query_time', ())]
+
+        self.assertEqual(3, histogram['count'])
+        self.assertEqual(20007.5, histogram['sum'])
+        self.assertEqual(1, histogram['buckets'][0])
+        self.assertEqual(1, histogram['buckets'][3])
+        self.assertEqual(1, histogram['buckets'][-1])
+
+    def test_json_lines_sink(self):
+        StatsLogger().counter('requests')
+
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'metrics.jsonl')
+
+            JSONLinesSink({'file': file}).emit(StatsLogger().flush())
+
+            with open(file) as lines:
+                line = json.loads(lines.readline())
+
+        self.assertEqual({'tinyAPI.requests': 1}, line['counters'])
+
+    def test_nothing_is_recorded_without_sinks(self):
+        StatsLogger().reset()
+
+        StatsLogger().counter('requests')
+
+        self.assertEqual({}, StatsLogger().flush()['counters'])
+
+    def test_prometheus_file_sink_accumulates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'tinyAPI.prom')
+            sink = PrometheusFileSink({'file': file})
+
+            StatsLogger().counter('requests', tags={'route': 'a'})
+            StatsLogger().histogram('query_time', 3)
+            sink.emit(StatsLogger().flush())
+
+            StatsLogger().counter('requests', tags={'route': 'a'})
+            sink.emit(StatsLogger().flush())
+
+            with open(file) as prometheus:
+                lines = prometheus.read().split('\n')
+
+        self.assertIn('# TYPE tinyAPI_requests_total counter', lines)
+        self.assertIn('tinyAPI_requests_total{route="a"} 2', lines)
+        self.assertIn('tinyAPI_query_time_bucket{le="2"} 0', lines)
+        self.assertIn('tinyAPI_query_time_bucket{le="5"} 1', lines)
+        self.assertIn('tinyAPI_query_time_bucket{le="+Inf"} 1', lines)
+        self.assertIn('tinyAPI_query_time_count 1', lines)
+
+    def test_statsd_sink(self):
+        with mock.patch('socket.socket') as socket:
+            sink = StatsDSink({'host': 'statsd', 'port': 8125})
+
+            StatsLogger().counter('requests', 2, {'route': 'a'})
+            StatsLogger().gauge('pool.in_use', 3)
+            sink.emit(StatsLogger().flush())
+
+        packet, address = socket.return_value.sendto.call_args[0]
+
+        self.assertEqual(('statsd', 8125), address)
+        self.assertEqual(
+            [b'tinyAPI.requests:2|c|#route:a', b'tinyAPI.pool.in_use:3|g'],
+            packet.split(b'\n')[:2]
+        )
+
+# ----- Private Classes -------------------------------------------------------
+
+class _FakeSink(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def emit(self, metrics):
+        self.metrics.append(metrics)
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
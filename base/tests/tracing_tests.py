@@ -0,0 +1,127 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+from tinyAPI.base import tracing
+
+import contextvars
+import tinyAPI
+import unittest
+
+# ----- Tests -----------------------------------------------------------------
+
+class TracingTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        tracing.end_request()
+        tracing._hooks.clear()
+
+    def test_hooks_receive_summary(self):
+        summaries = []
+
+        def broken(summary):
+            raise RuntimeError('hook failed')
+
+        tracing.register_hook(broken)
+        tracing.register_hook(summaries.append)
+        tracing.register_hook(summaries.append)
+
+        tracing.start_request('abc')
+        summary = tracing.end_request()
+
+        self.assertEqual([summary], summaries)
+        self.assertIsNone(tracing.end_request())
+
+    def test_requests_are_isolated_per_context(self):
+        tracing.start_request('outer')
+
+        def inner():
+            tracing.start_request('inner')
+            tracing.record('data store', 'select 1', 0.5)
+            return tracing.end_request()
+
+        summary = contextvars.Context().run(inner)
+
+        self.assertEqual('inner', summary['request id'])
+        self.assertEqual(1, summary['queries'])
+
+        self.assertEqual('outer', tracing.get_request_id())
+        self.assertEqual(0, tracing.end_request()['queries'])
+
+    def test_run_in_request(self):
+        summaries = []
+        tracing.register_hook(summaries.append)
+        tracing.start_request('outer')
+
+        def work(sql, duration=None):
+            tracing.record('data store', sql, duration)
+            return tracing.get_request_id()
+
+        self.assertEqual(
+            'inner',
+            tracing.run_in_request(
+                work, 'select 1', request_id='inner', duration=0.5))
+
+        self.assertEqual(1, len(summaries))
+        self.assertEqual('inner', summaries[0]['request id'])
+        self.assertEqual(1, summaries[0]['queries'])
+
+        def broken():
+            raise RuntimeError('work failed')
+
+        self.assertRaises(RuntimeError, tracing.run_in_request, broken)
+        self.assertEqual(2, len(summaries))
+
+        self.assertEqual('outer', tracing.get_request_id())
+        self.assertEqual(0, tracing.end_request()['queries'])
+
+    def test_spans_are_ignored_without_request(self):
+        self.assertIsNone(tracing.get_request_id())
+
+        with tracing.span('cache', 'key') as span:
+            span.set('hit', True)
+
+        tracing.record('data store', 'select 1', 0.1)
+
+        self.assertIsNone(tracing.end_request())
+
+    def test_summary(self):
+        request_id = tracing.start_request()
+        self.assertEqual(32, len(request_id))
+        self.assertEqual(request_id, tracing.get_request_id())
+
+        tracing.record('data store', 'select 1', 0.25, rows=1)
+        tracing.record('data store', 'select 2', 0.5, rows=0)
+
+        with tracing.span('cache', 'a') as span:
+            span.set('hit', True)
+        with tracing.span('cache', 'b') as span:
+            span.set('hit', False)
+
+        try:
+            with tracing.span('process', 'convert'):
+                raise OSError()
+        except OSError:
+            pass
+
+        summary = tracing.end_request()
+
+        self.assertIsNone(tracing.get_request_id())
+        self.assertEqual(request_id, summary['request id'])
+        self.assertEqual(2, summary['queries'])
+        self.assertEqual(750.0, summary['db time'])
+        self.assertEqual(2, summary['cache retrieves'])
+        self.assertEqual(1, summary['cache hits'])
+        self.assertEqual(1, summary['totals']['process']['count'])
+        self.assertEqual(5, len(summary['spans']))
+        self.assertEqual({'rows': 1}, summary['spans'][0]['attributes'])
+        self.assertEqual(
+            {'error': 'OSError'}, summary['spans'][4]['attributes']
+        )
+
+# ----- Main ------------------------------------------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
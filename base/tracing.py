@@ -0,0 +1,202 @@
+# ----- Info ------------------------------------------------------------------
+
+__author__ = 'Michael Montero <mcmontero@gmail.com>'
+
+# ----- Imports ---------------------------------------------------------------
+
+import contextvars
+import time
+import uuid
+
+__all__ = [
+    'end_request',
+    'get_request_id',
+    'record',
+    'register_hook',
+    'run_in_request',
+    'span',
+    'start_request'
+]
+
+# ----- Constants -------------------------------------------------------------
+
+# Only the first MAX_SPANS spans of a request are kept; all of them are
+# counted in its summary.
+MAX_SPANS = 1000
+
+# ----- Public Functions ------------------------------------------------------
+
+def end_request():
+    '''Ends the request being traced in the current context and passes its
+       summary to every registered hook.  Returns the summary or None if no
+       request is being traced.'''
+    trace = _trace.get()
+    if trace is None:
+        return None
+
+    _trace.set(None)
+
+    summary = trace.summarize()
+    for hook in list(_hooks):
+        try:
+            hook(summary)
+        except Exception:
+            pass
+
+    return summary
+
+
+def get_request_id():
+    '''Returns the ID of the request being traced in the current context or
+       None.'''
+    trace = _trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def record(kind, name, duration, **attributes):
+    '''Records a span that has already been timed (duration is in seconds)
+       against the request being traced in the current context, if any.'''
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(kind, name, time.time() - duration, duration, attributes)
+
+
+def register_hook(hook):
+    '''Registers a function that is called with the summary of every
+       request when it ends.'''
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def run_in_request(function, *args, request_id=None, **kwargs):
+    '''Calls function in a copy of the current context and traces it as a
+       request of its own.  Use this for work handed to a thread pool or
+       started outside of a request so that its spans are neither lost nor
+       added to the request that started it.  Returns what function
+       returns; the request ends even if function raises.'''
+    def run():
+        start_request(request_id)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            end_request()
+
+    return contextvars.copy_context().run(run)
+
+
+def span(kind, name, **attributes):
+    '''Returns a context manager that times the enclosed block as a span of
+       the request being traced in the current context.  Attributes can be
+       added to the span with set() while it is open.'''
+    return Span(kind, name, attributes)
+
+
+def start_request(request_id=None):
+    '''Starts tracing a request in the current context (thread or asyncio
+       task) and returns its ID, generating one if none is provided.'''
+    if request_id is None:
+        request_id = uuid.uuid4().hex
+
+    _trace.set(_Trace(request_id))
+
+    return request_id
+
+# ----- Public Classes --------------------------------------------------------
+
+class Span(object):
+    '''A block of work timed as part of a traced request.'''
+
+    def __init__(self, kind, name, attributes):
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.__trace = None
+        self.__started = None
+
+
+    def __enter__(self):
+        self.__trace = _trace.get()
+        if self.__trace is not None:
+            self.__started = time.time()
+
+        return self
+
+
+    def __exit__(self, type, value, traceback):
+        if self.__trace is not None:
+            if type is not None:
+                self.attributes['error'] = type.__name__
+
+            self.__trace.add(
+                self.kind,
+                self.name,
+                self.__started,
+                time.time() - self.__started,
+                self.attributes
+            )
+
+
+    def set(self, key, value):
+        self.attributes[key] = value
+        return self
+
+# ----- Private Classes -------------------------------------------------------
+
+class _Trace(object):
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.started = time.time()
+        self.spans = []
+        self.totals = {}
+
+
+    def add(self, kind, name, started, duration, attributes):
+        totals = self.totals.get(kind)
+        if totals is None:
+            totals = {'count': 0, 'hits': 0, 'time': 0.0}
+            self.totals[kind] = totals
+
+        totals['count'] += 1
+        totals['time'] += duration
+        if attributes.get('hit') is True:
+            totals['hits'] += 1
+
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append({
+                'attributes': attributes,
+                'duration': duration,
+                'kind': kind,
+                'name': name,
+                'offset': started - self.started
+            })
+
+
+    def summarize(self):
+        totals = {
+            kind: {
+                'count': value['count'],
+                'hits': value['hits'],
+                'time': value['time'] * 1000
+            }
+            for kind, value in self.totals.items()
+        }
+
+        database = totals.get('data store', {'count': 0, 'time': 0.0})
+        cache = totals.get('cache', {'count': 0, 'hits': 0})
+
+        return {
+            'cache hits': cache['hits'],
+            'cache retrieves': cache['count'],
+            'db time': database['time'],
+            'duration': (time.time() - self.started) * 1000,
+            'queries': database['count'],
+            'request id': self.request_id,
+            'spans': self.spans,
+            'totals': totals
+        }
+
+# ----- Process Local Data ----------------------------------------------------
+
+_hooks = []
+_trace = contextvars.ContextVar('tinyAPI trace', default=None)
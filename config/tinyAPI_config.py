@@ -55,7 +55,7 @@ values = {
     #                   ['[host N]', '[username N]', '[password N]']
     #               ]
     #           },
-    #           'type': '[mysql|postgresql]'
+    #           'type': '[mysql|postgresql|async mysql]'
     #       }
     #   }
     #
@@ -63,7 +63,79 @@ values = {
     # but there is no limit to the number that can be configured.
     #
     # durability:
-    #   randomizer      A host is selected from the list at random
+    #   randomizer          A host is selected from the list at random
+    #   fall back           The first of exactly two hosts is used unless
+    #                       it is unavailable
+    #   latency weighted    Hosts are selected at random, weighted towards
+    #                       those with the lowest connect latency
+    #   least connections   The host to which the process has the fewest
+    #                       open connections is selected
+    #
+    # Every algorithm skips hosts whose circuit breaker is open.  A host's
+    # circuit opens once connecting to it fails "failure threshold" times in
+    # a row and it is then skipped for "backoff" seconds, doubling with each
+    # further failure up to "max backoff".  Each group may override:
+    #
+    #   'circuit breaker': {
+    #       'failure threshold': 1,
+    #       'backoff': 1.0,
+    #       'max backoff': 60.0
+    #   }
+    #
+    # Each group may optionally configure a connection pool that is shared
+    # by all threads of a process for that server, group and database.
+    # Without one every thread's handle holds its own connection.  A pooled
+    # handle checks a connection out at its first statement and returns it
+    # when the transaction is committed or rolled back (or the handle is
+    # closed), so a thread that only reads and never commits holds its
+    # connection until it exits.  "max size" must therefore be at least the
+    # number of such threads or the others time out waiting:
+    #
+    #   'pool': {
+    #       'min size': 0,          connections opened up front and kept open
+    #       'max size': 10,         maximum number of open connections
+    #       'timeout': 5.0,         seconds to wait for a free connection
+    #       'max idle time': 300,   seconds before an idle connection closes
+    #       'ping interval': 30     seconds idle before a connection is
+    #                               pinged on checkout
+    #   }
+    #
+    # Statements that fail with a retryable error (a deadlock, lock wait
+    # timeout or lost connection) are retried, with exponential backoff,
+    # only if they are the first statement of their transaction; use
+    # run_in_transaction() to retry a whole transaction.  Each group may
+    # configure:
+    #
+    #   'retry': {
+    #       'max attempts': 5,      including the first attempt
+    #       'backoff': 0.25,        seconds, doubled after every attempt
+    #       'max backoff': 4.0,     seconds
+    #       'jitter': True,         wait a random part of the backoff
+    #       'deadline': None,       seconds after which no attempt starts
+    #       'errors': [...]         by default 1205, 1213, 2003, 2006 and
+    #                               2013 for MySQL and SQLSTATE 40001,
+    #                               40P01, 55P03, 08000, 08003 and 08006
+    #                               for PostgreSQL
+    #   }
+    #
+    # A group may route reads to another group of read replicas:
+    #
+    #   'read group': '[group]',    selects and shows are executed on this
+    #                               group unless the transaction has
+    #                               written or they lock rows
+    #   'sticky primary': 0         seconds after a write during which
+    #                               reads still go to this group
+    #
+    # and a group of read replicas that configures a "pool" may eject
+    # replicas that lag behind (the lag is checked when a connection is
+    # checked out of the pool):
+    #
+    #   'max replica lag': 10,              seconds
+    #   'replica lag check interval': 5,    seconds between checks per host
+    #   'replica eject time': 30            seconds a lagging host is ejected
+    #
+    # Servers of type "async mysql" are accessed with asyncio (and require
+    # the aiomysql package); every data store method is a coroutine.
     #
     # Fail over is built into all durability algorithms where appropriate.  If
     # the connection to the chosen host fails another will be selected both at
@@ -115,6 +187,55 @@ values = {
     ##
     'memcached servers': ['127.0.0.1:11211'],
 
+    ##
+    # If True, result sets cached with memcache() are tagged with the tables
+    # they select from (or the tags passed to memcache()) and every create(),
+    # create_many(), delete() or DML statement executed with query()
+    # invalidates all cached result sets tagged with the table it modifies.
+    # Tags can also be invalidated manually with memcache_invalidate().
+    # Every write then costs a Memcached round trip per table modified
+    # (once per transaction, and again at commit); failures to invalidate
+    # are logged to "app log file" rather than raised.
+    ##
+    'memcached cache tags': False,
+
+    ##
+    # Values retrieved from or stored in Memcached are also kept in a cache
+    # local to the process that is shared by all of its threads.  The cache
+    # is bounded by number of items and by an estimate of the bytes they
+    # consume; the least recently used items are evicted first.  Items expire
+    # after the TTL (in seconds) given when they were cached but never live
+    # longer than the TTL configured here.
+    #
+    # The local cache is not cleared when a request ends and a purge in one
+    # process does not reach the local caches of the others, so this TTL is
+    # how long other processes may keep serving a purged value.  Keep it
+    # short.
+    ##
+    'memcached local cache': {
+        'max items': 10000,
+        'max bytes': 67108864,
+        'ttl': 5
+    },
+
+    ##
+    # Result sets cached with memcache() are encoded before they are stored.
+    # Supported codecs include:
+    #
+    #   columnar    rows that share the same columns are stored as a single
+    #               list of column names plus a tuple of values per row
+    #   pickle      rows are pickled as is
+    #
+    # Encoded result sets at least "compress threshold" bytes long are
+    # compressed with "compression" (zlib, lz4 or None).  lz4 requires the
+    # lz4 package.
+    ##
+    'memcached result codec': {
+        'name': 'columnar',
+        'compression': 'zlib',
+        'compress threshold': 1024
+    },
+
     ##
     # An array that maps a defined configuration name to the necessary MySQL
     # login credentials so that multiple database servers can be used.  This
@@ -132,6 +253,55 @@ values = {
         'local': ['', '', '']
     },
 
+    ##
+    # Call counts, rows and latency histograms are recorded per statement
+    # fingerprint for queries executed by the MySQL and PostgreSQL data
+    # stores (see tinyAPI.base.data_store.query_stats.snapshot()).  Queries
+    # that take at least "slow query threshold" seconds are also logged, with
+    # their binds, to the tinyAPI.slow_query logger (by default the app log
+    # file).  None disables the slow query log.
+    ##
+    'query stats': {
+        'enabled': True,
+        'slow query threshold': None
+    },
+
+    ##
+    # Outside of production, statements executed through the MySQL and
+    # PostgreSQL data stores are counted by fingerprint per unit of work
+    # (see tinyAPI.base.data_store.n_plus_one) and per traced request.  A
+    # statement executed more than "threshold" times is logged, along with
+    # where it was called from and a batched "in (...)" form of it, to the
+    # tinyAPI.n_plus_one logger (by default the app log file).
+    # TransactionalDataStoreTestCase.assertNoRepeatedQueries() fails a test
+    # instead.
+    ##
+    'n plus one detector': {
+        'enabled': True,
+        'threshold': 5
+    },
+
+    ##
+    # Counters, gauges and histograms maintained by StatsLogger (cache hit
+    # ratios, connection pool usage, query latency, ...) are flushed every
+    # "flush interval" seconds to each of the sinks listed here.  Names are
+    # prefixed with "prefix".  If no sinks are configured nothing is
+    # recorded and cache hit ratios are occasionally written to the app log
+    # file instead.  Available sinks:
+    #
+    #   {'type': 'statsd', 'host': '127.0.0.1', 'port': 8125}
+    #   {'type': 'prometheus', 'file': '/path/to/textfile/tinyAPI.prom'}
+    #   {'type': 'json lines', 'file': '/path/to/metrics.jsonl'}
+    #
+    # Additional sinks can be made available with
+    # tinyAPI.base.stats_logger.register_sink().
+    ##
+    'metrics': {
+        'flush interval': 10,
+        'prefix': 'tinyAPI',
+        'sinks': []
+    },
+
     ##
     # A list of schema names that the RDBMS Builder should manage.  If the
     # RDBMS Builder is in use you must provide values here.